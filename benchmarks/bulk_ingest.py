@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Bulk review ingest throughput (``POST /api/v1/reviews/bulk``).
+
+Samples existing business and user ids from the API, then posts ``--batches``
+batches of ``--batch-size`` generated reviews and reports rows/second per
+batch and overall (target: 10,000 rows/s or better). The rows are really
+inserted and update review counts, so run this against a scratch or staging
+database. Generated review ids start with ``bench-`` so they can be removed
+afterwards.
+
+    python benchmarks/bulk_ingest.py --url http://127.0.0.1:8000 --api-key KEY --batch-size 10000 --batches 5
+"""
+import argparse
+import json
+import random
+import time
+import urllib.request
+import uuid
+
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return json.load(response)
+
+
+def post_json(url, payload, api_key):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json", "X-API-Key": api_key},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=300) as response:
+        return json.load(response)
+
+
+def sample_ids(base_url, path, key, pages):
+    ids = []
+    for page in range(pages):
+        ids.extend(row[key] for row in get_json(f"{base_url}{path}?skip={page * 100}&limit=100"))
+    if not ids:
+        raise SystemExit(f"No rows returned by {path}; load some data first")
+    return ids
+
+
+def make_batch(size, business_ids, user_ids, text_length):
+    run = uuid.uuid4().hex[:8]
+    return [
+        {
+            "review_id": f"bench-{run}-{i}",
+            "business_id": random.choice(business_ids),
+            "user_id": random.choice(user_ids),
+            "stars": random.randint(1, 5),
+            "useful": random.randint(0, 3),
+            "text": "x" * text_length,
+        }
+        for i in range(size)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--api-key", required=True, help="one of INGEST_API_KEYS")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("--text-length", type=int, default=400, help="characters of review text per row")
+    args = parser.parse_args()
+
+    business_ids = sample_ids(args.url, "/api/v1/businesses/", "business_id", pages=20)
+    user_ids = sample_ids(args.url, "/api/v1/users/", "user_id", pages=50)
+    print(f"batch_size={args.batch_size} businesses={len(business_ids)} users={len(user_ids)}")
+    print(f"{'batch':>5} {'inserted':>9} {'seconds':>8} {'rows/s':>9}")
+    total_rows = 0
+    total_seconds = 0.0
+    for number in range(1, args.batches + 1):
+        batch = make_batch(args.batch_size, business_ids, user_ids, args.text_length)
+        started = time.perf_counter()
+        result = post_json(f"{args.url}/api/v1/reviews/bulk", batch, args.api_key)
+        elapsed = time.perf_counter() - started
+        total_rows += result["inserted"]
+        total_seconds += elapsed
+        print(f"{number:>5} {result['inserted']:>9} {elapsed:>8.2f} {result['inserted'] / elapsed:>9.0f}")
+    print(f"overall: {total_rows / total_seconds:.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Per-call overhead of the "with names" CRUD reads (``src/crud/crud.py``).
+
+Each call is run ``--calls`` times in three ways, on one session against the
+database configured by the DATABASE_* settings:
+
+- ``query``: the previous implementation, which builds a ``db.query(...)``
+  with labeled columns and two outer joins on every call
+- ``compiled``: the registered statement run through SQLAlchemy's compiled
+  cache (``DB_PREPARED_STATEMENTS=false``)
+- ``prepared``: the registered statement as ``EXECUTE`` of a server-side
+  prepared statement (the default on PostgreSQL)
+
+The report shows wall time and client CPU time per call. Client CPU is
+process time, so it excludes time spent waiting on the server and is the
+part that is saved on every request.
+
+    python benchmarks/crud_overhead.py --calls 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+from src.core.config import settings  # noqa: E402
+from src.crud import crud  # noqa: E402
+from src.db import models  # noqa: E402
+from src.db.database import SessionLocal  # noqa: E402
+
+
+def _review_columns(db):
+    return db.query(
+        models.Review.review_id, models.Review.user_id, models.Review.business_id, models.Review.stars,
+        models.Review.useful, models.Review.funny, models.Review.cool, models.Review.text,
+        models.Review.date, models.Review.year, models.Review.month,
+        models.User.name.label('user_name'), models.Business.name.label('business_name')
+    ).outerjoin(
+        models.User, models.Review.user_id == models.User.user_id
+    ).outerjoin(
+        models.Business, models.Review.business_id == models.Business.business_id
+    )
+
+
+def _tip_columns(db):
+    return db.query(
+        models.Tip.user_id, models.Tip.business_id, models.Tip.text, models.Tip.date,
+        models.Tip.compliment_count, models.Tip.year,
+        models.User.name.label('user_name'), models.Business.name.label('business_name')
+    ).select_from(models.Tip).outerjoin(
+        models.User, models.Tip.user_id == models.User.user_id
+    ).outerjoin(
+        models.Business, models.Tip.business_id == models.Business.business_id
+    )
+
+
+def query_review(db, review_id):
+    return _review_columns(db).filter(models.Review.review_id == review_id).first()
+
+
+def query_reviews_by_business(db, business_id):
+    return _review_columns(db).filter(models.Review.business_id == business_id).offset(0).limit(10).all()
+
+
+def query_tips_by_business(db, business_id):
+    return _tip_columns(db).filter(
+        models.Tip.business_id == business_id
+    ).order_by(models.Tip.date.desc()).offset(0).limit(10).all()
+
+
+def sample_ids(db):
+    row = db.execute(text("""
+        SELECT r.review_id, r.business_id FROM reviews r
+        WHERE r.business_id IN (SELECT business_id FROM tips LIMIT 1000)
+        LIMIT 1
+    """)).first() or db.execute(text("SELECT review_id, business_id FROM reviews LIMIT 1")).first()
+    if row is None:
+        raise SystemExit("The reviews table is empty; load some data first")
+    return row.review_id, row.business_id
+
+
+def measure(db, call, calls):
+    for _ in range(min(50, calls)):
+        call(db)
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(calls):
+        call(db)
+    return (time.perf_counter() - wall) / calls * 1e6, (time.process_time() - cpu) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000, help="calls per function and mode")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        review_id, business_id = sample_ids(db)
+        cases = [
+            ("get_review_with_names",
+             lambda db: query_review(db, review_id),
+             lambda db: crud.get_review_with_names(db, review_id=review_id)),
+            ("get_reviews_by_business_with_names",
+             lambda db: query_reviews_by_business(db, business_id),
+             lambda db: crud.get_reviews_by_business_with_names(db, business_id=business_id, limit=10)),
+            ("get_tips_by_business_with_names",
+             lambda db: query_tips_by_business(db, business_id),
+             lambda db: crud.get_tips_by_business_with_names(db, business_id=business_id, limit=10)),
+        ]
+        print(f"calls={args.calls} dialect={db.get_bind().dialect.name} (microseconds per call)")
+        print(f"{'function':<36} {'mode':<9} {'wall':>8} {'cpu':>8}")
+        for name, before, after in cases:
+            settings.db_prepared_statements = False
+            rows = [("query",) + measure(db, before, args.calls), ("compiled",) + measure(db, after, args.calls)]
+            settings.db_prepared_statements = True
+            rows.append(("prepared",) + measure(db, after, args.calls))
+            for mode, wall, cpu in rows:
+                print(f"{name:<36} {mode:<9} {wall:>8.0f} {cpu:>8.0f}")
+            db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Reproducible local cold-start benchmark for the Lambda handler.
+
+Each run starts a fresh interpreter, imports the handler and serves one
+synthetic API Gateway v2 event, so the numbers include everything a Lambda
+cold start pays for except the runtime itself. ``--legacy`` measures the old
+approach of wrapping the full ``src.main`` application.
+
+    python benchmarks/lambda_cold_start.py --runs 10 --path /health
+    python benchmarks/lambda_cold_start.py --legacy
+    python benchmarks/lambda_cold_start.py --importtime 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_RUNNER = r'''
+import json, sys, time
+t0 = time.perf_counter()
+if {legacy!r}:
+    from mangum import Mangum
+    from src.main import app
+    handle = Mangum(app, lifespan="off")
+else:
+    from src.lambda_handler import lambda_handler as handle
+t1 = time.perf_counter()
+response = handle({event!r}, None)
+t2 = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (t1 - t0) * 1000,
+    "first_invocation_ms": (t2 - t1) * 1000,
+    "status": response.get("statusCode"),
+}}))
+'''
+
+
+def build_event(path):
+    return {
+        "version": "2.0",
+        "routeKey": "$default",
+        "rawPath": path,
+        "rawQueryString": "",
+        "headers": {"host": "localhost", "accept-encoding": "gzip"},
+        "requestContext": {
+            "http": {
+                "method": "GET",
+                "path": path,
+                "protocol": "HTTP/1.1",
+                "sourceIp": "127.0.0.1",
+                "userAgent": "cold-start-benchmark",
+            },
+            "stage": "$default",
+            "requestId": "benchmark",
+            "accountId": "000000000000",
+            "apiId": "benchmark",
+            "domainName": "localhost",
+            "domainPrefix": "localhost",
+            "time": "01/Jan/2025:00:00:00 +0000",
+            "timeEpoch": 0,
+        },
+        "isBase64Encoded": False,
+        "body": None,
+    }
+
+
+def run_once(path, legacy):
+    code = _RUNNER.format(legacy=legacy, event=build_event(path))
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    measurement["process_ms"] = wall_ms
+    return measurement
+
+
+def report_importtime(legacy, top):
+    """Print the slowest modules (cumulative microseconds) from ``python -X importtime``"""
+    module = "src.main" if legacy else "src.lambda_handler"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    rows.sort(reverse=True)
+    print(f"Slowest imports for {module} (cumulative / self, ms):")
+    for cumulative_us, self_us, name in rows[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} {self_us / 1000:8.1f}  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--path", default="/health", help="request path for the first invocation")
+    parser.add_argument("--legacy", action="store_true", help="measure Mangum wrapping the full src.main app")
+    parser.add_argument("--importtime", type=int, metavar="N", help="print the N slowest imports and exit")
+    args = parser.parse_args()
+
+    if args.importtime:
+        report_importtime(args.legacy, args.importtime)
+        return
+
+    runs = [run_once(args.path, args.legacy) for _ in range(args.runs)]
+    mode = "legacy src.main" if args.legacy else "lazy lambda_handler"
+    print(f"Cold start ({mode}, path={args.path}, runs={args.runs}, status={runs[-1]['status']})")
+    for field in ("import_ms", "first_invocation_ms", "process_ms"):
+        values = sorted(run[field] for run in runs)
+        p90 = values[min(len(values) - 1, int(len(values) * 0.9))]
+        print(f"  {field:<20} median {statistics.median(values):8.1f}  p90 {p90:8.1f}  min {values[0]:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
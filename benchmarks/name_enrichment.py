@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Join versus name-dictionary latency for the "with names" review and tip reads.
+
+Builds the in-process name dictionaries (``src/core/names.py``) from the
+database configured by the DATABASE_* settings, reporting build time and
+memory. Then each read runs ``--calls`` times on pages of reviews and tips
+for sampled businesses and users, first with the outer joins and then
+join-free with names filled from the dictionaries. Both modes return the
+same rows; the script checks that before timing.
+
+    python benchmarks/name_enrichment.py --calls 500 --limit 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+from src.core.names import name_dictionaries  # noqa: E402
+from src.crud import crud  # noqa: E402
+from src.db.database import SessionLocal  # noqa: E402
+
+
+def sample(db, sql, count):
+    values = db.execute(text(sql), {"n": count}).scalars().all()
+    if not values:
+        raise SystemExit("The reviews table is empty; load some data first")
+    return values
+
+
+def measure(db, call, arguments, calls):
+    latencies = []
+    for i in range(calls):
+        started = time.perf_counter()
+        call(db, arguments[i % len(arguments)])
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return sum(latencies) / calls, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500, help="calls per read and mode")
+    parser.add_argument("--limit", type=int, default=50, help="page size")
+    parser.add_argument("--samples", type=int, default=200, help="distinct businesses/users to read")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    name_dictionaries.refresh()
+    if not name_dictionaries.ready:
+        raise SystemExit(f"Dictionaries not built: {name_dictionaries.last_error}")
+    stats = name_dictionaries.stats()
+    print(f"build {time.perf_counter() - started:.2f}s, {stats['memory_bytes'] / 2**20:.1f} MB")
+    for table, table_stats in stats["dictionaries"].items():
+        print(f"  {table:<11} {table_stats['entries']:>9} ids {table_stats['distinct_names']:>9} names "
+              f"{table_stats['memory_bytes'] / 2**20:>7.1f} MB")
+
+    db = SessionLocal()
+    try:
+        businesses = sample(db, "SELECT business_id FROM reviews GROUP BY business_id ORDER BY random() LIMIT :n", args.samples)
+        users = sample(db, "SELECT user_id FROM reviews GROUP BY user_id ORDER BY random() LIMIT :n", args.samples)
+        random.shuffle(businesses)
+        limit = args.limit
+        cases = [
+            ("get_reviews_by_business_with_names", businesses,
+             lambda db, b: crud.get_reviews_by_business_with_names(db, business_id=b, limit=limit)),
+            ("get_reviews_by_user_with_names", users,
+             lambda db, u: crud.get_reviews_by_user_with_names(db, user_id=u, limit=limit)),
+            ("get_tips_by_business_with_names", businesses,
+             lambda db, b: crud.get_tips_by_business_with_names(db, business_id=b, limit=limit)),
+            ("get_reviews_with_names", [0],
+             lambda db, _: crud.get_reviews_with_names(db, skip=random.randrange(10000), limit=limit)),
+        ]
+        dictionaries = name_dictionaries.dictionaries
+        print(f"calls={args.calls} limit={limit} (milliseconds per call)")
+        print(f"{'function':<36} {'mode':<11} {'mean':>7} {'p50':>7} {'p95':>7}")
+        for name, arguments, call in cases[:3]:
+            name_dictionaries.dictionaries = {}
+            joined = [tuple(row) for row in call(db, arguments[0])]
+            name_dictionaries.dictionaries = dictionaries
+            assert [tuple(row) for row in call(db, arguments[0])] == joined, f"{name}: results differ"
+        for name, arguments, call in cases:
+            for mode in ("join", "dictionary"):
+                name_dictionaries.dictionaries = dictionaries if mode == "dictionary" else {}
+                mean, p50, p95 = measure(db, call, arguments, args.calls)
+                print(f"{name:<36} {mode:<11} {mean:>7.2f} {p50:>7.2f} {p95:>7.2f}")
+            db.rollback()
+    finally:
+        name_dictionaries.dictionaries = {}
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Throughput scaling curve for the production server (``python -m src.server``).
+
+For each worker count the server is started on a free port, a pool of client
+processes drives keep-alive GET requests at ``--path`` for ``--duration``
+seconds, and requests/second plus latency percentiles are reported. Use a
+database-backed path (e.g. ``/api/v1/businesses/?limit=20``) to include the
+per-worker pool in the measurement.
+
+    python benchmarks/worker_scaling.py --workers 1 2 4 --clients 32
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_live(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health/live")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not become live")
+
+
+def client_loop(args):
+    port, path, duration = args
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.request("GET", path, headers={"Accept-Encoding": "gzip"})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure(workers, args):
+    port = free_port()
+    env = dict(os.environ, WORKERS=str(workers), API_HOST="127.0.0.1", API_PORT=str(port))
+    if args.budget:
+        env["DB_CONNECTION_BUDGET"] = str(args.budget)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "src.server"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_live(port)
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.map(client_loop, [(port, args.path, args.duration)] * args.clients)
+    finally:
+        server.terminate()
+        server.wait(timeout=args.duration + 30)
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = sum(result[1] for result in results)
+    return len(latencies) / args.duration, percentile(latencies, 0.5), percentile(latencies, 0.99), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--clients", type=int, default=32, help="concurrent keep-alive client processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per worker count")
+    parser.add_argument("--path", default="/health/live")
+    parser.add_argument("--budget", type=int, default=0, help="DB_CONNECTION_BUDGET passed to the server")
+    args = parser.parse_args()
+
+    print(f"path={args.path} clients={args.clients} duration={args.duration}s cpus={os.cpu_count()}")
+    print(f"{'workers':>7} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'scaling':>8}")
+    baseline = None
+    for workers in sorted(set(args.workers)):
+        throughput, p50, p99, errors = measure(workers, args)
+        baseline = baseline or throughput
+        print(f"{workers:>7} {throughput:>10.1f} {p50:>8.2f} {p99:>8.2f} {errors:>7} {throughput / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -42,6 +42,10 @@ except Exception as e:
     exit(1)
 "
 
+# Apply database migrations (startup no longer creates tables)
+echo "🗄️  Applying database migrations..."
+alembic upgrade head
+
 # Start the application
 echo "🚀 Starting FastAPI application..."
 echo "📱 API will be available at: http://${API_HOST}:${API_PORT}"
@@ -52,6 +52,9 @@ start_backend() {
         echo "   ⚠️  .env file not found!"
     fi
     
+    # Apply database migrations (startup no longer creates tables)
+    ./.venv/bin/alembic upgrade head
+    
     # Start backend in background
     nohup ./.venv/bin/uvicorn src.main:app --host $BACKEND_HOST --port $BACKEND_PORT --reload > backend.log 2>&1 &
     BACKEND_PID=$!
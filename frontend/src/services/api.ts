@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { Business, Review, User, Tip, Checkin, SearchFilters } from '../types/api';
+import { Business, BusinessPage, Review, User, Tip, Checkin, SearchFilters } from '../types/api';
 
 // Environment-aware API URL configuration
 const getApiBaseUrl = () => {
@@ -138,6 +138,20 @@ export class YelpApiService {
     return response.data;
   }
 
+  // Business, reviews, tips and checkins in one request (section sizes default server-side)
+  static async getBusinessPage(
+    businessId: string,
+    sizes?: { reviews?: number; tips?: number; checkins?: number }
+  ): Promise<BusinessPage> {
+    const params = new URLSearchParams();
+    if (sizes?.reviews !== undefined) params.append('reviews', sizes.reviews.toString());
+    if (sizes?.tips !== undefined) params.append('tips', sizes.tips.toString());
+    if (sizes?.checkins !== undefined) params.append('checkins', sizes.checkins.toString());
+    
+    const response = await api.get(`/api/v1/businesses/${businessId}/page?${params}`);
+    return response.data;
+  }
+
   static async getBusinessesByCity(city: string, filters?: SearchFilters): Promise<Business[]> {
     const params = new URLSearchParams();
     if (filters?.skip) params.append('skip', filters.skip.toString());
@@ -1,3 +1,8 @@
+export interface BusinessHours {
+  open: string;   // "HH:MM"
+  close: string;  // at or before open: closes after midnight
+}
+
 export interface Business {
   business_id: string;
   name?: string;
@@ -10,9 +15,9 @@ export interface Business {
   stars?: number;
   review_count?: number;
   is_open?: number;
-  attributes?: string;
+  attributes?: Record<string, unknown> | null;
   categories?: string;
-  hours?: string;
+  hours?: Record<string, BusinessHours> | null;
 }
 
 export interface Review {
@@ -72,6 +77,13 @@ export interface Checkin {
   date: string;
 }
 
+export interface BusinessPage {
+  business: Business;
+  reviews: Review[];
+  tips: Tip[];
+  checkins: Checkin[];
+}
+
 export interface ApiResponse<T> {
   data: T[];
   total?: number;
@@ -1,6 +1,6 @@
 from fastapi import FastAPI, Depends
 from sqlalchemy.orm import Session
-from db.database import SessionLocal, init_db
+from db.database import SessionLocal
 from db.models import Business, Review, User, Tip, Checkin
 
 app = FastAPI()
@@ -13,10 +13,6 @@ def get_db():
     finally:
         db.close()
 
-@app.on_event("startup")
-def startup_event():
-    init_db()
-
 @app.get("/businesses/")
 def read_businesses(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
     return db.query(Business).offset(skip).limit(limit).all()
@@ -1,6 +1,9 @@
 -- Database Performance Optimization: Index Creation Script
 -- This script creates strategic indexes to optimize the most common query patterns
 -- Based on analysis of existing queries and performance bottlenecks
+-- NOTE: these indexes are now applied by the Alembic migration
+-- src/db/migrations/versions/0002_query_indexes.py (`alembic upgrade head`);
+-- add new indexes there rather than here.
 
 -- =====================================================
 -- BUSINESS TABLE OPTIMIZATIONS
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
-Run the FastAPI application
+Run the FastAPI application (single-process development server; use
+``python -m src.server`` for multi-worker production serving)
 """
 import uvicorn
 from src.core.config import settings
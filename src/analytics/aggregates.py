@@ -0,0 +1,119 @@
+"""
+Vectorized aggregations over an analytics ``Snapshot``.
+
+Group-bys factorize keys with ``np.unique(..., return_inverse=True)`` and
+aggregate with ``np.bincount``; joins from reviews to businesses are fancy
+indexing on ``business_idx``. None of these touch Postgres.
+"""
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .snapshot import Snapshot
+
+VOTE_COLUMNS = ("stars", "useful", "funny", "cool")
+
+
+def _group_codes(snapshot: Snapshot, by: str):
+    """(group labels, group code per review) for a review-level group-by.
+
+    Business attributes are factorized once over the business table and then
+    gathered onto reviews through ``business_idx``; orphan reviews get label "".
+    """
+    if by == "year":
+        return np.unique(snapshot.column("reviews", "year"), return_inverse=True)
+    labels, business_codes = np.unique(snapshot.column("business", by), return_inverse=True)
+    labels = np.append(labels, "")
+    business_codes = np.append(business_codes, len(labels) - 1)
+    return labels, business_codes[snapshot.column("reviews", "business_idx")]
+
+
+def star_distribution(snapshot: Snapshot, by: str, min_reviews: int = 1, limit: int = 50) -> List[Dict[str, Any]]:
+    """Review count, mean stars and 1-5 star histogram per city, state or year"""
+    labels, codes = _group_codes(snapshot, by)
+    stars = snapshot.column("reviews", "stars")
+    valid = ~np.isnan(stars)
+    codes, stars = codes[valid], stars[valid]
+    buckets = np.clip(np.rint(stars).astype(np.int64), 1, 5) - 1
+    histogram = np.bincount(codes * 5 + buckets, minlength=len(labels) * 5).reshape(len(labels), 5)
+    counts = histogram.sum(axis=1)
+    means = np.bincount(codes, weights=stars, minlength=len(labels)) / np.maximum(counts, 1)
+
+    keep = counts >= max(min_reviews, 1)
+    if by == "year":
+        order = np.flatnonzero(keep & (labels > 0))
+    else:
+        keep = np.flatnonzero(keep & (labels != ""))
+        order = keep[np.argsort(-counts[keep], kind="stable")][:limit]
+    return [
+        {
+            by: int(labels[i]) if by == "year" else labels[i],
+            "reviews": int(counts[i]),
+            "mean_stars": round(float(means[i]), 3),
+            "histogram": {str(star): int(n) for star, n in zip(range(1, 6), histogram[i])},
+        }
+        for i in order
+    ]
+
+
+def vote_correlations(snapshot: Snapshot) -> Dict[str, Any]:
+    """Pearson correlation matrix of review stars and useful/funny/cool votes"""
+    matrix = np.vstack([snapshot.column("reviews", name).astype(np.float64) for name in VOTE_COLUMNS])
+    matrix = matrix[:, ~np.isnan(matrix).any(axis=0)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # A constant column has no defined correlation; it comes back as NaN and is reported as null
+        correlations = np.corrcoef(matrix) if matrix.shape[1] > 1 else np.full((len(VOTE_COLUMNS),) * 2, np.nan)
+    return {
+        "reviews": int(matrix.shape[1]),
+        "means": {name: round(float(value), 4) for name, value in zip(VOTE_COLUMNS, matrix.mean(axis=1))},
+        "correlation": {
+            row: {col: None if np.isnan(correlations[i, j]) else round(float(correlations[i, j]), 4)
+                  for j, col in enumerate(VOTE_COLUMNS)}
+            for i, row in enumerate(VOTE_COLUMNS)
+        },
+    }
+
+
+def _rank(values: np.ndarray) -> np.ndarray:
+    """Average ranks, for Spearman correlation"""
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    ends = np.cumsum(counts)
+    return ((ends - (counts - 1) / 2.0))[inverse]
+
+
+def checkins_vs_rating(snapshot: Snapshot, buckets: int = 10) -> Dict[str, Any]:
+    """Business stars against check-in volume: quantile buckets plus Pearson/Spearman correlation"""
+    stars = snapshot.column("business", "stars").astype(np.float64)
+    checkins = snapshot.column("business", "checkin_count").astype(np.float64)
+    valid = ~np.isnan(stars)
+    stars, checkins = stars[valid], checkins[valid]
+    if len(stars) < 2:
+        return {"businesses": int(len(stars)), "pearson": None, "spearman": None, "buckets": []}
+
+    edges = np.unique(np.quantile(checkins, np.linspace(0, 1, buckets + 1)))
+    bucket = np.clip(np.searchsorted(edges, checkins, side="right") - 1, 0, max(len(edges) - 2, 0))
+    n_buckets = max(len(edges) - 1, 1)
+    counts = np.bincount(bucket, minlength=n_buckets)
+    mean_stars = np.bincount(bucket, weights=stars, minlength=n_buckets) / np.maximum(counts, 1)
+    mean_checkins = np.bincount(bucket, weights=checkins, minlength=n_buckets) / np.maximum(counts, 1)
+
+    def correlation(x, y):
+        if x.std() == 0 or y.std() == 0:
+            return None
+        return round(float(np.corrcoef(x, y)[0, 1]), 4)
+
+    return {
+        "businesses": int(len(stars)),
+        "pearson": correlation(np.log1p(checkins), stars),
+        "spearman": correlation(_rank(checkins), _rank(stars)),
+        "buckets": [
+            {
+                "min_checkins": int(edges[i]),
+                "max_checkins": int(edges[min(i + 1, len(edges) - 1)]),
+                "businesses": int(counts[i]),
+                "mean_checkins": round(float(mean_checkins[i]), 1),
+                "mean_stars": round(float(mean_stars[i]), 3),
+            }
+            for i in range(n_buckets) if counts[i]
+        ],
+    }
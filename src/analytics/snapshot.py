@@ -0,0 +1,293 @@
+"""
+Columnar snapshots of the review data for analytics.
+
+``export`` streams ``business``, ``reviews`` and ``tips`` out of Postgres into
+Arrow IPC files under ``ANALYTICS_DIR``, writing them batch by batch. Reviews
+and tips reference businesses by row position (``business_idx``), not by id,
+so joins become ``numpy.take``. Review text is not exported.
+
+Every export goes to a new version directory (``ANALYTICS_DIR/<timestamp>/``)
+and is published by replacing ``manifest.json``, which names that directory,
+with one ``os.replace``; a worker therefore always opens the three files of a
+single export. The newest ``_KEEP_VERSIONS`` directories are kept, so workers
+that read the previous manifest can still open its files, and older ones are
+removed (mapped files stay readable until they are unmapped).
+
+Rows are written batch by batch and then rewritten as one record batch with
+nulls filled, so each column is a single null-free chunk. ``SnapshotStore``
+memory-maps the files and numeric columns are NumPy views of the mapping:
+every worker shares the page cache rather than holding its own copy. String
+columns (business name/city/state) are the exception; each worker converts
+them to object arrays once, roughly 100 bytes per business per column.
+
+    python -m src.analytics.snapshot              # export once (cron / systemd timer)
+    python -m src.analytics.snapshot --every 86400
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+_BATCH_ROWS = 100_000
+_KEEP_VERSIONS = 2
+_VERSION_FORMAT = "%Y%m%dT%H%M%S%fZ"
+
+BUSINESS_SCHEMA = pa.schema([
+    ("business_id", pa.string()),
+    ("name", pa.string()),
+    ("city", pa.string()),
+    ("state", pa.string()),
+    ("stars", pa.float32()),
+    ("review_count", pa.int32()),
+    ("is_open", pa.int8()),
+    ("checkin_count", pa.int32()),
+])
+REVIEW_SCHEMA = pa.schema([
+    ("business_idx", pa.int32()),
+    ("stars", pa.float32()),
+    ("useful", pa.int32()),
+    ("funny", pa.int32()),
+    ("cool", pa.int32()),
+    ("year", pa.int16()),
+    ("month", pa.int8()),
+])
+TIP_SCHEMA = pa.schema([
+    ("business_idx", pa.int32()),
+    ("compliment_count", pa.int32()),
+    ("year", pa.int16()),
+])
+
+
+def _fill_nulls(chunked: pa.ChunkedArray) -> pa.ChunkedArray:
+    """Nulls become NaN in float, "" in string and 0 in integer columns"""
+    if not chunked.null_count:
+        return chunked
+    if pa.types.is_floating(chunked.type):
+        return chunked.fill_null(float("nan"))
+    if pa.types.is_string(chunked.type):
+        return chunked.fill_null("")
+    return chunked.fill_null(0)
+
+
+class _BatchWriter:
+    """Accumulate rows per column and write them to an Arrow IPC file as one record batch"""
+
+    def __init__(self, path: str, schema: pa.Schema):
+        self.path = path
+        self.schema = schema
+        self.rows = 0
+        # Batches are staged here so the exporter never holds Python lists for the whole table
+        self._tmp = path + ".parts"
+        self._sink = pa.OSFile(self._tmp, "wb")
+        self._writer = pa.ipc.new_file(self._sink, schema)
+        self._columns = [[] for _ in schema.names]
+
+    def append(self, row) -> None:
+        for column, value in zip(self._columns, row):
+            column.append(value)
+        if len(self._columns[0]) >= _BATCH_ROWS:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._columns[0]:
+            return
+        arrays = [pa.array(column, type=field.type) for column, field in zip(self._columns, self.schema)]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self.rows += len(self._columns[0])
+        self._columns = [[] for _ in self.schema.names]
+
+    def close(self) -> int:
+        self.flush()
+        self._writer.close()
+        self._sink.close()
+        with pa.memory_map(self._tmp, "r") as source:
+            table = pa.ipc.open_file(source).read_all().combine_chunks()
+            table = pa.Table.from_arrays([_fill_nulls(column) for column in table.columns], schema=self.schema)
+            with pa.OSFile(self.path, "wb") as sink, pa.ipc.new_file(sink, self.schema) as writer:
+                writer.write_table(table, max_chunksize=max(table.num_rows, 1))
+        os.remove(self._tmp)
+        return self.rows
+
+
+def _checkin_counts(db: Session) -> Dict[str, int]:
+    from ..db import models
+    # ``date`` holds a comma-separated list of check-in timestamps
+    entries = func.length(models.Checkin.date) - func.length(func.replace(models.Checkin.date, ",", "")) + 1
+    rows = db.query(models.Checkin.business_id, func.sum(entries)).group_by(models.Checkin.business_id)
+    return {business_id: int(count or 0) for business_id, count in rows}
+
+
+def _prune(directory: str, keep: int) -> None:
+    """Remove all but the newest ``keep`` version directories"""
+    versions = []
+    for name in os.listdir(directory):
+        try:
+            datetime.strptime(name, _VERSION_FORMAT)
+        except ValueError:
+            continue
+        versions.append(name)
+    for name in sorted(versions)[:-keep]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def export(directory: str) -> Dict[str, int]:
+    """Write business/reviews/tips snapshots to a new version under ``directory``; returns row counts"""
+    if settings.db_shard_urls:
+        raise ValueError("Snapshots read reviews and tips from the primary and cannot be exported with DB_SHARD_URLS set")
+    from ..db import models
+    from ..db.database import SessionLocal
+
+    version = datetime.now(timezone.utc).strftime(_VERSION_FORMAT)
+    path = os.path.join(directory, version)
+    os.makedirs(path)
+    started = time.perf_counter()
+    counts = {}
+    db = SessionLocal()
+    try:
+        checkins = _checkin_counts(db)
+        business_idx: Dict[str, int] = {}
+        writer = _BatchWriter(os.path.join(path, "business.arrow"), BUSINESS_SCHEMA)
+        rows = db.query(
+            models.Business.business_id, models.Business.name, models.Business.city,
+            models.Business.state, models.Business.stars, models.Business.review_count,
+            models.Business.is_open,
+        ).yield_per(_BATCH_ROWS)
+        for row in rows:
+            business_idx[row.business_id] = len(business_idx)
+            writer.append((*row, checkins.get(row.business_id, 0)))
+        counts["business"] = writer.close()
+
+        writer = _BatchWriter(os.path.join(path, "reviews.arrow"), REVIEW_SCHEMA)
+        rows = db.query(
+            models.Review.business_id, models.Review.stars, models.Review.useful,
+            models.Review.funny, models.Review.cool, models.Review.year, models.Review.month,
+        ).yield_per(_BATCH_ROWS)
+        for business_id, *values in rows:
+            writer.append((business_idx.get(business_id, -1), *values))
+        counts["reviews"] = writer.close()
+
+        writer = _BatchWriter(os.path.join(path, "tips.arrow"), TIP_SCHEMA)
+        rows = db.query(
+            models.Tip.business_id, models.Tip.compliment_count, models.Tip.year,
+        ).yield_per(_BATCH_ROWS)
+        for business_id, *values in rows:
+            writer.append((business_idx.get(business_id, -1), *values))
+        counts["tips"] = writer.close()
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+    finally:
+        db.close()
+
+    manifest = {"version": version, "exported_at": datetime.now(timezone.utc).isoformat(), "rows": counts}
+    tmp = os.path.join(directory, MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+    _prune(directory, _KEEP_VERSIONS)
+    logger.info("Analytics snapshot %s %s written in %.1fs", version, counts, time.perf_counter() - started)
+    return counts
+
+
+class Snapshot:
+    """One exported snapshot; columns are converted to NumPy once and reused"""
+
+    def __init__(self, exported_at: str, business: pa.Table, reviews: pa.Table, tips: pa.Table):
+        self.exported_at = exported_at
+        self.business = business
+        self.reviews = reviews
+        self.tips = tips
+        self._columns: Dict[Tuple[str, str], np.ndarray] = {}
+
+    def column(self, table: str, name: str) -> np.ndarray:
+        """Column as a NumPy array; nulls become NaN in float, "" in string and 0 in integer columns"""
+        key = (table, name)
+        array = self._columns.get(key)
+        if array is None:
+            chunked = getattr(self, table).column(name)
+            if chunked.num_chunks == 1 and not chunked.null_count and not pa.types.is_string(chunked.type):
+                # A view of the memory-mapped file, shared by every worker
+                array = chunked.chunk(0).to_numpy(zero_copy_only=True)
+            else:
+                # String columns, and snapshots written before columns were single chunks, are copied per worker
+                array = _fill_nulls(chunked).to_numpy(zero_copy_only=False)
+            self._columns[key] = array
+        return array
+
+
+class SnapshotStore:
+    """Memory-mapped view of the latest snapshot, reopened when the manifest changes"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._snapshot: Optional[Snapshot] = None
+        self._manifest_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _open(self, version: str, name: str) -> pa.Table:
+        source = pa.memory_map(os.path.join(self.directory, version, name), "r")
+        return pa.ipc.open_file(source).read_all()
+
+    def get(self) -> Optional[Snapshot]:
+        """Current snapshot, or None if none has been exported yet"""
+        try:
+            mtime = os.stat(os.path.join(self.directory, MANIFEST)).st_mtime
+        except FileNotFoundError:
+            return None
+        if mtime != self._manifest_mtime:
+            with self._lock:
+                if mtime != self._manifest_mtime:
+                    with open(os.path.join(self.directory, MANIFEST)) as f:
+                        manifest = json.load(f)
+                    version = manifest["version"]
+                    try:
+                        self._snapshot = Snapshot(
+                            exported_at=manifest["exported_at"],
+                            business=self._open(version, "business.arrow"),
+                            reviews=self._open(version, "reviews.arrow"),
+                            tips=self._open(version, "tips.arrow"),
+                        )
+                    except FileNotFoundError:
+                        # Pruned by exports that ran since the manifest was read; retried next call
+                        logger.warning("Analytics snapshot %s is gone, keeping the previous one", version)
+                        return self._snapshot
+                    self._manifest_mtime = mtime
+        return self._snapshot
+
+
+snapshot_store = SnapshotStore(settings.analytics_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=settings.analytics_dir, help="output directory (default: ANALYTICS_DIR)")
+    parser.add_argument("--every", type=float, default=0, help="re-export every N seconds instead of once")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    while True:
+        try:
+            export(args.dir)
+        except ValueError as exc:
+            parser.error(str(exc))
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+from typing import List, Literal, Optional
+
+from ..core.cache import response_cache
+from ..core.config import settings
+from ..core.live import live_hub
+from ..core.load_shedding import concurrency_limiter
+from ..core.names import name_dictionaries
+from ..core.profiler import SamplingProfiler, profile_lock
+from ..core.security import require_admin_key
+from ..db import models
+from ..db.changes import change_feed
+from ..db.database import get_db_session, slow_query_log
+from ..jobs import integrity, runner
+from ..schemas import schemas
+
+router = APIRouter(dependencies=[Depends(require_admin_key)])
+
+get_db = get_db_session()
+
+@router.get("/slow-queries")
+def read_slow_queries(
+    order_by: Literal["total_ms", "max_ms", "mean_ms", "count", "last_seen"] = "total_ms",
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Get slow statements aggregated by fingerprint, with captured EXPLAIN plans"""
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "queries": slow_query_log.snapshot(order_by=order_by, limit=limit),
+    }
+
+@router.delete("/slow-queries")
+def reset_slow_queries():
+    """Clear the slow-query log"""
+    slow_query_log.reset()
+    return {"status": "cleared"}
+
+@router.get("/cache")
+def read_cache_stats():
+    """Get response cache statistics"""
+    return response_cache.stats()
+
+@router.delete("/cache")
+def clear_cache():
+    """Clear the response cache"""
+    response_cache.clear()
+    return {"status": "cleared"}
+
+@router.get("/load")
+def read_load_stats():
+    """Get the adaptive concurrency limiter state"""
+    return concurrency_limiter.stats()
+
+@router.get("/names")
+def read_name_dictionary_stats():
+    """Get name enrichment dictionary sizes, memory use and refresh state"""
+    return name_dictionaries.stats()
+
+@router.get("/changes")
+def read_change_feed_stats():
+    """Get change feed listener status and notification counts"""
+    return change_feed.stats()
+
+@router.get("/live")
+def read_live_feed_stats():
+    """Get live feed subscriber and delivery counts for this worker"""
+    return live_hub.stats()
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10.0, gt=0, le=settings.profiler_max_seconds),
+    interval_ms: float = Query(settings.profiler_interval_ms, ge=1, le=1000),
+):
+    """Sample the answering worker's Python stacks for ``seconds``; collapsed stacks for flamegraph.pl or speedscope"""
+    if not profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+    try:
+        profiler = SamplingProfiler(interval_ms / 1000).start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+    finally:
+        profile_lock.release()
+    return PlainTextResponse(profiler.collapsed(), headers={**profiler.headers(), "Cache-Control": "no-store"})
+
+@router.get("/jobs")
+def read_jobs(limit: int = Query(20, ge=1, le=200), db: Session = Depends(get_db)):
+    """List available maintenance jobs, this worker's runner and the most recent runs"""
+    jobs = db.query(models.MaintenanceJob).order_by(models.MaintenanceJob.id.desc()).limit(limit).all()
+    return {
+        "available": {name: job.description for name, job in sorted(runner.available_jobs().items())},
+        "runner": runner.job_runner.stats(),
+        "jobs": [schemas.MaintenanceJob.model_validate(job) for job in jobs],
+    }
+
+@router.post("/jobs", response_model=schemas.MaintenanceJob, status_code=202)
+def create_job(job: schemas.MaintenanceJobCreate, db: Session = Depends(get_db)):
+    """Queue a maintenance job; a runner picks it up within JOBS_POLL_SECONDS"""
+    params = job.model_dump(exclude={"name"}, exclude_none=True)
+    try:
+        return runner.enqueue(db, job.name, params)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+@router.get("/jobs/{job_id}", response_model=schemas.MaintenanceJob)
+def read_job(job_id: int, db: Session = Depends(get_db)):
+    """Get a maintenance job's status and progress"""
+    job = db.get(models.MaintenanceJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs/{job_id}/cancel", response_model=schemas.MaintenanceJob)
+def cancel_job(job_id: int, db: Session = Depends(get_db)):
+    """Cancel a queued job, or stop a running one before its next batch"""
+    job = runner.request_cancel(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs/{job_id}/resume", response_model=schemas.MaintenanceJob)
+def resume_job(job_id: int, db: Session = Depends(get_db)):
+    """Requeue a failed or cancelled job from its last checkpoint"""
+    job = runner.resume(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != "queued":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return job
+
+@router.get("/integrity")
+def read_integrity_summary(db: Session = Depends(get_db)):
+    """Open integrity findings per check and the coverage and last run of every scan"""
+    return integrity.summary(db)
+
+@router.get("/integrity/findings", response_model=List[schemas.IntegrityFinding])
+def read_integrity_findings(
+    check_name: Optional[str] = None,
+    user_id: Optional[str] = None,
+    business_id: Optional[str] = None,
+    after_id: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """List integrity findings; page with ``after_id`` set to the last ``id`` returned"""
+    query = db.query(models.IntegrityFinding).filter(models.IntegrityFinding.id > after_id)
+    if check_name:
+        query = query.filter(models.IntegrityFinding.check_name == check_name)
+    if user_id:
+        query = query.filter(models.IntegrityFinding.user_id == user_id)
+    if business_id:
+        query = query.filter(models.IntegrityFinding.business_id == business_id)
+    return query.order_by(models.IntegrityFinding.id).limit(limit).all()
+
+@router.post("/integrity/scan", response_model=List[schemas.MaintenanceJob], status_code=202)
+def start_integrity_scan(full: bool = False, db: Session = Depends(get_db)):
+    """Queue every integrity scan not already queued or running (incremental unless ``full``)"""
+    return integrity.enqueue_scans(db, full=full)
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Literal
+
+from ..analytics import aggregates
+from ..analytics.snapshot import Snapshot, snapshot_store
+
+router = APIRouter()
+
+def _snapshot() -> Snapshot:
+    snapshot = snapshot_store.get()
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Analytics snapshot not exported yet")
+    return snapshot
+
+@router.get("/snapshot")
+def read_snapshot_info():
+    """Get the export time and row counts of the snapshot answering analytics queries"""
+    snapshot = _snapshot()
+    return {
+        "exported_at": snapshot.exported_at,
+        "rows": {name: getattr(snapshot, name).num_rows for name in ("business", "reviews", "tips")},
+    }
+
+@router.get("/stars")
+def read_star_distribution(
+    by: Literal["city", "state", "year"] = "city",
+    min_reviews: int = Query(100, ge=1),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    """Get review count, mean stars and star histogram grouped by city, state or year"""
+    snapshot = _snapshot()
+    groups = aggregates.star_distribution(snapshot, by, min_reviews, limit)
+    return {"exported_at": snapshot.exported_at, "by": by, "groups": groups}
+
+@router.get("/votes")
+def read_vote_correlations():
+    """Get correlations between review stars and useful/funny/cool votes"""
+    snapshot = _snapshot()
+    result = aggregates.vote_correlations(snapshot)
+    return {"exported_at": snapshot.exported_at, **result}
+
+@router.get("/checkins")
+def read_checkins_vs_rating(buckets: int = Query(10, ge=2, le=100)):
+    """Get business rating against check-in volume (quantile buckets and correlations)"""
+    snapshot = _snapshot()
+    result = aggregates.checkins_vs_rating(snapshot, buckets)
+    return {"exported_at": snapshot.exported_at, **result}
@@ -1,27 +1,145 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+import binascii
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Literal, Optional
 
-from ..db.database import SessionLocal
+from ..core.config import settings
+from ..core.suggest import suggest_service
+from ..db.database import get_db_session, run_in_sessions
 from ..crud import crud
 from ..schemas import schemas
 
 router = APIRouter()
 
-# Dependency to get the database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Dependency to get the database session (statement timeout, query cancelled on client disconnect)
+get_db = get_db_session()
+get_search_db = get_db_session(settings.search_statement_timeout_ms)
 
 @router.get("/", response_model=List[schemas.Business])
-def read_businesses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_businesses(skip: int = Query(0, ge=0, le=settings.max_skip), limit: int = 100, db: Session = Depends(get_db)):
     """Get all businesses with pagination"""
     businesses = crud.get_businesses(db, skip=skip, limit=limit)
     return businesses
 
+@router.get("/suggest", response_model=List[schemas.BusinessSuggestion])
+def suggest_businesses(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    rank_by: Literal["review_count", "stars"] = "review_count",
+    db: Session = Depends(get_search_db),
+):
+    """Typeahead: top businesses whose name (or any word in it) starts with ``q``"""
+    index = suggest_service.businesses
+    if index is not None:
+        return index.suggest(q, limit, rank_by)
+    # Index still building (or disabled): the same word-start match in SQL
+    return crud.suggest_businesses(db, prefix=q, limit=limit, rank_by=rank_by)
+
+def _encode_cursor(score: float, business_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([score, business_id]).encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        score, business_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), str(business_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+_DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+def _parse_open_at(open_at: str):
+    """"Monday,18:30" (or "mon,18:30") -> (day of week with Monday = 0, minute of day)"""
+    try:
+        day, clock = (part.strip().lower() for part in open_at.split(","))
+        dow = next(i for i, name in enumerate(_DAYS) if len(day) >= 3 and name.startswith(day))
+        hour, minute = (int(part) for part in clock.split(":"))
+    except (ValueError, StopIteration):
+        raise HTTPException(status_code=400, detail="open_at must look like Monday,18:30")
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise HTTPException(status_code=400, detail="open_at time must be between 00:00 and 23:59")
+    return dow, hour * 60 + minute
+
+def _attribute_value(value: str):
+    """Query strings carry text; match the JSON types the attributes were stored with"""
+    lowered = value.lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    if lowered in ("none", "null"):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+def _attribute_filters(request: Request) -> dict:
+    """``attributes.WiFi=free&attributes.BusinessParking.garage=true`` -> a JSON containment document"""
+    document: dict = {}
+    for key, value in request.query_params.multi_items():
+        if not key.startswith("attributes."):
+            continue
+        *parents, name = key.split(".")[1:]
+        node = document
+        for parent in parents:
+            node = node.setdefault(parent, {})
+            if not isinstance(node, dict):
+                raise HTTPException(status_code=400, detail=f"Conflicting attribute filters for {key}")
+        node[name] = _attribute_value(value)
+    return document
+
+@router.get("/search", response_model=schemas.BusinessSearchPage)
+def search_businesses(
+    request: Request,
+    q: Optional[str] = Query(None, min_length=1, max_length=100),
+    city: Optional[str] = None,
+    state: Optional[str] = None,
+    min_stars: Optional[float] = Query(None, ge=0, le=5),
+    categories: Optional[str] = Query(None, description="Comma-separated; every category must match"),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0),
+    open_at: Optional[str] = Query(None, description="Open at a day and time, e.g. Monday,18:30"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_search_db),
+):
+    """Fuzzy, ranked search over name (trigram similarity), location, stars and popularity.
+
+    At least one of ``q``, ``city`` or ``lat``/``lon`` with ``radius_km`` is required.
+
+    ``attributes.<name>=<value>`` query parameters (nested with dots, e.g.
+    ``attributes.BusinessParking.garage=true``) filter by attribute value
+    through the attributes GIN index; ``open_at`` keeps businesses open at
+    that time. Pass ``next_cursor`` back as ``cursor`` to fetch the following page.
+    """
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=400, detail="lat and lon must be given together")
+    if radius_km is not None and lat is None:
+        raise HTTPException(status_code=400, detail="radius_km needs lat and lon")
+    # Every matching row is scored and sorted, so an unfiltered search would rank the whole table
+    if not (q or city or radius_km is not None):
+        raise HTTPException(status_code=400, detail="Search needs q, city or lat/lon with radius_km")
+    rows = crud.search_businesses(
+        db,
+        q=q,
+        city=city,
+        state=state,
+        min_stars=min_stars,
+        categories=[c.strip() for c in categories.split(",") if c.strip()] if categories else None,
+        latitude=lat,
+        longitude=lon,
+        radius_km=radius_km,
+        attributes=_attribute_filters(request) or None,
+        open_at=_parse_open_at(open_at) if open_at else None,
+        after=_decode_cursor(cursor) if cursor else None,
+        limit=limit,
+    )
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = _encode_cursor(rows[-1].score, rows[-1].business_id)
+    return {"results": rows, "next_cursor": next_cursor}
+
 @router.get("/{business_id}", response_model=schemas.Business)
 def read_business(business_id: str, db: Session = Depends(get_db)):
     """Get a specific business by ID"""
@@ -31,25 +149,79 @@ def read_business(business_id: str, db: Session = Depends(get_db)):
     return business
 
 @router.get("/city/{city}", response_model=List[schemas.Business])
-def read_businesses_by_city(city: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_businesses_by_city(city: str, skip: int = Query(0, ge=0, le=settings.max_skip), limit: int = 100, db: Session = Depends(get_db)):
     """Get businesses by city"""
     businesses = crud.get_businesses_by_city(db, city=city, skip=skip, limit=limit)
     return businesses
 
 @router.get("/stars/{min_stars}", response_model=List[schemas.Business])
-def read_businesses_by_stars(min_stars: float, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_businesses_by_stars(min_stars: float, skip: int = Query(0, ge=0, le=settings.max_skip), limit: int = 100, db: Session = Depends(get_db)):
     """Get businesses with minimum star rating"""
     businesses = crud.get_businesses_by_stars(db, min_stars=min_stars, skip=skip, limit=limit)
     return businesses
 
 @router.get("/state/{state}", response_model=List[schemas.Business])
-def read_businesses_by_state(state: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_businesses_by_state(state: str, skip: int = Query(0, ge=0, le=settings.max_skip), limit: int = 100, db: Session = Depends(get_db)):
     """Get businesses by state"""
     businesses = crud.get_businesses_by_state(db, state=state, skip=skip, limit=limit)
     return businesses
 
 @router.get("/search/{name}", response_model=List[schemas.Business])
-def search_businesses_by_name(name: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def search_businesses_by_name(name: str, skip: int = Query(0, ge=0, le=settings.max_skip), limit: int = 100, db: Session = Depends(get_search_db)):
     """Search businesses by name (case-insensitive partial match)"""
     businesses = crud.get_businesses_by_name(db, name=name, skip=skip, limit=limit)
-    return businesses
\ No newline at end of file
+    return businesses
+
+# After the two-segment routes above, which /{business_id}/... would otherwise shadow (e.g. /city/page)
+@router.get("/{business_id}/page", response_model=schemas.BusinessPage)
+async def read_business_page(
+    business_id: str,
+    request: Request,
+    response: Response,
+    reviews: int = Query(settings.business_page_reviews, ge=0, le=settings.max_page_size),
+    tips: int = Query(settings.business_page_tips, ge=0, le=25),
+    checkins: int = Query(settings.business_page_checkins, ge=0, le=settings.max_page_size),
+):
+    """Business with its first reviews, tips and checkins in one response (0 skips a section).
+
+    The four queries run concurrently on separate connections, so the page costs
+    one round trip and the latency of the slowest query; per-section timings are
+    returned in ``Server-Timing``.
+    """
+    sections = {
+        "business": lambda db: crud.get_business(db, business_id=business_id),
+        "reviews": lambda db: [
+            schemas.ReviewWithNames.model_validate(r)
+            for r in crud.get_reviews_by_business_with_names(db, business_id=business_id, limit=reviews)
+        ] if reviews else [],
+        "tips": lambda db: [
+            schemas.TipWithNames.model_validate(t)
+            for t in crud.get_tips_by_business_with_names(db, business_id=business_id, limit=tips)
+        ] if tips else [],
+        "checkins": lambda db: crud.get_checkins_by_business(db, business_id=business_id, limit=checkins) if checkins else [],
+    }
+    results = await run_in_sessions(
+        request,
+        list(sections.values()),
+        concurrent=settings.business_page_concurrent and not settings.serverless,
+    )
+    page = {name: result for name, (result, _) in zip(sections, results)}
+    if page["business"] is None:
+        raise HTTPException(status_code=404, detail="Business not found")
+    response.headers["Server-Timing"] = ", ".join(
+        f"{name};dur={elapsed_ms:.1f}" for name, (_, elapsed_ms) in zip(sections, results)
+    )
+    return page
+
+@router.get("/{business_id}/similar", response_model=List[schemas.SimilarBusiness])
+def read_similar_businesses(business_id: str, limit: int = Query(10, ge=1, le=50), db: Session = Depends(get_db)):
+    """Businesses most often reviewed by the same people (precomputed by src.jobs.similar_businesses)"""
+    rows = crud.get_similar_businesses(db, business_id=business_id, limit=limit)
+    if not rows and crud.get_business(db, business_id=business_id) is None:
+        raise HTTPException(status_code=404, detail="Business not found")
+    return [
+        schemas.SimilarBusiness(
+            **schemas.Business.model_validate(business).model_dump(), score=score, support=support
+        )
+        for business, score, support in rows
+    ]
\ No newline at end of file
@@ -1,23 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List
 
-from ..db.database import SessionLocal
+from ..core.config import settings
+from ..db.database import get_db_session
 from ..crud import crud
 from ..schemas import schemas
 
 router = APIRouter()
 
-# Dependency to get the database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Dependency to get the database session (statement timeout, query cancelled on client disconnect)
+get_db = get_db_session()
 
 @router.get("/", response_model=List[schemas.Checkin])
-def read_checkins(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_checkins(skip: int = Query(0, ge=0, le=settings.max_skip), limit: int = 100, db: Session = Depends(get_db)):
     """Get all checkins with pagination"""
     checkins = crud.get_checkins(db, skip=skip, limit=limit)
     return checkins
@@ -31,7 +27,7 @@ def read_checkin(business_id: str, date: str, db: Session = Depends(get_db)):
     return checkin
 
 @router.get("/business/{business_id}", response_model=List[schemas.Checkin])
-def read_checkins_by_business(business_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_checkins_by_business(business_id: str, skip: int = Query(0, ge=0, le=settings.max_skip), limit: int = 100, db: Session = Depends(get_db)):
     """Get checkins for a specific business"""
     checkins = crud.get_checkins_by_business(db, business_id=business_id, skip=skip, limit=limit)
     return checkins
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Response
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..core.config import settings
+
+router = APIRouter()
+
+@router.get("/")
+def read_root():
+    """Root endpoint"""
+    return {
+        "message": "Welcome to Yelp Data API",
+        "version": settings.api_version,
+        "docs": "/docs"
+    }
+
+@router.get("/health")
+@router.get("/health/live")
+def health_check():
+    """Liveness check: the process is up and serving requests (no database access)"""
+    return {"status": "healthy"}
+
+@router.get("/health/ready")
+def readiness_check(response: Response):
+    """Readiness check: a pooled connection works, the schema is at the expected revision and warmup has finished"""
+    # Imported here so liveness stays free of database imports (keeps Lambda cold starts small)
+    from ..core.warmup import warmup
+    from ..db.database import engine
+    from ..db.migrate import current_revision, expected_revision
+
+    expected = expected_revision()
+    try:
+        with engine.connect() as connection:
+            current = current_revision(connection)
+    except SQLAlchemyError as e:
+        response.status_code = 503
+        return {"status": "unavailable", "database": "unreachable", "error": str(e.__class__.__name__)}
+
+    if current != expected:
+        response.status_code = 503
+        return {"status": "unavailable", "schema_revision": current, "expected_revision": expected}
+    if not warmup.finished:
+        response.status_code = 503
+        return {"status": "warming", "schema_revision": current, "warmup": warmup.stats()}
+    return {"status": "ready", "schema_revision": current}
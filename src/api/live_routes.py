@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import List
+
+from ..core.config import settings
+from ..core.live import live_hub
+
+router = APIRouter()
+
+@router.get("/events")
+async def live_events(
+    business_id: List[str] = Query([]),
+    user_id: List[str] = Query([]),
+    city: List[str] = Query([]),
+):
+    """Stream new reviews and tips for the given businesses, users and cities as Server-Sent Events"""
+    if not live_hub.running:
+        raise HTTPException(status_code=503, detail="Live feed is disabled")
+    topics = {("business", value) for value in business_id}
+    topics |= {("user", value) for value in user_id}
+    topics |= {("city", value) for value in city}
+    if not topics:
+        raise HTTPException(status_code=400, detail="Subscribe to at least one business_id, user_id or city")
+    if len(topics) > settings.live_max_topics:
+        raise HTTPException(status_code=400, detail=f"At most {settings.live_max_topics} subscriptions per stream")
+    subscriber = live_hub.subscribe(topics)
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="Too many live subscribers, retry later", headers={"Retry-After": "5"})
+    return StreamingResponse(
+        live_hub.stream(subscriber),
+        media_type="text/event-stream",
+        # no-store keeps the stream out of caches; nginx would otherwise buffer it
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
@@ -1,23 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from typing import List
 
-from ..db.database import SessionLocal
+from ..core.config import settings
+from ..core.security import require_ingest_key
+from ..db.database import get_db_session
 from ..crud import crud
 from ..schemas import schemas
 
 router = APIRouter()
 
-# Dependency to get the database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Dependency to get the database session (statement timeout, query cancelled on client disconnect)
+get_db = get_db_session()
+get_debug_db = get_db_session(settings.debug_statement_timeout_ms)
+get_ingest_db = get_db_session(settings.ingest_statement_timeout_ms)
 
 @router.get("/", response_model=List[schemas.ReviewWithNames])
-def read_reviews(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_reviews(skip: int = Query(0, ge=0, le=settings.max_skip), limit: int = 100, db: Session = Depends(get_db)):
     """Get all reviews with pagination, including user and business names"""
     reviews = crud.get_reviews_with_names(db, skip=skip, limit=limit)
     return [
@@ -61,7 +61,7 @@ def read_review(review_id: str, db: Session = Depends(get_db)):
     )
 
 @router.get("/business/{business_id}", response_model=List[schemas.ReviewWithNames])
-def read_reviews_by_business(business_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_reviews_by_business(business_id: str, skip: int = Query(0, ge=0, le=settings.max_skip), limit: int = 100, db: Session = Depends(get_db)):
     """Get reviews for a specific business, including user and business names"""
     reviews = crud.get_reviews_by_business_with_names(db, business_id=business_id, skip=skip, limit=limit)
     return [
@@ -83,56 +83,12 @@ def read_reviews_by_business(business_id: str, skip: int = 0, limit: int = 100,
     ]
 
 @router.get("/debug/user/{user_id}")
-def debug_user_reviews(user_id: str, db: Session = Depends(get_db)):
-    """Debug endpoint to analyze review count discrepancies"""
-    from ..db import models
-    
-    # Get user's stated review count
-    user = db.query(models.User).filter(models.User.user_id == user_id).first()
-    user_review_count = user.review_count if user else 0
-    
-    # Count total reviews for this user
-    total_reviews = db.query(models.Review).filter(models.Review.user_id == user_id).count()
-    
-    # Count reviews with valid business_id
-    reviews_with_business = db.query(models.Review).filter(
-        models.Review.user_id == user_id,
-        models.Review.business_id.isnot(None)
-    ).count()
-    
-    # Count reviews that pass the JOIN (what API returns)
-    join_count = db.query(models.Review).join(
-        models.User, models.Review.user_id == models.User.user_id, isouter=True
-    ).join(
-        models.Business, models.Review.business_id == models.Business.business_id, isouter=True
-    ).filter(models.Review.user_id == user_id).count()
-    
-    # Find orphaned reviews (business_id that doesn't exist in business table)
-    orphaned_reviews = db.query(models.Review).filter(
-        models.Review.user_id == user_id
-    ).outerjoin(models.Business, models.Review.business_id == models.Business.business_id).filter(
-        models.Business.business_id.is_(None),
-        models.Review.business_id.isnot(None)
-    ).all()
-    
-    return {
-        "user_id": user_id,
-        "user_stated_review_count": user_review_count,
-        "total_reviews_in_db": total_reviews,
-        "reviews_with_business_id": reviews_with_business,
-        "reviews_passing_join": join_count,
-        "orphaned_reviews": len(orphaned_reviews),
-        "orphaned_review_details": [
-            {
-                "review_id": r.review_id,
-                "business_id": r.business_id,
-                "text_snippet": r.text[:100] if r.text else None
-            } for r in orphaned_reviews[:5]  # First 5 only
-        ]
-    }
+def debug_user_reviews(user_id: str, db: Session = Depends(get_debug_db)):
+    """Debug endpoint to analyze review count discrepancies (orphans as of the last integrity scan)"""
+    return crud.get_user_review_diagnostics(db, user_id=user_id)
 
 @router.get("/user/{user_id}", response_model=List[schemas.ReviewWithNames])
-def read_reviews_by_user(user_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_reviews_by_user(user_id: str, skip: int = Query(0, ge=0, le=settings.max_skip), limit: int = 100, db: Session = Depends(get_db)):
     """Get reviews by a specific user, including user and business names"""
     reviews = crud.get_reviews_by_user_with_names(db, user_id=user_id, skip=skip, limit=limit)
     return [
@@ -151,4 +107,24 @@ def read_reviews_by_user(user_id: str, skip: int = 0, limit: int = 100, db: Sess
             user_name=r.user_name,
             business_name=r.business_name
         ) for r in reviews
-    ]
\ No newline at end of file
+    ]
+
+@router.post("/", response_model=schemas.Review, status_code=201, dependencies=[Depends(require_ingest_key)])
+def create_review(review: schemas.ReviewCreate, db: Session = Depends(get_ingest_db)):
+    """Create a review and update the user's and business's review counts and stars"""
+    result = crud.create_reviews(db, [review])
+    if result["rejected"]:
+        raise HTTPException(status_code=422, detail=result["rejected"][0]["reason"])
+    if result["duplicates"]:
+        raise HTTPException(status_code=409, detail="Review already exists")
+    if result["queued"]:
+        # Committed, but its shard is unavailable; the shard_outbox job inserts it there
+        return JSONResponse(status_code=202, content={"detail": "Review queued for its shard", "review_id": result["review_ids"][0]})
+    return crud.get_review(db, review_id=result["review_ids"][0])
+
+@router.post("/bulk", response_model=schemas.ReviewIngestResult, dependencies=[Depends(require_ingest_key)])
+def create_reviews_bulk(reviews: List[schemas.ReviewCreate], db: Session = Depends(get_ingest_db)):
+    """Create up to INGEST_MAX_BATCH reviews in one transaction; duplicates are skipped and unknown users/businesses rejected"""
+    if len(reviews) > settings.ingest_max_batch:
+        raise HTTPException(status_code=413, detail=f"At most {settings.ingest_max_batch} reviews per request")
+    return crud.create_reviews(db, reviews)
\ No newline at end of file
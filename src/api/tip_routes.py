@@ -1,23 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from typing import List
 
-from ..db.database import SessionLocal
+from ..core.config import settings
+from ..core.security import require_ingest_key
+from ..db.database import get_db_session
 from ..crud import crud
 from ..schemas import schemas
 
 router = APIRouter()
 
-# Dependency to get the database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Dependency to get the database session (statement timeout, query cancelled on client disconnect)
+get_db = get_db_session()
+get_ingest_db = get_db_session(settings.ingest_statement_timeout_ms)
 
 @router.get("/", response_model=List[schemas.TipWithNames])
-def read_tips(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_tips(skip: int = Query(0, ge=0, le=settings.max_skip), limit: int = 100, db: Session = Depends(get_db)):
     """Get all tips with pagination, including user and business names"""
     tips = crud.get_tips_with_names(db, skip=skip, limit=limit)
     return [
@@ -42,7 +41,7 @@ def read_tip(user_id: str, business_id: str, db: Session = Depends(get_db)):
     return tip
 
 @router.get("/business/{business_id}", response_model=List[schemas.TipWithNames])
-def read_tips_by_business(business_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_tips_by_business(business_id: str, skip: int = Query(0, ge=0, le=settings.max_skip), limit: int = 100, db: Session = Depends(get_db)):
     """Get tips for a specific business, including user and business names"""
     tips = crud.get_tips_by_business_with_names(db, business_id=business_id, skip=skip, limit=limit)
     return [
@@ -59,7 +58,7 @@ def read_tips_by_business(business_id: str, skip: int = 0, limit: int = 100, db:
     ]
 
 @router.get("/user/{user_id}", response_model=List[schemas.TipWithNames])
-def read_tips_by_user(user_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_tips_by_user(user_id: str, skip: int = Query(0, ge=0, le=settings.max_skip), limit: int = 100, db: Session = Depends(get_db)):
     """Get tips by a specific user, including user and business names"""
     tips = crud.get_tips_by_user_with_names(db, user_id=user_id, skip=skip, limit=limit)
     return [
@@ -74,3 +73,23 @@ def read_tips_by_user(user_id: str, skip: int = 0, limit: int = 100, db: Session
             business_name=t.business_name
         ) for t in tips
     ]
+
+@router.post("/", response_model=schemas.Tip, status_code=201, dependencies=[Depends(require_ingest_key)])
+def create_tip(tip: schemas.TipCreate, db: Session = Depends(get_ingest_db)):
+    """Create a tip (one per user and business)"""
+    result = crud.create_tips(db, [tip])
+    if result["rejected"]:
+        raise HTTPException(status_code=422, detail=result["rejected"][0]["reason"])
+    if result["duplicates"]:
+        raise HTTPException(status_code=409, detail="Tip already exists")
+    if result["queued"]:
+        # Committed, but its shard is unavailable; the shard_outbox job inserts it there
+        return JSONResponse(status_code=202, content={"detail": "Tip queued for its shard", "user_id": tip.user_id, "business_id": tip.business_id})
+    return crud.get_tip(db, user_id=tip.user_id, business_id=tip.business_id)
+
+@router.post("/bulk", response_model=schemas.IngestResult, dependencies=[Depends(require_ingest_key)])
+def create_tips_bulk(tips: List[schemas.TipCreate], db: Session = Depends(get_ingest_db)):
+    """Create up to INGEST_MAX_BATCH tips in one transaction; duplicates are skipped and unknown users/businesses rejected"""
+    if len(tips) > settings.ingest_max_batch:
+        raise HTTPException(status_code=413, detail=f"At most {settings.ingest_max_batch} tips per request")
+    return crud.create_tips(db, tips)
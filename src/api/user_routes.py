@@ -1,27 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List
 
-from ..db.database import SessionLocal
+from ..core.config import settings
+from ..core.suggest import suggest_service
+from ..db.database import get_db_session
 from ..crud import crud
 from ..schemas import schemas
 
 router = APIRouter()
 
-# Dependency to get the database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Dependency to get the database session (statement timeout, query cancelled on client disconnect)
+get_db = get_db_session()
+get_search_db = get_db_session(settings.search_statement_timeout_ms)
 
 @router.get("/", response_model=List[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_users(skip: int = Query(0, ge=0, le=settings.max_skip), limit: int = 100, db: Session = Depends(get_db)):
     """Get all users with pagination"""
     users = crud.get_users(db, skip=skip, limit=limit)
     return users
 
+@router.get("/suggest", response_model=List[schemas.UserSuggestion])
+def suggest_users(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_search_db),
+):
+    """Typeahead: most active users whose name (or any word in it) starts with ``q``"""
+    index = suggest_service.users
+    if index is not None:
+        return index.suggest(q, limit)
+    # Index still building (or disabled): the same word-start match in SQL
+    return crud.suggest_users(db, prefix=q, limit=limit)
+
 @router.get("/{user_id}", response_model=schemas.User)
 def read_user(user_id: str, db: Session = Depends(get_db)):
     """Get a specific user by ID"""
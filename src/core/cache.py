@@ -0,0 +1,165 @@
+"""
+In-process response cache.
+
+Entries are keyed by path, query string and negotiated content encoding, so a
+hit replays the already-compressed bytes produced by ``CompressionMiddleware``
+instead of serializing and compressing the response again.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .compression import negotiate_encoding
+from .config import settings
+
+
+class CacheKey(NamedTuple):
+    path: str
+    query: str
+    encoding: str
+
+
+class CachedResponse(NamedTuple):
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    expires_at: float
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[CacheKey, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: CacheKey) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key: CacheKey, status: int, headers: List[Tuple[bytes, bytes]], body: bytes,
+            ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = CachedResponse(status, headers, body, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate: Callable[[CacheKey], bool]) -> int:
+        """Drop every entry whose key matches ``predicate``; returns the number removed"""
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(len(entry.body) for entry in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class ResponseCacheMiddleware:
+    """Serve cached GET responses; must wrap ``CompressionMiddleware`` so compressed bytes are stored"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        cache: ResponseCache,
+        encodings: List[str],
+        path_prefixes: Tuple[str, ...] = ("/api/v1/",),
+        exclude_prefixes: Tuple[str, ...] = ("/api/v1/admin",),
+        max_body_bytes: int = 1_048_576,
+    ):
+        self.app = app
+        self.cache = cache
+        self.encodings = encodings
+        self.path_prefixes = path_prefixes
+        self.exclude_prefixes = exclude_prefixes
+        self.max_body_bytes = max_body_bytes
+
+    def _cacheable(self, scope: Scope) -> bool:
+        path = scope["path"]
+        return (
+            scope["method"] == "GET"
+            and path.startswith(self.path_prefixes)
+            and not path.startswith(self.exclude_prefixes)
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._cacheable(scope):
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = negotiate_encoding(request_headers.get("accept-encoding"), self.encodings) or "identity"
+        key = CacheKey(scope["path"], scope["query_string"].decode("latin-1"), encoding)
+        entry = self.cache.get(key)
+        if entry is not None:
+            await send({
+                "type": "http.response.start",
+                "status": entry.status,
+                "headers": entry.headers + [(b"x-cache", b"HIT")],
+            })
+            await send({"type": "http.response.body", "body": entry.body})
+            return
+
+        status = 0
+        headers: List[Tuple[bytes, bytes]] = []
+        body_parts: List[bytes] = []
+        size = 0
+        storable = True
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, headers, size, storable
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message["headers"])
+                cache_control = Headers(raw=headers).get("cache-control", "")
+                storable = status == 200 and "no-store" not in cache_control
+                message["headers"] = headers + [(b"x-cache", b"MISS")]
+            elif message["type"] == "http.response.body" and storable:
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size > self.max_body_bytes:
+                    storable = False
+                    body_parts.clear()
+                else:
+                    body_parts.append(chunk)
+                if not message.get("more_body", False) and storable:
+                    self.cache.set(key, status, headers, b"".join(body_parts))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_max_entries,
+    ttl_seconds=settings.response_cache_ttl_seconds,
+)
@@ -0,0 +1,145 @@
+"""
+Response compression middleware with content negotiation.
+
+gzip is always available; brotli (``br``) and zstd are used when the optional
+``brotli`` / ``zstandard`` packages are installed.
+"""
+import gzip
+from typing import Callable, Dict, Iterable, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# Streaming responses must not be buffered, so event streams are excluded
+_COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+_NEVER_COMPRESS_TYPES = ("text/event-stream",)
+
+
+def _gzip_encoder(level: int) -> Callable[[bytes], bytes]:
+    # mtime=0 keeps output deterministic so identical bodies compress identically
+    return lambda body: gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def _brotli_encoder(quality: int) -> Callable[[bytes], bytes]:
+    return lambda body: brotli.compress(body, quality=quality)
+
+
+def _zstd_encoder(level: int) -> Callable[[bytes], bytes]:
+    compressor = zstandard.ZstdCompressor(level=level)
+    return lambda body: compressor.compress(body)
+
+
+def build_encoders(
+    encodings: Iterable[str],
+    gzip_level: int = 6,
+    brotli_quality: int = 5,
+    zstd_level: int = 3,
+) -> Dict[str, Callable[[bytes], bytes]]:
+    """Return encoders for the requested encodings, in preference order, skipping unavailable ones"""
+    encoders: Dict[str, Callable[[bytes], bytes]] = {}
+    for encoding in encodings:
+        if encoding == "gzip":
+            encoders["gzip"] = _gzip_encoder(gzip_level)
+        elif encoding == "br" and brotli is not None:
+            encoders["br"] = _brotli_encoder(brotli_quality)
+        elif encoding == "zstd" and zstandard is not None:
+            encoders["zstd"] = _zstd_encoder(zstd_level)
+    return encoders
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available: List[str]) -> Optional[str]:
+    """Pick the best encoding from ``available`` (server preference order) for an Accept-Encoding header"""
+    if not accept_encoding or not available:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+    best = None
+    best_q = 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    content_type = content_type.lower()
+    if content_type.startswith(_NEVER_COMPRESS_TYPES):
+        return False
+    return content_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """Compress buffered responses above ``minimum_size`` using the negotiated encoding"""
+
+    def __init__(self, app: ASGIApp, encoders: Dict[str, Callable[[bytes], bytes]], minimum_size: int = 1024):
+        self.app = app
+        self.encoders = encoders
+        self.available = list(encoders)
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"), self.available)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        body_parts: List[bytes] = []
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or not is_compressible(headers.get("content-type")):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(body_parts)
+            headers = MutableHeaders(raw=list(start_message["headers"]))
+            headers.add_vary_header("Accept-Encoding")
+            if len(body) >= self.minimum_size:
+                body = self.encoders[encoding](body)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+            start_message["headers"] = headers.raw
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
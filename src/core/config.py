@@ -1,5 +1,6 @@
+import os
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     # Database settings
@@ -9,6 +10,102 @@ class Settings(BaseSettings):
     database_password: str = ""
     database_name: str = "postgres"
     
+    # Database pool settings (db_connection_budget > 0 overrides size/overflow and is split across workers,
+    # less each worker's LISTEN connection; it applies per database, so each shard gets the same split)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_connection_budget: int = 0
+    db_pool_timeout_seconds: float = 30.0
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = False
+    
+    # Prepared statement settings (hot CRUD reads are PREPAREd once per pooled connection; turn off
+    # behind transaction-mode poolers such as PgBouncer; never used in serverless mode)
+    db_prepared_statements: bool = True
+    
+    # Shard settings (reviews and tips hash-partitioned by business_id across these databases, see
+    # src/db/shards.py; empty keeps them on the primary; lists merged across shards accept skip up to
+    # db_shard_max_skip)
+    db_shard_urls: List[str] = []
+    db_shard_fanout_threads: int = 16
+    db_shard_max_skip: int = 1000
+    
+    # Query budget settings (statement timeouts in milliseconds; 0 disables)
+    statement_timeout_ms: int = 10000
+    search_statement_timeout_ms: int = 3000
+    debug_statement_timeout_ms: int = 5000
+    max_page_size: int = 100
+    max_skip: int = 10000
+    
+    # Business page settings (default section sizes of /businesses/{id}/page; sections run
+    # concurrently on separate pooled connections unless disabled or serverless)
+    business_page_reviews: int = 10
+    business_page_tips: int = 10
+    business_page_checkins: int = 10
+    business_page_concurrent: bool = True
+    
+    # Typeahead suggestion settings (in-memory prefix index rebuilt every suggest_refresh_seconds)
+    suggest_enabled: bool = True
+    suggest_refresh_seconds: int = 3600
+    suggest_max_users: int = 200000
+    suggest_top_k: int = 10
+    suggest_min_refresh_seconds: float = 300.0
+    
+    # Name enrichment settings (reviews/tips read without joins; names from in-process dictionaries, see src/core/names.py)
+    name_enrichment_enabled: bool = False
+    name_refresh_seconds: int = 21600
+    name_memory_limit_mb: int = 256
+    name_overlay_max_entries: int = 50000
+    
+    # Warmup settings (each worker GETs its hottest pages in process before /health/ready reports ready,
+    # see src/core/warmup.py; paths take {business_id} / {user_id})
+    warmup_enabled: bool = False
+    warmup_budget_seconds: float = 60.0
+    warmup_top_businesses: int = 50
+    warmup_top_users: int = 20
+    warmup_concurrency: int = 4
+    warmup_accept_encoding: str = "gzip, deflate, br, zstd"
+    warmup_business_paths: List[str] = [
+        "/api/v1/businesses/{business_id}",
+        "/api/v1/businesses/{business_id}/page",
+        "/api/v1/reviews/business/{business_id}",
+    ]
+    warmup_user_paths: List[str] = [
+        "/api/v1/users/{user_id}",
+        "/api/v1/reviews/user/{user_id}",
+    ]
+    warmup_pg_prewarm: bool = False
+    warmup_prewarm_relations: List[str] = [
+        "business_pkey",
+        "yelp_users_pkey",
+        "idx_reviews_business_id",
+        "idx_reviews_user_id",
+        "idx_tips_business_id",
+    ]
+    
+    # Change feed (LISTEN/NOTIFY on entity_changes; one listener connection per worker)
+    change_feed_enabled: bool = True
+    
+    # Live feed settings (SSE stream of new reviews/tips per business, user or city, fed by the change feed;
+    # see src/core/live.py; limits are per worker)
+    live_feed_enabled: bool = True
+    live_max_subscribers: int = 10000
+    live_max_topics: int = 50
+    live_queue_size: int = 100
+    live_heartbeat_seconds: float = 15.0
+    
+    # Ranked business search weights
+    search_weight_similarity: float = 1.0
+    search_weight_stars: float = 0.3
+    search_weight_popularity: float = 0.3
+    search_weight_distance: float = 0.5
+    
+    # Analytics snapshot settings (Arrow IPC files written by python -m src.analytics.snapshot)
+    analytics_dir: str = "data/analytics"
+    
+    # Serverless (AWS Lambda) settings: one reused connection per container, suitable for RDS Proxy
+    serverless: bool = False
+    
     # API settings
     api_title: str = "Yelp Data API"
     api_description: str = "FastAPI backend for querying Yelp database"
@@ -19,10 +116,96 @@ class Settings(BaseSettings):
     api_port: int = 8000
     debug: bool = False
     
+    # Production server settings (python -m src.server); workers = 0 means one per CPU core
+    workers: int = 0
+    loop: str = "auto"  # auto | uvloop | asyncio
+    http: str = "auto"  # auto | httptools | h11
+    timeout_keep_alive: int = 5
+    backlog: int = 2048
+    timeout_graceful_shutdown: int = 30
+    limit_concurrency: Optional[int] = None
+    forwarded_allow_ips: str = "127.0.0.1"
+    access_log: bool = False
+    
+    # Response compression settings (encodings listed in server preference order)
+    compression_enabled: bool = True
+    compression_min_size: int = 1024
+    compression_encodings: List[str] = ["br", "zstd", "gzip"]
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 5
+    compression_zstd_level: int = 3
+    
+    # Response cache settings
+    response_cache_enabled: bool = False
+    response_cache_ttl_seconds: float = 60.0
+    response_cache_max_entries: int = 1024
+    response_cache_max_body_bytes: int = 1048576
+    
+    # Static page settings (precomputed JSON written by python -m src.static.generate; served from
+    # static_pages_dir when enabled, otherwise the live query answers)
+    static_pages_enabled: bool = False
+    static_pages_dir: str = "data/static"
+    static_pages_top_businesses: int = 1000
+    static_pages_top_cities: int = 200
+    static_pages_max_age_seconds: float = 172800.0
+    
+    # Rate limiting settings (token bucket per API key or client IP; backend: memory | redis)
+    rate_limit_enabled: bool = False
+    rate_limit_per_second: float = 10.0
+    rate_limit_burst: int = 40
+    rate_limit_backend: str = "memory"
+    rate_limit_redis_url: str = "redis://localhost:6379/0"
+    rate_limit_max_clients: int = 100000
+    
+    # Load shedding settings (adaptive concurrency cap in front of DB-bound routes)
+    load_shedding_enabled: bool = False
+    concurrency_limit_initial: int = 10
+    concurrency_limit_min: int = 2
+    concurrency_limit_max: int = 50
+    concurrency_target_latency_ms: float = 500.0
+    concurrency_queue_timeout_ms: float = 200.0
+    
+    # Ingest (write API) settings
+    ingest_api_keys: List[str] = []
+    ingest_max_batch: int = 10000
+    ingest_statement_timeout_ms: int = 60000
+    
+    # Maintenance job settings (src/jobs/runner.py; run by the sidecar or, when enabled, inside API workers)
+    jobs_runner_enabled: bool = False
+    jobs_batch_size: int = 2000
+    jobs_duty_cycle: float = 0.25
+    jobs_poll_seconds: float = 5.0
+    jobs_stale_seconds: float = 120.0
+    jobs_statement_timeout_ms: int = 30000
+    jobs_lock_timeout_ms: int = 2000
+    jobs_schedule: Dict[str, float] = {}
+    
+    # Admin settings (admin endpoints are disabled while the key is empty)
+    admin_api_key: str = ""
+    
+    # Profiler settings (GET /api/v1/admin/profile and ?profile=1 with X-Admin-Key; see src/core/profiler.py)
+    profiler_interval_ms: float = 5.0
+    profiler_max_seconds: float = 60.0
+    
+    # Slow query log settings
+    slow_query_log_enabled: bool = True
+    slow_query_threshold_ms: float = 500.0
+    slow_query_explain_sample_rate: float = 1.0
+    slow_query_max_entries: int = 200
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
     
+    @property
+    def worker_count(self) -> int:
+        """Number of server worker processes, defaulting to the CPUs available to this process"""
+        if self.workers > 0:
+            return self.workers
+        if hasattr(os, "sched_getaffinity"):
+            return max(1, len(os.sched_getaffinity(0)))
+        return os.cpu_count() or 1
+    
     @property
     def database_url(self) -> str:
         """Construct database URL from individual components"""
@@ -0,0 +1,32 @@
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+
+# SQLSTATE raised when statement_timeout fires or the query is cancelled
+QUERY_CANCELED = "57014"
+
+class PageTooDeep(ValueError):
+    """``skip`` is past the deepest page a list serves"""
+
+def _error(status_code: int, error: str, detail: str, retry_after: int = None) -> JSONResponse:
+    headers = {"Retry-After": str(retry_after)} if retry_after else None
+    return JSONResponse(status_code=status_code, content={"error": error, "detail": detail}, headers=headers)
+
+async def database_error_handler(request: Request, exc: OperationalError) -> JSONResponse:
+    """Turn statement timeouts into 504 and other operational failures into 503"""
+    if getattr(exc.orig, "pgcode", None) == QUERY_CANCELED:
+        return _error(504, "statement_timeout", "Query exceeded its time budget; narrow the request and retry")
+    return _error(503, "database_unavailable", "Database temporarily unavailable", retry_after=5)
+
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError) -> JSONResponse:
+    """No pooled connection became free within the pool timeout"""
+    return _error(503, "pool_exhausted", "All database connections are busy", retry_after=2)
+
+async def page_too_deep_handler(request: Request, exc: PageTooDeep) -> JSONResponse:
+    """A list merged across shards was asked for a page past DB_SHARD_MAX_SKIP"""
+    return _error(400, "page_too_deep", str(exc))
+
+def install_exception_handlers(app: FastAPI) -> None:
+    app.add_exception_handler(OperationalError, database_error_handler)
+    app.add_exception_handler(PoolTimeoutError, pool_timeout_handler)
+    app.add_exception_handler(PageTooDeep, page_too_deep_handler)
@@ -0,0 +1,68 @@
+"""
+Subscribers that keep in-process caches consistent with the entity change feed.
+
+The response cache drops exactly the entries whose path or query string
+mentions a changed id (``/businesses/{id}``, ``/reviews/business/{id}``,
+``?business_id=...``). Id-free listing pages still expire by TTL. A
+whole-table change (TRUNCATE, BULK) drops every entry under that table's
+resource, and RESYNC clears the cache. Business and user changes schedule a
+(debounced) rebuild of the typeahead index and, with name enrichment on, an
+update of the in-process name dictionaries.
+"""
+import re
+from typing import List
+
+from ..db.changes import ChangeFeed, EntityChange
+from .cache import CacheKey, ResponseCache, response_cache
+from .config import settings
+from .names import name_dictionaries
+from .suggest import suggest_service
+
+# table -> API path prefixes serving its rows
+RESOURCE_PREFIXES = {
+    "business": ("/api/v1/businesses",),
+    "reviews": ("/api/v1/reviews",),
+    "tips": ("/api/v1/tips",),
+    "yelp_users": ("/api/v1/users",),
+    "checkins": ("/api/v1/checkins",),
+}
+
+_TOKEN_SPLIT = re.compile(r"[/?&=,]")
+
+
+def _tokens(key: CacheKey) -> set:
+    return set(_TOKEN_SPLIT.split(key.path)) | set(_TOKEN_SPLIT.split(key.query))
+
+
+def invalidate_response_cache(changes: List[EntityChange], cache: ResponseCache = response_cache) -> int:
+    """Drop cached responses affected by ``changes``; returns the number removed"""
+    if any(change.op == "RESYNC" for change in changes):
+        removed = cache.stats()["entries"]
+        cache.clear()
+        return removed
+    prefixes = tuple(
+        prefix
+        for change in changes if change.whole_table
+        for prefix in RESOURCE_PREFIXES.get(change.table, ())
+    )
+    ids = {value for change in changes for value in change.keys.values()}
+    if not prefixes and not ids:
+        return 0
+    return cache.invalidate(
+        lambda key: (bool(prefixes) and key.path.startswith(prefixes)) or bool(ids & _tokens(key))
+    )
+
+
+def refresh_suggest_index(changes: List[EntityChange]) -> None:
+    if any(change.table in ("business", "yelp_users") for change in changes):
+        suggest_service.request_refresh()
+    elif suggest_service.built_at is not None and any(change.op == "RESYNC" for change in changes):
+        # Changes may have been missed while the listener was disconnected
+        suggest_service.request_refresh()
+
+
+def install_invalidation(feed: ChangeFeed) -> None:
+    feed.subscribe(invalidate_response_cache)
+    feed.subscribe(refresh_suggest_index)
+    if settings.name_enrichment_enabled:
+        feed.subscribe(name_dictionaries.on_changes)
@@ -0,0 +1,272 @@
+"""
+Live feed of new reviews and tips over Server-Sent Events.
+
+Clients open one ``GET /api/v1/live/events`` stream and subscribe to any
+number of businesses, users and cities, instead of polling the list
+endpoints. Each worker has one ``LiveFeedHub``, fed by the change feed the
+worker already runs (``src/db/changes.py``). For every batch of INSERT
+notifications on ``reviews``/``tips``, the hub:
+
+1. keeps only rows whose business, user or city has a subscriber (cities
+   take one primary-key lookup of the batch's businesses)
+2. reads those rows with names in one query per table
+3. encodes each row once and queues it for every matching subscriber
+
+An idle subscriber is an asyncio queue plus a heartbeat comment every
+``live_heartbeat_seconds``, so a worker holds thousands of them without
+threads or connections. A subscriber whose queue overflows gets a
+``resync`` event and its stream ends. After a change feed reconnect, every
+subscriber gets a ``resync`` event, since notifications may have been lost.
+When the worker shuts down, every stream gets a ``resync`` event and ends,
+so clients reconnect (to another worker) instead of holding up the
+shutdown. On ``resync``, clients re-read the list endpoints.
+
+Events::
+
+    event: review            event: tip               event: resync
+    data: {ReviewWithNames}  data: {TipWithNames}     data: {}
+"""
+import asyncio
+import logging
+import signal
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from ..db.changes import EntityChange
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+LIVE_PREFIX = "/api/v1/live"
+
+Topic = Tuple[str, str]  # ("business" | "user" | "city", value)
+
+_HEARTBEAT = b": heartbeat\n\n"
+_RESYNC = b"event: resync\ndata: {}\n\n"
+# Queued to wake a waiting stream so it notices it was closed
+_WAKE = b""
+
+
+def _event(name: str, data: str) -> bytes:
+    return f"event: {name}\ndata: {data}\n\n".encode("utf-8")
+
+
+class Subscriber:
+    """One open stream: its topics and the events waiting to be sent"""
+
+    def __init__(self, topics: Set[Topic], queue_size: int):
+        self.topics = topics
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+        self.closed = False
+
+    def put(self, event: bytes) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too far behind; the stream sends resync and ends
+            self.overflowed = True
+
+    def close(self) -> None:
+        self.closed = True
+        try:
+            self.queue.put_nowait(_WAKE)
+        except asyncio.QueueFull:
+            # A full queue wakes the stream anyway
+            pass
+
+
+class LiveFeedHub:
+    """Fans out new review and tip rows from the change feed to SSE subscribers on the event loop"""
+
+    def __init__(self, max_subscribers: int, queue_size: int, heartbeat_seconds: float):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.subscribers = 0
+        self.delivered = 0
+        self.overflows = 0
+        self.last_error: Optional[str] = None
+        self._topics: Dict[Topic, Set[Subscriber]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def start(self) -> None:
+        """Bind to the running event loop (call from an async startup handler)"""
+        self._loop = asyncio.get_running_loop()
+
+    def close(self) -> None:
+        """Refuse new streams and end the open ones with a resync event (call on the event loop)"""
+        self._loop = None
+        for subscriber in {s for subscribers in self._topics.values() for s in subscribers}:
+            subscriber.close()
+
+    def close_on_exit_signal(self) -> None:
+        """Close as soon as the server receives SIGINT/SIGTERM (call from a startup handler).
+
+        uvicorn waits for open requests to finish (up to
+        ``timeout_graceful_shutdown``) before it runs shutdown handlers, and an
+        event stream never finishes on its own, so closing from a shutdown
+        handler alone would come too late. The server's own handlers are
+        chained, not replaced.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = self._loop
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            previous = signal.getsignal(sig)
+            if not callable(previous):
+                continue
+
+            def handler(signum, frame, previous=previous):
+                # Signal handlers run between bytecodes; touch the queues from the loop instead
+                loop.call_soon_threadsafe(self.close)
+                previous(signum, frame)
+
+            signal.signal(sig, handler)
+
+    def subscribe(self, topics: Iterable[Topic]) -> Optional[Subscriber]:
+        """A new subscriber, or None when this worker is at ``max_subscribers``"""
+        if self.subscribers >= self.max_subscribers:
+            return None
+        subscriber = Subscriber(set(topics), self.queue_size)
+        for topic in subscriber.topics:
+            self._topics.setdefault(topic, set()).add(subscriber)
+        self.subscribers += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        for topic in subscriber.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._topics[topic]
+        self.subscribers -= 1
+
+    async def stream(self, subscriber: Subscriber):
+        """SSE body for ``subscriber``; unsubscribes when the client disconnects"""
+        try:
+            while True:
+                if subscriber.closed:
+                    yield _RESYNC
+                    return
+                if subscriber.overflowed and subscriber.queue.empty():
+                    self.overflows += 1
+                    yield _RESYNC
+                    return
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing the idle connection and notices clients that left
+                    yield _HEARTBEAT
+                    continue
+                if event is not _WAKE:
+                    yield event
+        finally:
+            self.unsubscribe(subscriber)
+
+    def on_changes(self, changes: List[EntityChange]) -> None:
+        """Change feed subscriber (runs on the listener thread): hand new rows to the event loop"""
+        loop = self._loop
+        if loop is None or not self._topics:
+            return
+        if any(change.op == "RESYNC" for change in changes):
+            loop.call_soon_threadsafe(self._broadcast, _RESYNC)
+        inserts = [
+            change for change in changes
+            if change.op == "INSERT" and change.table in ("reviews", "tips") and "business_id" in change.keys
+        ]
+        if inserts:
+            asyncio.run_coroutine_threadsafe(self._deliver(inserts), loop)
+
+    def _broadcast(self, event: bytes) -> None:
+        for subscriber in {s for subscribers in self._topics.values() for s in subscribers}:
+            subscriber.put(event)
+
+    def _wanted(self, business_id: str, user_id: Optional[str], cities: Dict[str, Optional[str]]) -> Set[Subscriber]:
+        subscribers: Set[Subscriber] = set()
+        for topic in (("business", business_id), ("user", user_id), ("city", cities.get(business_id))):
+            subscribers |= self._topics.get(topic, set())
+        return subscribers
+
+    async def _deliver(self, inserts: List[EntityChange]) -> None:
+        try:
+            rows, cities = await run_in_threadpool(self._fetch, inserts, set(self._topics))
+        except Exception as exc:
+            self.last_error = f"{exc.__class__.__name__}: {exc}"
+            logger.exception("Live feed lookup failed")
+            return
+        for name, row in rows:
+            subscribers = self._wanted(row.business_id, row.user_id, cities)
+            if subscribers:
+                event = _event(name, row.model_dump_json())
+                for subscriber in subscribers:
+                    subscriber.put(event)
+                    self.delivered += 1
+
+    def _fetch(self, inserts: List[EntityChange], topics: Set[Topic]) -> Tuple[list, Dict[str, Optional[str]]]:
+        """The subscribed rows among ``inserts`` as (event name, schema) pairs, and the city of each business"""
+        from ..crud import crud
+        from ..db.database import SessionLocal
+        from ..schemas import schemas
+
+        cities_wanted = any(kind == "city" for kind, _ in topics)
+        db = SessionLocal()
+        try:
+            cities: Dict[str, Optional[str]] = {}
+            if cities_wanted:
+                cities = crud.get_business_cities(db, list({change.keys["business_id"] for change in inserts}))
+
+            def wanted(keys: Dict[str, str]) -> bool:
+                return bool(
+                    {("business", keys["business_id"]), ("user", keys.get("user_id")),
+                     ("city", cities.get(keys["business_id"]))} & topics
+                )
+
+            review_ids = [
+                c.keys["review_id"] for c in inserts if c.table == "reviews" and "review_id" in c.keys and wanted(c.keys)
+            ]
+            tip_keys = [
+                (c.keys["user_id"], c.keys["business_id"])
+                for c in inserts if c.table == "tips" and "user_id" in c.keys and wanted(c.keys)
+            ]
+            rows = []
+            if review_ids:
+                rows += [
+                    ("review", schemas.ReviewWithNames.model_validate(row._asdict()))
+                    for row in crud.get_reviews_by_ids_with_names(db, review_ids)
+                ]
+            if tip_keys:
+                rows += [
+                    ("tip", schemas.TipWithNames.model_validate(row._asdict()))
+                    for row in crud.get_tips_by_keys_with_names(db, tip_keys)
+                ]
+            return rows, cities
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "running": self.running,
+            "subscribers": self.subscribers,
+            "max_subscribers": self.max_subscribers,
+            "topics": len(self._topics),
+            "delivered": self.delivered,
+            "overflows": self.overflows,
+            "last_error": self.last_error,
+        }
+
+
+live_hub = LiveFeedHub(
+    max_subscribers=settings.live_max_subscribers,
+    queue_size=settings.live_queue_size,
+    heartbeat_seconds=settings.live_heartbeat_seconds,
+)
@@ -0,0 +1,147 @@
+"""
+Adaptive concurrency limit for database-bound routes.
+
+The limit follows AIMD (additive increase, multiplicative decrease) on observed
+latency: each full window of requests completing under the target latency
+raises it by one, and a request slower than the target shrinks it by
+``backoff``. When the limit is reached, a request waits up to
+``queue_timeout_ms`` for a slot and is otherwise shed with 503 and
+Retry-After, instead of piling onto an exhausted connection pool.
+"""
+import asyncio
+import time
+from typing import Dict, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import settings
+from .rate_limit import send_json_error
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency limit shared by all requests in one event loop"""
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        target_latency_ms: float,
+        backoff: float = 0.9,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency_ms = target_latency_ms
+        self.backoff = backoff
+        self.in_flight = 0
+        self.waiting = 0
+        self.shed = 0
+        self._successes = 0
+        self._condition = None
+
+    @property
+    def _slots(self) -> asyncio.Condition:
+        # Created lazily so the condition binds to the running event loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self, timeout: float) -> bool:
+        """Take a slot, waiting up to ``timeout`` seconds; False means the request should be shed"""
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+        if self.waiting >= int(self.limit):
+            return False
+        condition = self._slots
+        self.waiting += 1
+        try:
+            async with condition:
+                await asyncio.wait_for(
+                    condition.wait_for(lambda: self.in_flight < int(self.limit)), timeout
+                )
+                self.in_flight += 1
+                return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+
+    async def release(self, latency_ms: float, failed: bool = False) -> None:
+        self.in_flight -= 1
+        if failed or latency_ms > self.target_latency_ms:
+            self.limit = max(float(self.min_limit), self.limit * self.backoff)
+            self._successes = 0
+        else:
+            self._successes += 1
+            if self._successes >= int(self.limit):
+                self.limit = min(float(self.max_limit), self.limit + 1)
+                self._successes = 0
+        if self.waiting:
+            async with self._slots:
+                self._slots.notify()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "shed": self.shed,
+            "target_latency_ms": self.target_latency_ms,
+        }
+
+
+class LoadSheddingMiddleware:
+    """Apply an ``AdaptiveConcurrencyLimiter`` to requests under ``path_prefixes``"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: AdaptiveConcurrencyLimiter,
+        queue_timeout_ms: float,
+        path_prefixes: Tuple[str, ...] = ("/api/v1/",),
+        exclude_prefixes: Tuple[str, ...] = ("/api/v1/admin",),
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.queue_timeout = queue_timeout_ms / 1000
+        self.path_prefixes = path_prefixes
+        self.exclude_prefixes = exclude_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope.get("path", "")
+        if (
+            scope["type"] != "http"
+            or not path.startswith(self.path_prefixes)
+            or path.startswith(self.exclude_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+        if not await self.limiter.acquire(self.queue_timeout):
+            self.limiter.shed += 1
+            await send_json_error(send, 503, "Server overloaded, retry later", 1)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            latency_ms = (time.perf_counter() - started) * 1000
+            await self.limiter.release(latency_ms, failed=status >= 500)
+
+
+concurrency_limiter = AdaptiveConcurrencyLimiter(
+    initial_limit=settings.concurrency_limit_initial,
+    min_limit=settings.concurrency_limit_min,
+    max_limit=settings.concurrency_limit_max,
+    target_latency_ms=settings.concurrency_target_latency_ms,
+)
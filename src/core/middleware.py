@@ -0,0 +1,73 @@
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+from .config import settings
+from .cache import ResponseCacheMiddleware, response_cache
+from .compression import CompressionMiddleware, build_encoders
+from .live import LIVE_PREFIX
+from .load_shedding import LoadSheddingMiddleware, concurrency_limiter
+from .profiler import ProfileMiddleware
+from .rate_limit import RateLimitMiddleware, build_store
+from .static_pages import StaticPagesMiddleware
+
+def install_middleware(app: FastAPI) -> None:
+    """Add the middleware stack shared by the uvicorn app and the Lambda handler
+
+    Outermost first: CORS, profiling, rate limiting, static pages, response cache, compression, load shedding.
+    """
+    # Shed load closest to the routes so cache hits never consume a DB slot; live streams hold
+    # no DB connection while open and would pin a slot each
+    if settings.load_shedding_enabled:
+        app.add_middleware(
+            LoadSheddingMiddleware,
+            limiter=concurrency_limiter,
+            queue_timeout_ms=settings.concurrency_queue_timeout_ms,
+            exclude_prefixes=("/api/v1/admin", LIVE_PREFIX),
+        )
+
+    # Compress responses; the response cache wraps compression so it stores compressed bytes
+    encoders = build_encoders(
+        settings.compression_encodings if settings.compression_enabled else [],
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+        zstd_level=settings.compression_zstd_level,
+    )
+    if encoders:
+        app.add_middleware(CompressionMiddleware, encoders=encoders, minimum_size=settings.compression_min_size)
+    if settings.response_cache_enabled:
+        app.add_middleware(
+            ResponseCacheMiddleware,
+            cache=response_cache,
+            encodings=list(encoders),
+            exclude_prefixes=("/api/v1/admin", LIVE_PREFIX),
+            max_body_bytes=settings.response_cache_max_body_bytes,
+        )
+
+    # Precomputed pages are answered before the cache and compression; their files are already compressed
+    if settings.static_pages_enabled:
+        app.add_middleware(
+            StaticPagesMiddleware,
+            directory=settings.static_pages_dir,
+            encodings=settings.compression_encodings if settings.compression_enabled else [],
+            max_age_seconds=settings.static_pages_max_age_seconds,
+        )
+
+    if settings.rate_limit_enabled:
+        app.add_middleware(
+            RateLimitMiddleware,
+            store=build_store(settings.rate_limit_backend, settings.rate_limit_redis_url, settings.rate_limit_max_clients),
+            rate=settings.rate_limit_per_second,
+            burst=settings.rate_limit_burst,
+        )
+
+    # ?profile=1 (admin only) samples everything the request goes through
+    app.add_middleware(ProfileMiddleware)
+
+    # Add CORS middleware for development (outermost, so cached and rejected responses get per-origin headers)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000", "https://localhost:3000"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
@@ -0,0 +1,327 @@
+"""
+Compact in-process ID -> name dictionaries for join-free name enrichment.
+
+With ``NAME_ENRICHMENT_ENABLED`` on, the "with names" review and tip reads
+query ``reviews``/``tips`` alone and fill ``user_name``/``business_name``
+here instead of outer-joining ``yelp_users`` and ``business``. The
+dictionaries are built from a streamed load of ``(id, name)`` rows.
+
+A dictionary keeps the ids in one sorted fixed-width byte array, so a whole
+page of ids is resolved with a single ``numpy.searchsorted``. Each id has an
+int32 code into a list of distinct names. Names repeat heavily ("John",
+"Starbucks"), so that list is much shorter than the id array.
+
+Changes reported by the change feed are applied incrementally. The changed
+ids are re-read and kept in a small overlay that is consulted before the
+arrays. The overlay is folded in by a full rebuild when it grows past
+``name_overlay_max_entries``, after a whole-table change or RESYNC, and
+every ``name_refresh_seconds``. A build that would exceed
+``name_memory_limit_mb`` is abandoned, and reads keep using the joins.
+"""
+import logging
+import sys
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+_RETRY_SECONDS = 30.0
+
+# table -> id column, as published in change feed keys
+TABLES = {"yelp_users": "user_id", "business": "business_id"}
+
+
+class MemoryLimitExceeded(Exception):
+    pass
+
+
+class NameDictionary:
+    """Sorted fixed-width id array with an int32 code per id into a list of distinct names"""
+
+    def __init__(self, keys, codes, names: List[Optional[str]]):
+        self.keys = keys
+        self.codes = codes
+        self.names = names
+        self.overlay: Dict[str, Optional[str]] = {}
+        self.names_bytes = sys.getsizeof(names) + sum(sys.getsizeof(name) for name in names)
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[str, Optional[str]]], memory_limit: int, chunk_size: int = 10000) -> "NameDictionary":
+        """Build from ``(id, name)`` rows in any order, raising ``MemoryLimitExceeded`` past ``memory_limit`` bytes"""
+        # numpy is imported on first build so serverless cold starts, which never build, do not pay for it
+        import numpy as np
+
+        key_chunks, code_chunks = [], []
+        names: List[Optional[str]] = []
+        name_codes: Dict[Optional[str], int] = {}
+        keys: List[bytes] = []
+        codes: List[int] = []
+        used = 0
+
+        def flush():
+            nonlocal used
+            key_chunks.append(np.array(keys, dtype=bytes))
+            code_chunks.append(np.array(codes, dtype=np.int32))
+            used += key_chunks[-1].nbytes + code_chunks[-1].nbytes
+            keys.clear()
+            codes.clear()
+
+        for key, name in rows:
+            code = name_codes.get(name)
+            if code is None:
+                code = name_codes[name] = len(names)
+                names.append(name)
+                used += sys.getsizeof(name)
+            keys.append(key.encode("utf-8"))
+            codes.append(code)
+            if len(keys) >= chunk_size:
+                flush()
+                if used > memory_limit:
+                    raise MemoryLimitExceeded(f"{used / 2**20:.1f} MB used, limit {memory_limit / 2**20:.1f} MB")
+        flush()
+        all_keys = np.concatenate(key_chunks)
+        all_codes = np.concatenate(code_chunks)
+        order = np.argsort(all_keys, kind="stable")
+        return cls(all_keys[order], all_codes[order], names)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def memory_bytes(self) -> int:
+        overlay = sys.getsizeof(self.overlay) + sum(
+            sys.getsizeof(key) + sys.getsizeof(name) for key, name in list(self.overlay.items())
+        )
+        return self.keys.nbytes + self.codes.nbytes + self.names_bytes + overlay
+
+    def lookup(self, ids: Sequence[Optional[str]]) -> List[Optional[str]]:
+        """Names for ``ids`` in order; None for unknown ids, like the outer join"""
+        import numpy as np
+
+        result: List[Optional[str]] = [None] * len(ids)
+        positions, probes = [], []
+        width = self.keys.dtype.itemsize
+        for position, key in enumerate(ids):
+            if key is None:
+                continue
+            name = self.overlay.get(key, _MISSING)
+            if name is not _MISSING:
+                result[position] = name
+                continue
+            encoded = key.encode("utf-8")
+            # Longer than every stored id: not present (and would be truncated by the fixed width)
+            if len(encoded) <= width:
+                positions.append(position)
+                probes.append(encoded)
+        if probes and len(self.keys):
+            probe = np.array(probes, dtype=self.keys.dtype)
+            found = np.minimum(np.searchsorted(self.keys, probe), len(self.keys) - 1)
+            hits = self.keys[found] == probe
+            codes = self.codes[found]
+            for position, hit, code in zip(positions, hits.tolist(), codes.tolist()):
+                if hit:
+                    result[position] = self.names[code]
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self),
+            "distinct_names": len(self.names),
+            "overlay_entries": len(self.overlay),
+            "memory_bytes": self.memory_bytes,
+        }
+
+
+@lru_cache(maxsize=32)
+def _enriched_row(fields: Tuple[str, ...]):
+    return namedtuple("NamedRow", fields + ("user_name", "business_name"))
+
+
+def attach_names(
+    rows: Sequence[Any],
+    user_names: Callable[[List[Optional[str]]], List[Optional[str]]],
+    business_names: Callable[[List[Optional[str]]], List[Optional[str]]],
+) -> List[Any]:
+    """Rows with ``user_id``/``business_id`` -> the same rows plus ``user_name``/``business_name``.
+
+    ``user_names`` and ``business_names`` map a list of ids to their names in order.
+    """
+    if not rows:
+        return []
+    fields = tuple(rows[0]._fields)
+    user_at, business_at = fields.index("user_id"), fields.index("business_id")
+    # Plain tuples: attribute access on result rows costs about a microsecond per field
+    values = [tuple(row) for row in rows]
+    users = user_names([value[user_at] for value in values])
+    businesses = business_names([value[business_at] for value in values])
+    make = _enriched_row(fields)._make
+    return [make(value + (user_name, business_name)) for value, user_name, business_name in zip(values, users, businesses)]
+
+
+def _load(db: Session, table: str, memory_limit: int) -> NameDictionary:
+    key = TABLES[table]
+    rows = db.execute(text(f"SELECT {key}, name FROM {table}").execution_options(yield_per=10000))
+    return NameDictionary.build(((row[0], row[1]) for row in rows), memory_limit)
+
+
+class NameDictionaries:
+    """User and business name dictionaries kept current by a background thread"""
+
+    def __init__(self, refresh_seconds: float, memory_limit_mb: int, overlay_max_entries: int):
+        self.refresh_seconds = refresh_seconds
+        self.memory_limit = memory_limit_mb * 2**20
+        self.overlay_max_entries = overlay_max_entries
+        self.dictionaries: Dict[str, NameDictionary] = {}
+        self.built_at: Optional[float] = None
+        self.build_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.incremental_updates = 0
+        self._pending: Dict[str, Set[str]] = {table: set() for table in TABLES}
+        self._rebuild = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return len(self.dictionaries) == len(TABLES)
+
+    def enrich(self, rows: Sequence[Any]) -> Optional[List[Any]]:
+        """Rows with ``user_id``/``business_id`` -> the same rows plus ``user_name``/``business_name``.
+
+        Returns None when the dictionaries were dropped since the caller checked ``ready``.
+        """
+        dictionaries = self.dictionaries
+        if len(dictionaries) != len(TABLES):
+            return None
+        return attach_names(rows, dictionaries["yelp_users"].lookup, dictionaries["business"].lookup)
+
+    def refresh(self) -> None:
+        """Rebuild both dictionaries from scratch, then re-apply changes seen meanwhile"""
+        from ..db.database import SessionLocal
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            dictionaries: Dict[str, NameDictionary] = {}
+            for table in TABLES:
+                remaining = self.memory_limit - sum(d.memory_bytes for d in dictionaries.values())
+                dictionaries[table] = _load(db, table, remaining)
+        except MemoryLimitExceeded as exc:
+            # Reads fall back to joins until a later rebuild fits
+            self.dictionaries = {}
+            self.last_error = f"Memory limit exceeded: {exc}"
+            logger.warning("Name dictionaries disabled: %s", self.last_error)
+            return
+        finally:
+            db.close()
+        self.dictionaries = dictionaries
+        self.built_at = time.time()
+        self.build_seconds = time.perf_counter() - started
+        self.last_error = None
+        logger.info(
+            "Name dictionaries built in %.1fs: %s", self.build_seconds,
+            ", ".join(f"{table} {len(d)} ids / {d.memory_bytes / 2**20:.1f} MB" for table, d in dictionaries.items()),
+        )
+        self.apply_pending()
+
+    def apply_pending(self) -> None:
+        """Re-read the names of ids reported changed and store them in the overlays"""
+        from ..db.database import SessionLocal
+        with self._lock:
+            pending, self._pending = self._pending, {table: set() for table in TABLES}
+        if not self.ready or not any(pending.values()):
+            return
+        db = SessionLocal()
+        try:
+            for table, ids in pending.items():
+                if not ids:
+                    continue
+                key, ids = TABLES[table], list(ids)
+                names = dict(db.execute(
+                    text(f"SELECT {key}, name FROM {table} WHERE {key} = ANY(:ids)"), {"ids": ids}
+                ).all())
+                dictionary = self.dictionaries[table]
+                # Most changes (e.g. review counts) leave the name alone; only differences enter the overlay
+                for changed_id, current in zip(ids, dictionary.lookup(ids)):
+                    name = names.get(changed_id)
+                    if name != current:
+                        dictionary.overlay[changed_id] = name
+                        self.incremental_updates += 1
+                if len(dictionary.overlay) > self.overlay_max_entries:
+                    self._rebuild = True
+        finally:
+            db.close()
+
+    def on_changes(self, changes) -> None:
+        """Change feed subscriber: queue changed ids, or a rebuild for whole-table changes"""
+        wake = False
+        with self._lock:
+            for change in changes:
+                if change.op == "RESYNC":
+                    # Changes may have been missed while the listener was disconnected
+                    self._rebuild = self._rebuild or self.built_at is not None
+                elif change.table in TABLES:
+                    key = change.keys.get(TABLES[change.table])
+                    if key is None:
+                        self._rebuild = True
+                    else:
+                        self._pending[change.table].add(key)
+                    wake = True
+        if wake or self._rebuild:
+            self._wake.set()
+
+    def _run(self) -> None:
+        next_rebuild = 0.0
+        while not self._stop.is_set():
+            try:
+                if self._rebuild or time.monotonic() >= next_rebuild:
+                    self._rebuild = False
+                    next_rebuild = time.monotonic() + self.refresh_seconds
+                    self.refresh()
+                else:
+                    self.apply_pending()
+            except Exception:
+                logger.exception("Name dictionary refresh failed")
+                # Pending ids may have been dropped; rebuild soon rather than after a full interval
+                next_rebuild = min(next_rebuild, time.monotonic() + _RETRY_SECONDS)
+            self._wake.wait(max(0.0, next_rebuild - time.monotonic()))
+            self._wake.clear()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="name-dictionaries", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        dictionaries = self.dictionaries
+        return {
+            "ready": self.ready,
+            "built_at": self.built_at,
+            "build_seconds": self.build_seconds,
+            "memory_limit_bytes": self.memory_limit,
+            "memory_bytes": sum(d.memory_bytes for d in dictionaries.values()),
+            "incremental_updates": self.incremental_updates,
+            "last_error": self.last_error,
+            "dictionaries": {table: d.stats() for table, d in dictionaries.items()},
+        }
+
+
+name_dictionaries = NameDictionaries(
+    refresh_seconds=settings.name_refresh_seconds,
+    memory_limit_mb=settings.name_memory_limit_mb,
+    overlay_max_entries=settings.name_overlay_max_entries,
+)
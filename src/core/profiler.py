@@ -0,0 +1,156 @@
+"""
+On-demand sampling profiler for a live worker.
+
+A ``SamplingProfiler`` thread wakes every ``interval`` seconds, reads the
+Python stack of every other thread with ``sys._current_frames()`` and counts
+each distinct stack. Threads parked in a wait (idle pool threads, the event
+loop's selector) are skipped. The result is in collapsed-stack format, one
+``frame;frame;frame count`` line per stack, ready for ``flamegraph.pl``,
+speedscope or ``inferno-flamegraph``. It shows where a slow worker spends its
+time, for example ORM row hydration, Pydantic validation or JSON encoding.
+
+Nothing runs until a profile is requested:
+
+- ``GET /api/v1/admin/profile?seconds=10`` samples the whole worker
+- ``?profile=1`` with a valid ``X-Admin-Key`` on any request samples the
+  worker while that request runs, and returns the stacks instead of the
+  response body (the original status is in ``X-Profile-Status``). A request
+  still running after ``PROFILER_MAX_SECONDS``, such as a Server-Sent Events
+  stream, is cancelled and its profile returned with ``X-Profile-Truncated``
+
+Without such a request, the only cost is ``ProfileMiddleware``'s substring
+test on the query string. Samples cover every thread of the worker, so
+concurrent requests show up in a per-request profile too. At most one
+profile runs per worker at a time.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .security import valid_admin_key
+
+# Leaf frames of threads that are waiting, not working
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+# One profile per worker at a time
+profile_lock = threading.Lock()
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Counts the stacks of every other thread every ``interval`` seconds until stopped"""
+
+    def __init__(self, interval: float, max_depth: int = 200):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.seconds = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.seconds = time.perf_counter() - self.started_at
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    continue
+                labels = []
+                while frame is not None and len(labels) < self.max_depth:
+                    labels.append(_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, most frequent first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "x-profile-samples": str(self.samples),
+            "x-profile-seconds": f"{self.seconds:.3f}",
+            "x-profile-interval-ms": f"{self.interval * 1000:g}",
+        }
+
+
+class ProfileMiddleware:
+    """Answer ``?profile=1`` requests carrying a valid X-Admin-Key with the collapsed stacks of the worker while serving them"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    def _requested(self, scope: Scope) -> bool:
+        # The substring test keeps ordinary requests at one bytes search
+        if scope["type"] != "http" or b"profile=" not in scope["query_string"]:
+            return False
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        return query.get("profile") == ["1"] and valid_admin_key(Headers(scope=scope).get("x-admin-key"))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self._requested(scope) or not profile_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        status = 0
+
+        async def capture(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        truncated = False
+        profiler = SamplingProfiler(settings.profiler_interval_ms / 1000).start()
+        try:
+            # Streaming responses never finish on their own; bound the profile like /admin/profile
+            await asyncio.wait_for(self.app(scope, receive, capture), settings.profiler_max_seconds)
+        except asyncio.TimeoutError:
+            truncated = True
+        finally:
+            profiler.stop()
+            profile_lock.release()
+        body = profiler.collapsed().encode("utf-8")
+        headers = {**profiler.headers(), "x-profile-status": str(status), "cache-control": "no-store"}
+        if truncated:
+            headers["x-profile-truncated"] = "1"
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", str(len(body)).encode())]
+            + [(name.encode(), value.encode()) for name, value in headers.items()],
+        })
+        await send({"type": "http.response.body", "body": body})
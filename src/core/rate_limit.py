@@ -0,0 +1,165 @@
+"""
+Per-client token-bucket rate limiting.
+
+Clients are identified by their ``X-API-Key`` header when it is one of the
+configured ``INGEST_API_KEYS``, otherwise by the client address (uvicorn rewrites it from ``X-Forwarded-For`` for trusted
+proxies). Buckets live in a pluggable store: in-process memory, or Redis so
+that every worker and host shares the same budget.
+"""
+import hashlib
+import json
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .security import valid_api_key
+from .warmup import WARMUP_SCOPE_KEY
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # optional dependency
+    redis_asyncio = None
+
+
+class TokenBucketStore(ABC):
+    """Interface for bucket storage; ``acquire`` returns (allowed, remaining tokens, retry-after seconds)"""
+
+    @abstractmethod
+    async def acquire(self, key: str, rate: float, burst: int, cost: float = 1.0) -> Tuple[bool, float, float]:
+        ...
+
+
+class InMemoryTokenBucketStore(TokenBucketStore):
+    """Buckets held per process, with LRU eviction of idle clients"""
+
+    def __init__(self, max_clients: int = 100_000):
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def acquire(self, key: str, rate: float, burst: int, cost: float = 1.0) -> Tuple[bool, float, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        retry_after = 0.0 if allowed else (cost - tokens) / rate
+        return allowed, tokens, retry_after
+
+
+# Refill and take atomically inside Redis so concurrent workers never double-spend
+_REDIS_TOKEN_BUCKET = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisTokenBucketStore(TokenBucketStore):
+    """Buckets shared across workers and hosts through Redis"""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        if redis_asyncio is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        self.prefix = prefix
+        self._client = redis_asyncio.from_url(url)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKET)
+
+    async def acquire(self, key: str, rate: float, burst: int, cost: float = 1.0) -> Tuple[bool, float, float]:
+        allowed, tokens = await self._script(
+            keys=[self.prefix + key], args=[rate, burst, cost, time.time()]
+        )
+        tokens = float(tokens)
+        retry_after = 0.0 if allowed else (cost - tokens) / rate
+        return bool(allowed), tokens, retry_after
+
+
+def client_key(scope: Scope) -> str:
+    """Bucket key: a hash of the API key when it is a configured key, otherwise the client IP"""
+    api_key = Headers(scope=scope).get("x-api-key")
+    # An unchecked key would let a client get a fresh bucket per request by sending random keys
+    if valid_api_key(api_key):
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+async def send_json_error(send: Send, status: int, detail: str, retry_after: float, extra_headers=()) -> None:
+    """Send a small JSON error with a Retry-After header (whole seconds, at least 1)"""
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        *extra_headers,
+    ]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """Reject requests over the client's token budget with 429 and Retry-After"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: TokenBucketStore,
+        rate: float,
+        burst: int,
+        path_prefixes: Tuple[str, ...] = ("/api/",),
+    ):
+        self.app = app
+        self.store = store
+        self.rate = rate
+        self.burst = burst
+        self.path_prefixes = path_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or not scope["path"].startswith(self.path_prefixes):
+            await self.app(scope, receive, send)
+            return
+        if scope.get(WARMUP_SCOPE_KEY):
+            # In-process startup warmup (src/core/warmup.py), not a client
+            await self.app(scope, receive, send)
+            return
+        allowed, _, retry_after = await self.store.acquire(client_key(scope), self.rate, self.burst)
+        if not allowed:
+            await send_json_error(
+                send, 429, "Rate limit exceeded", retry_after,
+                extra_headers=[(b"x-ratelimit-limit", str(self.burst).encode()), (b"x-ratelimit-remaining", b"0")],
+            )
+            return
+        await self.app(scope, receive, send)
+
+
+def build_store(backend: str, redis_url: Optional[str], max_clients: int) -> TokenBucketStore:
+    if backend == "redis":
+        return RedisTokenBucketStore(redis_url)
+    if backend == "memory":
+        return InMemoryTokenBucketStore(max_clients=max_clients)
+    raise ValueError(f"Unknown rate limit backend: {backend!r}")
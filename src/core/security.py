@@ -0,0 +1,30 @@
+import secrets
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from .config import settings
+
+def require_admin_key(x_admin_key: Optional[str] = Header(None)):
+    """Dependency guarding admin endpoints with the configured admin API key"""
+    if not settings.admin_api_key:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    if x_admin_key is None or not secrets.compare_digest(x_admin_key, settings.admin_api_key):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+def require_ingest_key(x_api_key: Optional[str] = Header(None)):
+    """Dependency guarding write endpoints with the partner API keys in INGEST_API_KEYS"""
+    if not settings.ingest_api_keys:
+        raise HTTPException(status_code=403, detail="Ingest API is disabled")
+    if x_api_key is None or not any(secrets.compare_digest(x_api_key, key) for key in settings.ingest_api_keys):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+
+def valid_admin_key(x_admin_key: Optional[str]) -> bool:
+    """Whether ``x_admin_key`` is the configured admin key, for checks made outside a route (middleware)"""
+    return bool(settings.admin_api_key) and x_admin_key is not None and secrets.compare_digest(
+        x_admin_key, settings.admin_api_key
+    )
+
+def valid_api_key(x_api_key: Optional[str]) -> bool:
+    """Whether ``x_api_key`` is one of the partner keys in INGEST_API_KEYS, for checks made outside a route"""
+    return x_api_key is not None and any(secrets.compare_digest(x_api_key, key) for key in settings.ingest_api_keys)
@@ -0,0 +1,144 @@
+"""
+Serve precomputed pages written by ``python -m src.static.generate``.
+
+The generator renders the most visited read pages into static JSON files,
+each with precompressed variants beside it:
+
+    <dir>/api/v1/reviews/business/<business_id>.json  (.json.br, .json.zst, .json.gz)
+    <dir>/api/v1/businesses/city/<city>.json
+    <dir>/api/v1/businesses/state/<state>.json
+
+Each file holds the response of the page's GET without a query string. With
+``STATIC_PAGES_ENABLED``, such a request is answered from the file in the best
+encoding the client accepts. Requests with a query string, and pages that have
+not been generated, fall through to the live query.
+
+Pages only change when the generator runs. If ``manifest.json`` says the last
+run finished more than ``STATIC_PAGES_MAX_AGE_SECONDS`` ago (a missed cron
+run, a stopped ``--watch``), every page falls through to the live query
+until the generator catches up. Files are read in the thread pool, so a slow
+disk does not stall the event loop.
+"""
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .compression import negotiate_encoding
+
+REVIEWS_PAGE = "/api/v1/reviews/business/{}"
+CITY_PAGE = "/api/v1/businesses/city/{}"
+STATE_PAGE = "/api/v1/businesses/state/{}"
+PAGE_PREFIXES = tuple(template.format("") for template in (REVIEWS_PAGE, CITY_PAGE, STATE_PAGE))
+MANIFEST = "manifest.json"
+
+# How long the manifest's generated_at is trusted before it is read again
+_MANIFEST_CHECK_SECONDS = 10.0
+
+logger = logging.getLogger(__name__)
+
+# File suffix of each precompressed variant (the names nginx gzip_static / brotli_static look for)
+SUFFIXES = {"br": ".br", "zstd": ".zst", "gzip": ".gz"}
+
+
+def safe_segment(value: Optional[str]) -> bool:
+    """Whether ``value`` can be one path segment of a page file name"""
+    return bool(value) and value not in (".", "..") and not any(c in value for c in "/\\\0")
+
+
+def page_name(path: str, encoding: Optional[str] = None) -> str:
+    """Relative file name of a page path, e.g. ``api/v1/businesses/state/NV.json.gz``"""
+    return path.lstrip("/") + ".json" + (SUFFIXES[encoding] if encoding else "")
+
+
+def _read(filename: str) -> Optional[bytes]:
+    try:
+        with open(filename, "rb") as f:
+            return f.read()
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        return None
+
+
+def _generated_at(directory: str) -> Optional[datetime]:
+    """When the generator last finished a run into ``directory``, from its manifest"""
+    manifest = _read(os.path.join(directory, MANIFEST))
+    if manifest is None:
+        return None
+    try:
+        generated_at = datetime.fromisoformat(json.loads(manifest)["generated_at"])
+    except (ValueError, KeyError, TypeError):
+        logger.warning("Unreadable %s in %s", MANIFEST, directory)
+        return None
+    return generated_at if generated_at.tzinfo else generated_at.replace(tzinfo=timezone.utc)
+
+
+def _load(filename: str, encodings: List[str]) -> Tuple[Optional[bytes], Optional[str]]:
+    """Body of the first variant of ``filename`` found in ``encodings`` order, else of the plain file"""
+    for encoding in encodings:
+        body = _read(filename + SUFFIXES[encoding])
+        if body is not None:
+            return body, encoding
+    return _read(filename), None
+
+
+class StaticPagesMiddleware:
+    """Answer GETs for generated pages from ``directory``; must wrap compression (files are precompressed)"""
+
+    def __init__(self, app: ASGIApp, directory: str, encodings: List[str], max_age_seconds: float = 0):
+        self.app = app
+        self.directory = directory
+        self.encodings = [encoding for encoding in encodings if encoding in SUFFIXES]
+        self.max_age_seconds = max_age_seconds
+        self._generated_at: Optional[datetime] = None
+        self._checked = float("-inf")
+
+    def _filename(self, scope: Scope) -> Optional[str]:
+        path = scope["path"]
+        if scope["method"] != "GET" or scope["query_string"] or not path.startswith(PAGE_PREFIXES):
+            return None
+        segment = path[path.rindex("/") + 1:]
+        if not safe_segment(segment) or path[:-len(segment)] not in PAGE_PREFIXES:
+            return None
+        return os.path.join(self.directory, page_name(path))
+
+    async def _fresh(self) -> bool:
+        """Whether the last generator run is recent enough to serve its pages"""
+        if self.max_age_seconds <= 0:
+            return True
+        now = time.monotonic()
+        if now - self._checked >= _MANIFEST_CHECK_SECONDS:
+            self._checked = now
+            self._generated_at = await run_in_threadpool(_generated_at, self.directory)
+        if self._generated_at is None:
+            return False
+        age = datetime.now(timezone.utc) - self._generated_at
+        return age.total_seconds() <= self.max_age_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        filename = self._filename(scope) if scope["type"] == "http" else None
+        body, encoding = None, None
+        if filename is not None and await self._fresh():
+            accept_encoding = Headers(scope=scope).get("accept-encoding")
+            accepted = [candidate for candidate in self.encodings if negotiate_encoding(accept_encoding, [candidate])]
+            body, encoding = await run_in_threadpool(_load, filename, accepted)
+        if body is None:
+            # Not generated (or removed by the generator), or the pages are stale
+            await self.app(scope, receive, send)
+            return
+
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"vary", b"Accept-Encoding"),
+            (b"x-cache", b"STATIC"),
+        ]
+        if encoding is not None:
+            headers.append((b"content-encoding", encoding.encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
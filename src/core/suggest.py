@@ -0,0 +1,191 @@
+"""
+In-memory typeahead index for business and user names.
+
+Names are case-folded and kept in a sorted array, so a prefix maps to a
+contiguous range found with ``bisect``. Each word start in a name is indexed
+("coff" finds "The Coffee Bean"). Top-k results for every prefix up to
+``SHORT_PREFIX_LEN`` characters are precomputed per ranking, because those
+ranges are the largest. Longer prefixes select from their much smaller range
+with ``heapq.nlargest``. The index is rebuilt periodically on a background
+thread and swapped in atomically, and sooner when the change feed reports
+business or user changes.
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+SHORT_PREFIX_LEN = 3
+_RANGE_END = "\U0010ffff"
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(name.casefold().split())
+
+
+class PrefixIndex:
+    """Sorted-array prefix index over (payload, name, scores) records"""
+
+    def __init__(self, records: Iterable[Tuple[Dict[str, Any], str, Dict[str, float]]],
+                 rankings: Sequence[str], top_k: int):
+        self.rankings = tuple(rankings)
+        self.top_k = top_k
+        self.payloads: List[Dict[str, Any]] = []
+        self.scores: Dict[str, List[float]] = {ranking: [] for ranking in self.rankings}
+        postings: List[Tuple[str, int]] = []
+        for payload, name, scores in records:
+            if not name:
+                continue
+            record_id = len(self.payloads)
+            self.payloads.append(payload)
+            for ranking in self.rankings:
+                self.scores[ranking].append(scores.get(ranking) or 0.0)
+            words = normalize_name(name).split(" ")
+            for position in range(len(words)):
+                postings.append((" ".join(words[position:]), record_id))
+        postings.sort()
+        self.keys = [key for key, _ in postings]
+        self.record_ids = [record_id for _, record_id in postings]
+        self._short = {ranking: self._precompute_short(ranking) for ranking in self.rankings}
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def _precompute_short(self, ranking: str) -> Dict[str, List[int]]:
+        scores = self.scores[ranking]
+        order = sorted(range(len(self.keys)), key=lambda i: scores[self.record_ids[i]], reverse=True)
+        short: Dict[str, List[int]] = {}
+        for posting in order:
+            key = self.keys[posting]
+            record_id = self.record_ids[posting]
+            for length in range(1, min(SHORT_PREFIX_LEN, len(key)) + 1):
+                bucket = short.setdefault(key[:length], [])
+                if len(bucket) < self.top_k and record_id not in bucket:
+                    bucket.append(record_id)
+        return short
+
+    def suggest(self, prefix: str, limit: int, ranking: Optional[str] = None) -> List[Dict[str, Any]]:
+        ranking = ranking or self.rankings[0]
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return []
+        if len(prefix) <= SHORT_PREFIX_LEN and limit <= self.top_k:
+            record_ids = self._short[ranking].get(prefix, [])[:limit]
+        else:
+            lo = bisect_left(self.keys, prefix)
+            hi = bisect_left(self.keys, prefix + _RANGE_END, lo)
+            scores = self.scores[ranking]
+            # A record can match on several words; over-fetch, de-duplicate, and fetch more until the page is full
+            fetch = limit * 2
+            while True:
+                best = heapq.nlargest(fetch, (self.record_ids[i] for i in range(lo, hi)), key=scores.__getitem__)
+                record_ids = list(dict.fromkeys(best))[:limit]
+                if len(record_ids) == limit or fetch >= hi - lo:
+                    break
+                fetch *= 2
+        return [self.payloads[record_id] for record_id in record_ids]
+
+
+def _load_businesses(db: Session) -> PrefixIndex:
+    from ..db import models
+    rows = db.query(
+        models.Business.business_id, models.Business.name, models.Business.city,
+        models.Business.state, models.Business.stars, models.Business.review_count,
+    ).yield_per(10000)
+    return PrefixIndex(
+        (
+            (
+                {"business_id": r.business_id, "name": r.name, "city": r.city, "state": r.state,
+                 "stars": r.stars, "review_count": r.review_count},
+                r.name,
+                {"review_count": r.review_count, "stars": r.stars},
+            )
+            for r in rows
+        ),
+        rankings=("review_count", "stars"),
+        top_k=settings.suggest_top_k,
+    )
+
+
+def _load_users(db: Session) -> PrefixIndex:
+    from ..db import models
+    rows = db.query(
+        models.User.user_id, models.User.name, models.User.review_count,
+    ).filter(
+        models.User.review_count.isnot(None)
+    ).order_by(
+        models.User.review_count.desc()
+    ).limit(settings.suggest_max_users).yield_per(10000)
+    return PrefixIndex(
+        (
+            ({"user_id": r.user_id, "name": r.name, "review_count": r.review_count}, r.name,
+             {"review_count": r.review_count})
+            for r in rows
+        ),
+        rankings=("review_count",),
+        top_k=settings.suggest_top_k,
+    )
+
+
+class SuggestService:
+    """Owns the current business/user indexes and refreshes them in the background"""
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.businesses: Optional[PrefixIndex] = None
+        self.users: Optional[PrefixIndex] = None
+        self.built_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self) -> None:
+        from ..db.database import SessionLocal
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            businesses = _load_businesses(db)
+            users = _load_users(db)
+        finally:
+            db.close()
+        self.businesses, self.users = businesses, users
+        self.built_at = time.time()
+        logger.info(
+            "Suggest index built: %d businesses, %d users in %.1fs",
+            len(businesses), len(users), time.perf_counter() - started,
+        )
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Suggest index refresh failed")
+            if self._wake.wait(self.refresh_seconds):
+                self._wake.clear()
+                # Coalesce a burst of changes into a single rebuild
+                self._stop.wait(settings.suggest_min_refresh_seconds)
+
+    def request_refresh(self) -> None:
+        """Rebuild early because names or counts changed (at most every ``suggest_min_refresh_seconds``)"""
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="suggest-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+
+suggest_service = SuggestService(refresh_seconds=settings.suggest_refresh_seconds)
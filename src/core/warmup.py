@@ -0,0 +1,231 @@
+"""
+Worker warmup before readiness.
+
+After a deploy or restart, the first requests find cold Postgres buffers, an
+empty response cache and no prepared statements on the pooled connections.
+With ``WARMUP_ENABLED``, each worker runs a warmup phase at startup, and
+``/health/ready`` answers 503 ``warming`` until it finishes. The phase:
+
+1. optionally loads ``warmup_prewarm_relations`` into shared buffers with
+   ``pg_prewarm`` (the extension must be installed:
+   ``CREATE EXTENSION pg_prewarm``)
+2. selects the top ``warmup_top_businesses``/``warmup_top_users`` by
+   ``review_count``
+3. GETs their ``warmup_business_paths``/``warmup_user_paths`` through the
+   app itself, in process and without a socket
+
+Because the GETs take the same path as real requests, they also fill the
+response cache (when enabled) and PREPARE the hot statements. Warmup requests
+are exempt from rate limiting. The whole phase is bounded by
+``warmup_budget_seconds``. Whatever is unfinished when the budget runs out is
+abandoned, and the worker reports ready.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Scope key marking in-process requests from ``asgi_get`` (set only here, never by the server)
+WARMUP_SCOPE_KEY = "warmup"
+
+
+async def asgi_get(app: ASGIApp, path: str, accept_encoding: str) -> Tuple[int, bytes]:
+    """GET ``path`` (with an optional query string) through ``app`` in process; returns status and body"""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": quote(path).encode("ascii"),
+        "query_string": query.encode("latin-1"),
+        "root_path": "",
+        "headers": [(b"host", b"warmup"), (b"accept-encoding", accept_encoding.encode("latin-1"))],
+        "client": None,
+        "server": None,
+        WARMUP_SCOPE_KEY: True,
+    }
+    status = 0
+    body: List[bytes] = []
+    done = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        done.set()
+    return status, b"".join(body)
+
+
+class Warmup:
+    """One warmup run per worker; ``finished`` gates readiness"""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.state = "running" if enabled else "disabled"
+        self.started_at: Optional[float] = None
+        self.seconds: Optional[float] = None
+        self.budget_exhausted = False
+        self.prewarmed: Dict[str, int] = {}
+        self.requests = 0
+        self.failed_requests = 0
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state != "running"
+
+    def start(self, app: ASGIApp) -> None:
+        """Schedule the warmup on the running event loop (call from an async startup handler)"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run(app))
+
+    def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def run(self, app: ASGIApp) -> None:
+        self.started_at = time.time()
+        started = time.monotonic()
+        deadline = started + settings.warmup_budget_seconds
+        try:
+            if settings.warmup_pg_prewarm and settings.warmup_prewarm_relations:
+                await run_in_threadpool(self._prewarm, deadline)
+            if time.monotonic() < deadline:
+                paths = await run_in_threadpool(self._paths)
+                await self._fetch(app, paths, deadline)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            # A failed warmup must not keep the worker out of rotation; readiness still checks the database
+            self.last_error = f"{exc.__class__.__name__}: {exc}"
+            logger.exception("Warmup failed")
+        finally:
+            self.seconds = time.monotonic() - started
+            self.state = "done"
+        logger.info(
+            "Warmup finished in %.1fs: %d requests (%d failed), %d relations prewarmed%s",
+            self.seconds, self.requests, self.failed_requests, len(self.prewarmed),
+            ", budget exhausted" if self.budget_exhausted else "",
+        )
+
+    def _prewarm(self, deadline: float) -> None:
+        """``pg_prewarm`` each relation in order, each statement limited to the remaining budget"""
+        from sqlalchemy import text
+        from sqlalchemy.exc import SQLAlchemyError
+
+        from ..db.database import engine
+
+        with engine.connect() as connection:
+            if connection.dialect.name != "postgresql":
+                return
+            if connection.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_prewarm'")).first() is None:
+                self.last_error = "pg_prewarm is not installed (CREATE EXTENSION pg_prewarm)"
+                logger.warning("Warmup: %s", self.last_error)
+                return
+            connection.commit()
+            for relation in settings.warmup_prewarm_relations:
+                remaining_ms = int((deadline - time.monotonic()) * 1000)
+                if remaining_ms <= 0:
+                    self.budget_exhausted = True
+                    return
+                try:
+                    with connection.begin():
+                        connection.execute(text(f"SET LOCAL statement_timeout = {remaining_ms}"))
+                        blocks = connection.execute(
+                            text("SELECT pg_prewarm(CAST(:relation AS regclass))"), {"relation": relation}
+                        ).scalar()
+                    self.prewarmed[relation] = blocks
+                except SQLAlchemyError as exc:
+                    # Unknown relation or budget reached mid-statement; move on to the next one
+                    self.last_error = f"pg_prewarm({relation}): {exc.__class__.__name__}"
+                    logger.warning("Warmup: %s", self.last_error)
+
+    def _paths(self) -> List[str]:
+        """Warmup paths for the most reviewed businesses and users"""
+        from sqlalchemy import text
+
+        from ..db.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            businesses = db.execute(text(
+                "SELECT business_id FROM business WHERE review_count IS NOT NULL ORDER BY review_count DESC LIMIT :n"
+            ), {"n": settings.warmup_top_businesses}).scalars().all() if settings.warmup_top_businesses else []
+            users = db.execute(text(
+                "SELECT user_id FROM yelp_users WHERE review_count IS NOT NULL ORDER BY review_count DESC LIMIT :n"
+            ), {"n": settings.warmup_top_users}).scalars().all() if settings.warmup_top_users else []
+        finally:
+            db.close()
+        # Most popular first, so a short budget still covers the hottest pages
+        paths = [template.format(business_id=b) for b in businesses for template in settings.warmup_business_paths]
+        paths += [template.format(user_id=u) for u in users for template in settings.warmup_user_paths]
+        return paths
+
+    async def _fetch(self, app: ASGIApp, paths: List[str], deadline: float) -> None:
+        queue: "asyncio.Queue[str]" = asyncio.Queue()
+        for path in paths:
+            queue.put_nowait(path)
+
+        async def worker() -> None:
+            while not queue.empty() and time.monotonic() < deadline:
+                path = queue.get_nowait()
+                try:
+                    status, _ = await asgi_get(app, path, settings.warmup_accept_encoding)
+                except Exception:
+                    logger.exception("Warmup request failed: %s", path)
+                    status = 0
+                self.requests += 1
+                if status != 200:
+                    self.failed_requests += 1
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(max(1, settings.warmup_concurrency))]
+        _, pending = await asyncio.wait(workers, timeout=max(0.0, deadline - time.monotonic()))
+        for task in pending:
+            task.cancel()
+        if pending or not queue.empty():
+            self.budget_exhausted = True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "started_at": self.started_at,
+            "seconds": self.seconds,
+            "budget_seconds": settings.warmup_budget_seconds,
+            "budget_exhausted": self.budget_exhausted,
+            "requests": self.requests,
+            "failed_requests": self.failed_requests,
+            "prewarmed_blocks": dict(self.prewarmed),
+            "last_error": self.last_error,
+        }
+
+
+warmup = Warmup(enabled=settings.warmup_enabled and not settings.serverless)
@@ -1,217 +1,799 @@
+import heapq
+import io
+import logging
+import math
+import secrets
+from datetime import datetime, timezone
+from itertools import islice
+from sqlalchemy import and_, bindparam, func, literal, or_, select, text, tuple_
+from sqlalchemy.dialects.postgresql import array
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from ..core.config import settings
+from ..core.errors import PageTooDeep
+from ..core.names import attach_names, name_dictionaries
+from ..core.suggest import normalize_name
 from ..db import models
+from ..db.changes import CHANNEL as CHANGE_CHANNEL, suspend_row_notifications
+from ..db.shards import byte_order, deliver_outbox, shard_router
+from ..db.statements import register
 from ..schemas import schemas
 
+logger = logging.getLogger(__name__)
+
+def _page_limit(limit: int, cap: Optional[int] = None) -> int:
+    """Clamp a client-supplied page size to the server-side maximum"""
+    return max(0, min(limit, cap or settings.max_page_size, settings.max_page_size))
+
+# Precompiled "with names" reads (src/db/statements.py): built and compiled once, prepared per connection.
+# Each read is registered twice: joined to users/businesses for names, and join-free for name enrichment.
+def _reviews_select(with_names: bool):
+    columns = (
+        models.Review.review_id,
+        models.Review.user_id,
+        models.Review.business_id,
+        models.Review.stars,
+        models.Review.useful,
+        models.Review.funny,
+        models.Review.cool,
+        models.Review.text,
+        models.Review.date,
+        models.Review.year,
+        models.Review.month,
+    )
+    if not with_names:
+        return select(*columns)
+    return select(
+        *columns,
+        models.User.name.label('user_name'),
+        models.Business.name.label('business_name')
+    ).select_from(models.Review).outerjoin(
+        models.User, models.Review.user_id == models.User.user_id
+    ).outerjoin(
+        models.Business, models.Review.business_id == models.Business.business_id
+    )
+
+def _tips_select(with_names: bool):
+    columns = (
+        models.Tip.user_id,
+        models.Tip.business_id,
+        models.Tip.text,
+        models.Tip.date,
+        models.Tip.compliment_count,
+        models.Tip.year,
+    )
+    if not with_names:
+        return select(*columns)
+    return select(
+        *columns,
+        models.User.name.label('user_name'),
+        models.Business.name.label('business_name')
+    ).select_from(models.Tip).outerjoin(
+        models.User, models.Tip.user_id == models.User.user_id
+    ).outerjoin(
+        models.Business, models.Tip.business_id == models.Business.business_id
+    )
+
+def _paged(statement):
+    return statement.offset(bindparam("skip")).limit(bindparam("limit"))
+
+def _register_reads(name: str, build):
+    """(joined, join-free) registered statements for ``build(with_names)``"""
+    return register(f"{name}_with_names", build(True)), register(name, build(False))
+
+def _read_with_names(db: Session, statements, **params) -> list:
+    """Rows with user_name/business_name, filled from the name dictionaries when they are loaded"""
+    with_names, plain = statements
+    if name_dictionaries.ready:
+        rows = name_dictionaries.enrich(plain.execute(db, **params).all())
+        if rows is not None:
+            return rows
+    return with_names.execute(db, **params).all()
+
+_REVIEWS = _register_reads("reviews", lambda names: _paged(_reviews_select(names)))
+_REVIEW = _register_reads(
+    "review", lambda names: _reviews_select(names).where(models.Review.review_id == bindparam("review_id")).limit(1)
+)
+_REVIEWS_BY_BUSINESS = _register_reads(
+    "reviews_by_business",
+    lambda names: _paged(_reviews_select(names).where(models.Review.business_id == bindparam("business_id")))
+)
+_REVIEWS_BY_USER = _register_reads(
+    "reviews_by_user",
+    lambda names: _paged(_reviews_select(names).where(models.Review.user_id == bindparam("user_id")))
+)
+_TIPS = _register_reads("tips", lambda names: _paged(_tips_select(names).order_by(models.Tip.date.desc())))
+_TIPS_BY_BUSINESS = _register_reads(
+    "tips_by_business",
+    lambda names: _paged(
+        _tips_select(names).where(models.Tip.business_id == bindparam("business_id")).order_by(models.Tip.date.desc())
+    )
+)
+_TIPS_BY_USER = _register_reads(
+    "tips_by_user",
+    lambda names: _paged(
+        _tips_select(names).where(models.Tip.user_id == bindparam("user_id")).order_by(models.Tip.date.desc())
+    )
+)
+
+# Sharded reads (src/db/shards.py). One business's rows are on one shard, so its lists use the join-free
+# statements above there. Other lists run on every shard in one total order, fetching skip + limit rows
+# each, and are k-way merged. Names are attached afterwards, since users and businesses stay on the primary.
+_NEWEST_REVIEWS = (models.Review.date.desc().nullslast(), byte_order(models.Review.review_id).desc())
+_NEWEST_TIPS = (
+    models.Tip.date.desc().nullslast(),
+    byte_order(models.Tip.user_id).desc(),
+    byte_order(models.Tip.business_id).desc(),
+)
+_SHARD_REVIEWS = register(
+    "shard_reviews", _reviews_select(False).order_by(byte_order(models.Review.review_id)).limit(bindparam("limit"))
+)
+_SHARD_REVIEWS_BY_USER = register(
+    "shard_reviews_by_user",
+    _reviews_select(False).where(models.Review.user_id == bindparam("user_id"))
+    .order_by(*_NEWEST_REVIEWS).limit(bindparam("limit"))
+)
+_SHARD_TIPS = register("shard_tips", _tips_select(False).order_by(*_NEWEST_TIPS).limit(bindparam("limit")))
+_SHARD_TIPS_BY_USER = register(
+    "shard_tips_by_user",
+    _tips_select(False).where(models.Tip.user_id == bindparam("user_id"))
+    .order_by(*_NEWEST_TIPS).limit(bindparam("limit"))
+)
+
+def _newest_review(row):
+    """Merge key matching _NEWEST_REVIEWS (merged with reverse=True)"""
+    return (row.date is not None, row.date or datetime.min, row.review_id)
+
+def _newest_tip(row):
+    """Merge key matching _NEWEST_TIPS (merged with reverse=True)"""
+    return (row.date is not None, row.date or datetime.min, row.user_id, row.business_id)
+
+def _names(db: Session, key, ids: List[Optional[str]]) -> List[Optional[str]]:
+    wanted = {i for i in ids if i is not None}
+    found = dict(db.execute(select(key, key.table.c.name).where(key.in_(wanted))).all()) if wanted else {}
+    return [found.get(i) for i in ids]
+
+def _attach_names(db: Session, rows: list) -> list:
+    """Join-free rows plus names: from the name dictionaries, else one batched lookup per table on the primary"""
+    if name_dictionaries.ready:
+        enriched = name_dictionaries.enrich(rows)
+        if enriched is not None:
+            return enriched
+    return attach_names(
+        rows,
+        lambda ids: _names(db, models.User.user_id, ids),
+        lambda ids: _names(db, models.Business.business_id, ids),
+    )
+
+def _merged_read(db: Session, statement, key, reverse: bool, skip: int, limit: int, **params) -> list:
+    """Rows ``skip`` to ``skip + limit`` of a list spread over every shard, with names"""
+    if skip > settings.db_shard_max_skip:
+        # Every shard reads skip + limit rows into this worker
+        raise PageTooDeep(f"skip must be at most {settings.db_shard_max_skip} for this list")
+    parts = shard_router.read_all(statement, limit=skip + limit, **params)
+    return _attach_names(db, list(islice(heapq.merge(*parts, key=key, reverse=reverse), skip, skip + limit)))
+
 # Business CRUD operations
 def get_businesses(db: Session, skip: int = 0, limit: int = 100) -> List[models.Business]:
-    return db.query(models.Business).offset(skip).limit(limit).all()
+    return db.query(models.Business).offset(skip).limit(_page_limit(limit)).all()
 
 def get_business(db: Session, business_id: str) -> Optional[models.Business]:
     return db.query(models.Business).filter(models.Business.business_id == business_id).first()
 
 def get_businesses_by_city(db: Session, city: str, skip: int = 0, limit: int = 100) -> List[models.Business]:
-    return db.query(models.Business).filter(models.Business.city == city).offset(skip).limit(limit).all()
+    return db.query(models.Business).filter(models.Business.city == city).offset(skip).limit(_page_limit(limit)).all()
 
 def get_businesses_by_stars(db: Session, min_stars: float, skip: int = 0, limit: int = 100) -> List[models.Business]:
-    return db.query(models.Business).filter(models.Business.stars >= min_stars).offset(skip).limit(limit).all()
+    return db.query(models.Business).filter(models.Business.stars >= min_stars).offset(skip).limit(_page_limit(limit)).all()
 
 def get_businesses_by_state(db: Session, state: str, skip: int = 0, limit: int = 100) -> List[models.Business]:
-    return db.query(models.Business).filter(models.Business.state == state).offset(skip).limit(limit).all()
+    return db.query(models.Business).filter(models.Business.state == state).offset(skip).limit(_page_limit(limit)).all()
 
 def get_businesses_by_name(db: Session, name: str, skip: int = 0, limit: int = 100) -> List[models.Business]:
     """Search businesses by name (case-insensitive partial match)"""
     return db.query(models.Business).filter(
         models.Business.name.ilike(f"%{name}%")
-    ).offset(skip).limit(limit).all()
+    ).offset(skip).limit(_page_limit(limit)).all()
+
+def _like_escape(text: str) -> str:
+    """Escape LIKE wildcards so user input only matches literally (use with ``escape="\\"``)"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _like_prefix(prefix: str) -> str:
+    return _like_escape(prefix.lower()) + "%"
+
+def _name_word_starts_with(column, prefix: str):
+    """``column`` or any word in it starts with ``prefix``, as the in-memory suggest index matches.
+
+    The start of the name is a range scan on the lower(name) text_pattern_ops
+    index; later words are ILIKE '% prefix%' on the name trigram index.
+    """
+    prefix = normalize_name(prefix)
+    return or_(
+        func.lower(column).like(_like_prefix(prefix), escape="\\"),
+        column.ilike(f"% {_like_escape(prefix)}%", escape="\\"),
+    )
+
+def suggest_businesses(db: Session, prefix: str, limit: int = 10, rank_by: str = "review_count"):
+    """Businesses whose name or any word in it starts with ``prefix``"""
+    rank_column = models.Business.stars if rank_by == "stars" else models.Business.review_count
+    return db.query(
+        models.Business.business_id,
+        models.Business.name,
+        models.Business.city,
+        models.Business.state,
+        models.Business.stars,
+        models.Business.review_count
+    ).filter(
+        _name_word_starts_with(models.Business.name, prefix)
+    ).order_by(rank_column.desc().nullslast()).limit(_page_limit(limit)).all()
+
+def _bounding_box(latitude: float, longitude: float, radius_km: float) -> list:
+    """Latitude/longitude ranges around a point that contain every business within ``radius_km``"""
+    Business = models.Business
+    dlat = radius_km / 110.57
+    filters = [Business.latitude.between(latitude - dlat, latitude + dlat)]
+    # Degrees of longitude shrink towards the poles; use the box edge nearest to one
+    km_per_degree_lon = 111.32 * math.cos(math.radians(min(abs(latitude) + dlat, 90.0)))
+    if km_per_degree_lon <= 0 or radius_km / km_per_degree_lon >= 180:
+        return filters
+    dlon = radius_km / km_per_degree_lon
+    west, east = longitude - dlon, longitude + dlon
+    if west < -180:
+        filters.append(or_(Business.longitude >= west + 360, Business.longitude <= east))
+    elif east > 180:
+        filters.append(or_(Business.longitude >= west, Business.longitude <= east - 360))
+    else:
+        filters.append(Business.longitude.between(west, east))
+    return filters
+
+def search_businesses(
+    db: Session,
+    q: Optional[str] = None,
+    city: Optional[str] = None,
+    state: Optional[str] = None,
+    min_stars: Optional[float] = None,
+    categories: Optional[List[str]] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    radius_km: Optional[float] = None,
+    attributes: Optional[dict] = None,
+    open_at: Optional[tuple] = None,
+    after: Optional[tuple] = None,
+    limit: int = 20,
+):
+    """Ranked business search ordered by (score DESC, business_id) with keyset pagination.
+
+    score = w_sim * similarity(name, q) + w_stars * stars / 5
+            + w_pop * ln(1 + review_count) / ln(1 + 10000) + w_dist / (1 + distance_km)
+
+    ``q`` filters with ``name % q OR name ILIKE '%q%'`` (both served by
+    idx_business_name_trgm), state/city equality uses idx_business_location and
+    a radius is bounded by a latitude/longitude box (idx_business_coordinates).
+    The score is computed for every row that passes the filters, so callers
+    must pass at least one of these selective filters; the cursor only saves
+    transferring earlier pages, not ranking them.
+    ``attributes`` is a JSON containment document (idx_business_attributes) and
+    ``open_at`` a (day of week, minute of day) pair, Monday = 0: its hour-of-week
+    slot is looked up in idx_business_open_slots and the minute re-checked.
+    ``after`` is the (score, business_id) of the last row on the previous page.
+    """
+    Business = models.Business
+    filters = []
+    score = (
+        literal(settings.search_weight_stars) * func.coalesce(Business.stars, 0) / 5.0
+        + literal(settings.search_weight_popularity)
+        * func.ln(1 + func.coalesce(Business.review_count, 0)) / func.ln(10001.0)
+    )
+    if q:
+        filters.append(or_(Business.name.op("%")(q), Business.name.ilike(f"%{_like_escape(q)}%", escape="\\")))
+        score = score + literal(settings.search_weight_similarity) * func.similarity(Business.name, q)
+    if state:
+        filters.append(Business.state == state)
+    if city:
+        filters.append(Business.city == city)
+    if min_stars is not None:
+        filters.append(Business.stars >= min_stars)
+    for category in categories or []:
+        filters.append(Business.categories.ilike(f"%{_like_escape(category)}%", escape="\\"))
+    if attributes:
+        filters.append(Business.attributes.contains(attributes))
+    if open_at is not None:
+        dow, minute = open_at
+        filters.append(func.business_open_slots(Business.hours).op("@>")(array([dow * 24 + minute // 60])))
+        filters.append(func.business_open_at(Business.hours, dow, minute))
+
+    distance = literal(None)
+    if latitude is not None and longitude is not None:
+        # Equirectangular approximation; accurate to well under 1% at city scale
+        km_per_degree_lon = 111.32 * func.cos(func.radians(latitude))
+        distance = func.sqrt(
+            func.power((Business.latitude - latitude) * 110.57, 2)
+            + func.power((Business.longitude - longitude) * km_per_degree_lon, 2)
+        )
+        score = score + literal(settings.search_weight_distance) / (1 + func.coalesce(distance, 1e6))
+        if radius_km is not None:
+            # Bounding box first (idx_business_coordinates), then the exact radius
+            filters.extend(_bounding_box(latitude, longitude, radius_km))
+            filters.append(distance <= radius_km)
+
+    ranked = db.query(
+        Business,
+        score.label("score"),
+        distance.label("distance_km")
+    ).filter(*filters).subquery()
+    query = db.query(ranked)
+    if after is not None:
+        after_score, after_id = after
+        query = query.filter(or_(
+            ranked.c.score < after_score,
+            and_(ranked.c.score == after_score, ranked.c.business_id > after_id)
+        ))
+    return query.order_by(ranked.c.score.desc(), ranked.c.business_id).limit(_page_limit(limit)).all()
+
+def get_similar_businesses(db: Session, business_id: str, limit: int = 10):
+    """Precomputed neighbours in rank order: one range read on the business_similarity primary key"""
+    return db.query(
+        models.Business,
+        models.BusinessSimilarity.score,
+        models.BusinessSimilarity.support
+    ).join(
+        models.Business, models.Business.business_id == models.BusinessSimilarity.similar_business_id
+    ).filter(
+        models.BusinessSimilarity.business_id == business_id
+    ).order_by(
+        models.BusinessSimilarity.rank
+    ).limit(_page_limit(limit, 50)).all()
 
 # Review CRUD operations
 def get_reviews(db: Session, skip: int = 0, limit: int = 100) -> List[models.Review]:
-    return db.query(models.Review).offset(skip).limit(limit).all()
+    return db.query(models.Review).offset(skip).limit(_page_limit(limit)).all()
 
 def get_reviews_with_names(db: Session, skip: int = 0, limit: int = 100):
     """Get reviews with user and business names"""
-    return db.query(
-        models.Review.review_id,
-        models.Review.user_id,
-        models.Review.business_id,
-        models.Review.stars,
-        models.Review.useful,
-        models.Review.funny,
-        models.Review.cool,
-        models.Review.text,
-        models.Review.date,
-        models.Review.year,
-        models.Review.month,
-        models.User.name.label('user_name'),
-        models.Business.name.label('business_name')
-    ).join(
-        models.User, models.Review.user_id == models.User.user_id, isouter=True
-    ).join(
-        models.Business, models.Review.business_id == models.Business.business_id, isouter=True
-    ).offset(skip).limit(limit).all()
+    if shard_router.enabled:
+        return _merged_read(db, _SHARD_REVIEWS, lambda row: row.review_id, False, skip, _page_limit(limit))
+    return _read_with_names(db, _REVIEWS, skip=skip, limit=_page_limit(limit))
 
 def get_review(db: Session, review_id: str) -> Optional[models.Review]:
+    if shard_router.enabled:
+        # sharded_review_ids names the one shard holding the review
+        business_id = db.execute(
+            select(models.ShardedReviewId.business_id).where(models.ShardedReviewId.review_id == review_id)
+        ).scalar()
+        if business_id is None:
+            return None
+        rows = shard_router.run(
+            shard_router.shard_for(business_id), lambda session: _REVIEW[1].execute(session, review_id=review_id).all()
+        )
+        return rows[0] if rows else None
     return db.query(models.Review).filter(models.Review.review_id == review_id).first()
 
 def get_review_with_names(db: Session, review_id: str):
     """Get a specific review with user and business names"""
-    return db.query(
-        models.Review.review_id,
-        models.Review.user_id,
-        models.Review.business_id,
-        models.Review.stars,
-        models.Review.useful,
-        models.Review.funny,
-        models.Review.cool,
-        models.Review.text,
-        models.Review.date,
-        models.Review.year,
-        models.Review.month,
-        models.User.name.label('user_name'),
-        models.Business.name.label('business_name')
-    ).join(
-        models.User, models.Review.user_id == models.User.user_id, isouter=True
-    ).join(
-        models.Business, models.Review.business_id == models.Business.business_id, isouter=True
-    ).filter(models.Review.review_id == review_id).first()
+    if shard_router.enabled:
+        review = get_review(db, review_id)
+        return _attach_names(db, [review])[0] if review else None
+    rows = _read_with_names(db, _REVIEW, review_id=review_id)
+    return rows[0] if rows else None
 
 def get_reviews_by_business(db: Session, business_id: str, skip: int = 0, limit: int = 100) -> List[models.Review]:
-    return db.query(models.Review).filter(models.Review.business_id == business_id).offset(skip).limit(limit).all()
+    return db.query(models.Review).filter(models.Review.business_id == business_id).offset(skip).limit(_page_limit(limit)).all()
 
 def get_reviews_by_business_with_names(db: Session, business_id: str, skip: int = 0, limit: int = 100):
     """Get reviews for a business with user and business names"""
-    return db.query(
-        models.Review.review_id,
-        models.Review.user_id,
-        models.Review.business_id,
-        models.Review.stars,
-        models.Review.useful,
-        models.Review.funny,
-        models.Review.cool,
-        models.Review.text,
-        models.Review.date,
-        models.Review.year,
-        models.Review.month,
-        models.User.name.label('user_name'),
-        models.Business.name.label('business_name')
-    ).join(
-        models.User, models.Review.user_id == models.User.user_id, isouter=True
-    ).join(
-        models.Business, models.Review.business_id == models.Business.business_id, isouter=True
-    ).filter(models.Review.business_id == business_id).offset(skip).limit(limit).all()
+    if shard_router.enabled:
+        return _attach_names(db, shard_router.read(
+            _REVIEWS_BY_BUSINESS[1], business_id=business_id, skip=skip, limit=_page_limit(limit)
+        ))
+    return _read_with_names(db, _REVIEWS_BY_BUSINESS, business_id=business_id, skip=skip, limit=_page_limit(limit))
 
 def get_reviews_by_user(db: Session, user_id: str, skip: int = 0, limit: int = 100) -> List[models.Review]:
-    return db.query(models.Review).filter(models.Review.user_id == user_id).offset(skip).limit(limit).all()
+    return db.query(models.Review).filter(models.Review.user_id == user_id).offset(skip).limit(_page_limit(limit)).all()
 
 def get_reviews_by_user_with_names(db: Session, user_id: str, skip: int = 0, limit: int = 100):
     """Get reviews by a user with user and business names"""
-    return db.query(
-        models.Review.review_id,
-        models.Review.user_id,
-        models.Review.business_id,
-        models.Review.stars,
-        models.Review.useful,
-        models.Review.funny,
-        models.Review.cool,
-        models.Review.text,
-        models.Review.date,
-        models.Review.year,
-        models.Review.month,
-        models.User.name.label('user_name'),
-        models.Business.name.label('business_name')
-    ).outerjoin(
-        models.User, models.Review.user_id == models.User.user_id
-    ).outerjoin(
-        models.Business, models.Review.business_id == models.Business.business_id
-    ).filter(models.Review.user_id == user_id).offset(skip).limit(limit).all()
+    if shard_router.enabled:
+        return _merged_read(db, _SHARD_REVIEWS_BY_USER, _newest_review, True, skip, _page_limit(limit), user_id=user_id)
+    return _read_with_names(db, _REVIEWS_BY_USER, user_id=user_id, skip=skip, limit=_page_limit(limit))
+
+def get_user_review_diagnostics(db: Session, user_id: str, sample: int = 5) -> dict:
+    """Review count diagnostics for one user from indexed lookups.
+
+    Orphaned reviews come from ``integrity_findings`` (see ``src/jobs/integrity.py``)
+    rather than an outer join, so they are as fresh as the last reviews scan.
+    """
+    user = db.get(models.User, user_id)
+    orphans = db.query(models.IntegrityFinding).filter(
+        models.IntegrityFinding.user_id == user_id,
+        models.IntegrityFinding.check_name == "review_orphan_business",
+    )
+    if shard_router.enabled:
+        # The user's reviews are spread over every shard; the primary's reviews table is empty
+        rows = _read_all_shards(
+            select(models.Review.review_id, models.Review.business_id, func.substr(models.Review.text, 1, 100))
+            .where(models.Review.user_id == user_id)
+        )
+        # The list endpoints attach names without dropping rows, so every review passes
+        total_reviews = passing_join = len(rows)
+        reviews_with_business = sum(1 for row in rows if row.business_id is not None)
+        snippets = {row[0]: row[2] for row in rows}
+        details = [
+            (review_id, business_id, snippets.get(review_id))
+            for review_id, business_id in orphans.with_entities(
+                models.IntegrityFinding.row_key, models.IntegrityFinding.business_id
+            ).order_by(models.IntegrityFinding.row_key).limit(sample)
+        ]
+    else:
+        total_reviews = db.query(func.count()).filter(models.Review.user_id == user_id).scalar()
+        reviews_with_business = db.query(func.count()).filter(
+            models.Review.user_id == user_id, models.Review.business_id.isnot(None)
+        ).scalar()
+        # The joins the list endpoints use, over this user's reviews only
+        passing_join = db.query(func.count()).select_from(models.Review).outerjoin(
+            models.User, models.Review.user_id == models.User.user_id
+        ).outerjoin(
+            models.Business, models.Review.business_id == models.Business.business_id
+        ).filter(models.Review.user_id == user_id).scalar()
+        details = orphans.outerjoin(
+            models.Review, models.Review.review_id == models.IntegrityFinding.row_key
+        ).with_entities(
+            models.IntegrityFinding.row_key, models.IntegrityFinding.business_id, func.substr(models.Review.text, 1, 100)
+        ).order_by(models.IntegrityFinding.row_key).limit(sample).all()
+    checked_at = db.query(func.min(models.IntegrityChunk.checked_at)).filter(
+        models.IntegrityChunk.scan == "reviews"
+    ).scalar()
+    return {
+        "user_id": user_id,
+        "user_stated_review_count": user.review_count if user else 0,
+        "total_reviews_in_db": total_reviews,
+        "reviews_with_business_id": reviews_with_business,
+        "reviews_passing_join": passing_join,
+        "orphaned_reviews": orphans.count(),
+        "orphaned_review_details": [
+            {"review_id": review_id, "business_id": business_id, "text_snippet": snippet}
+            for review_id, business_id, snippet in details
+        ],
+        "integrity_checked_at": checked_at,
+    }
+
+# Live feed lookups (src/core/live.py): rows named by change notifications, with names
+def _read_all_shards(statement) -> list:
+    parts = shard_router.fan_out(lambda shard, session: [
+        row for row in session.execute(statement).all() if shard_router.home(row, shard)
+    ])
+    return [row for part in parts for row in part]
+
+def get_reviews_by_ids_with_names(db: Session, review_ids: List[str]):
+    statement = _reviews_select(False).where(models.Review.review_id.in_(review_ids))
+    rows = _read_all_shards(statement) if shard_router.enabled else db.execute(statement).all()
+    return _attach_names(db, rows)
+
+def get_tips_by_keys_with_names(db: Session, keys: List[tuple]):
+    """Tips for (user_id, business_id) pairs"""
+    statement = _tips_select(False).where(tuple_(models.Tip.user_id, models.Tip.business_id).in_(keys))
+    rows = _read_all_shards(statement) if shard_router.enabled else db.execute(statement).all()
+    return _attach_names(db, rows)
+
+def get_business_cities(db: Session, business_ids: List[str]) -> dict:
+    return dict(db.execute(
+        select(models.Business.business_id, models.Business.city).where(models.Business.business_id.in_(business_ids))
+    ).all())
+
+# Write operations (one transaction per call; PostgreSQL only)
+#
+# Rows are streamed with COPY into a temporary staging table, then moved with a
+# single INSERT ... SELECT ... ON CONFLICT DO NOTHING that also drops rows whose
+# business or user does not exist. Counts and stars are updated from the rows
+# actually inserted, in the same transaction. Per-row change triggers are
+# suspended and the same notifications are sent set-based from the staged rows.
+#
+# With shards, the transaction also claims review_ids in sharded_review_ids and queues the
+# accepted rows in shard_outbox. After the commit the rows are inserted on their shards and
+# announced; rows whose delivery fails stay queued for the shard_outbox job (src/db/shards.py).
+_REVIEW_COLUMNS = ("review_id", "user_id", "business_id", "stars", "useful", "funny", "cool", "text", "date", "year", "month")
+_TIP_COLUMNS = ("user_id", "business_id", "text", "date", "compliment_count", "year")
+
+def _copy_value(value) -> str:
+    """Encode one value for COPY ... FROM STDIN (text format)"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        value = value.isoformat(sep=" ")
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+def _stage_rows(db: Session, stage: str, like_table: str, columns: tuple, rows: List[dict]) -> None:
+    """COPY ``rows`` into a temporary table (dropped at commit) shaped like ``like_table`` plus a row ordinal"""
+    db.execute(text(
+        f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT 0 AS ordinal, {', '.join(columns)} FROM {like_table} WITH NO DATA"
+    ))
+    buffer = io.StringIO()
+    for ordinal, row in enumerate(rows):
+        buffer.write("\t".join([str(ordinal)] + [_copy_value(row[name]) for name in columns]))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor = db.connection().connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {stage} (ordinal, {', '.join(columns)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+def _rejected_rows(db: Session, stage: str) -> List[dict]:
+    """Staged rows whose business or user does not exist"""
+    result = db.execute(text(f"""
+        SELECT s.ordinal, s.business_id, s.user_id,
+               EXISTS (SELECT 1 FROM business b WHERE b.business_id = s.business_id) AS business_exists
+        FROM {stage} s
+        WHERE NOT EXISTS (SELECT 1 FROM business b WHERE b.business_id = s.business_id)
+           OR NOT EXISTS (SELECT 1 FROM yelp_users u WHERE u.user_id = s.user_id)
+        ORDER BY s.ordinal
+    """))
+    return [
+        {
+            "index": row.ordinal,
+            "reason": f"Unknown user_id {row.user_id}" if row.business_exists else f"Unknown business_id {row.business_id}",
+        }
+        for row in result
+    ]
+
+_REFERENCES_EXIST = """
+    EXISTS (SELECT 1 FROM business b WHERE b.business_id = s.business_id)
+    AND EXISTS (SELECT 1 FROM yelp_users u WHERE u.user_id = s.user_id)
+"""
+
+def _queue_for_shards(db: Session, table: str, source: str) -> List[int]:
+    """Queue the rows of ``source`` (a staged-row query) in shard_outbox; returns the outbox ids"""
+    return db.execute(text(f"""
+        INSERT INTO shard_outbox (table_name, row)
+        SELECT :table, to_jsonb(s) - 'ordinal' FROM ({source}) s
+        RETURNING id
+    """), {"table": table}).scalars().all()
+
+def _deliver_now(db: Session, outbox: List[int]) -> Optional[dict]:
+    """Insert just-committed outbox entries on their shards; None when a shard fails.
+
+    The rows are already committed to the outbox, so a failure is logged and
+    left to the ``shard_outbox`` job instead of failing the request.
+    """
+    try:
+        return deliver_outbox(shard_router, db, outbox)
+    except Exception:
+        db.rollback()
+        logger.exception("Could not deliver %d outbox entries; the shard_outbox job will retry them", len(outbox))
+        return None
+
+def _notify_changes(db: Session, table: str, op: str, source: str, keys: tuple) -> None:
+    """pg_notify one entity change per row of ``source`` (the payload the row triggers would send)"""
+    key_pairs = ", ".join(f"'{key}', {key}" for key in keys)
+    db.execute(text(f"""
+        SELECT pg_notify(:channel, json_build_object('table', :table, 'op', :op, 'keys', json_build_object({key_pairs}))::text)
+        FROM {source}
+    """), {"channel": CHANGE_CHANNEL, "table": table, "op": op})
+
+def _apply_review_aggregates(db: Session) -> None:
+    """Fold the rows in ``review_inserted`` into business.review_count/stars and yelp_users.review_count.
+
+    Rows are locked in key order first so concurrent ingests cannot deadlock.
+    ``business.stars`` becomes the exact running mean, so it is no longer
+    rounded to half stars once a business receives reviews through the API.
+    """
+    db.execute(text("""
+        SELECT 1 FROM business WHERE business_id IN (SELECT business_id FROM review_inserted)
+        ORDER BY business_id FOR UPDATE
+    """))
+    db.execute(text("""
+        UPDATE business
+        SET stars = (COALESCE(business.stars, 0) * COALESCE(business.review_count, 0) + delta.total)
+                    / (COALESCE(business.review_count, 0) + delta.n),
+            review_count = COALESCE(business.review_count, 0) + delta.n
+        FROM (
+            SELECT business_id, count(*) AS n, sum(stars) AS total FROM review_inserted GROUP BY business_id
+        ) AS delta
+        WHERE business.business_id = delta.business_id
+    """))
+    db.execute(text("""
+        SELECT 1 FROM yelp_users WHERE user_id IN (SELECT user_id FROM review_inserted)
+        ORDER BY user_id FOR UPDATE
+    """))
+    db.execute(text("""
+        UPDATE yelp_users
+        SET review_count = COALESCE(yelp_users.review_count, 0) + delta.n
+        FROM (SELECT user_id, count(*) AS n FROM review_inserted GROUP BY user_id) AS delta
+        WHERE yelp_users.user_id = delta.user_id
+    """))
+    _notify_changes(db, "business", "UPDATE", "(SELECT DISTINCT business_id FROM review_inserted) AS changed", ("business_id",))
+    _notify_changes(db, "yelp_users", "UPDATE", "(SELECT DISTINCT user_id FROM review_inserted) AS changed", ("user_id",))
+
+def create_reviews(db: Session, reviews: List[schemas.ReviewCreate]) -> dict:
+    """Insert reviews and update user/business counts and stars in one transaction.
+
+    Existing review_ids are skipped as duplicates; rows referencing unknown
+    businesses or users are rejected. Nothing is written if any statement fails.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    rows = []
+    for review in reviews:
+        row = review.model_dump()
+        row["review_id"] = row["review_id"] or secrets.token_urlsafe(16)[:22]
+        row["date"] = row["date"] or now
+        row["year"], row["month"] = row["date"].year, row["date"].month
+        rows.append(row)
+
+    suspend_row_notifications(db)
+    _stage_rows(db, "review_stage", "reviews", _REVIEW_COLUMNS, rows)
+    rejected = _rejected_rows(db, "review_stage")
+    columns = ", ".join(_REVIEW_COLUMNS)
+    db.execute(text("""
+        CREATE TEMP TABLE review_inserted ON COMMIT DROP AS
+        SELECT review_id, business_id, user_id, stars FROM reviews WITH NO DATA
+    """))
+    outbox = []
+    if shard_router.enabled:
+        # The first staged row per review_id claims it; ids already claimed are duplicates on some shard
+        db.execute(text(f"""
+            CREATE TEMP TABLE review_accepted ON COMMIT DROP AS
+            SELECT DISTINCT ON (review_id) * FROM review_stage s
+            WHERE {_REFERENCES_EXIST}
+            ORDER BY review_id, s.ordinal
+        """))
+        db.execute(text("""
+            WITH claimed AS (
+                INSERT INTO sharded_review_ids (review_id, business_id)
+                SELECT review_id, business_id FROM review_accepted
+                ON CONFLICT (review_id) DO NOTHING
+                RETURNING review_id
+            )
+            INSERT INTO review_inserted
+            SELECT a.review_id, a.business_id, a.user_id, a.stars FROM review_accepted a JOIN claimed USING (review_id)
+        """))
+        outbox = _queue_for_shards(db, "reviews", """
+            SELECT a.* FROM review_accepted a JOIN review_inserted i USING (review_id) ORDER BY a.ordinal
+        """)
+    else:
+        db.execute(text(f"""
+            WITH inserted AS (
+                INSERT INTO reviews ({columns})
+                SELECT {columns} FROM review_stage s
+                WHERE {_REFERENCES_EXIST}
+                ORDER BY s.ordinal
+                ON CONFLICT (review_id) DO NOTHING
+                RETURNING review_id, business_id, user_id, stars
+            )
+            INSERT INTO review_inserted SELECT review_id, business_id, user_id, stars FROM inserted
+        """))
+    if not shard_router.enabled:
+        _notify_changes(db, "reviews", "INSERT", "review_inserted", ("review_id", "business_id", "user_id"))
+    _apply_review_aggregates(db)
+    review_ids = db.execute(text("SELECT review_id FROM review_inserted")).scalars().all()
+    db.commit()
+    # Counts come from the primary transaction; undelivered rows stay queued in the outbox
+    queued = len(outbox) if outbox and _deliver_now(db, outbox) is None else 0
+    return {
+        "inserted": len(review_ids),
+        "duplicates": len(rows) - len(rejected) - len(review_ids),
+        "rejected": rejected,
+        "queued": queued,
+        "review_ids": review_ids,
+    }
+
+def create_tips(db: Session, tips: List[schemas.TipCreate]) -> dict:
+    """Insert tips in one transaction; one tip per (user, business), later duplicates are skipped"""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    rows = []
+    for tip in tips:
+        row = tip.model_dump()
+        row["date"] = row["date"] or now
+        row["year"] = row["date"].year
+        rows.append(row)
+
+    suspend_row_notifications(db)
+    _stage_rows(db, "tip_stage", "tips", _TIP_COLUMNS, rows)
+    rejected = _rejected_rows(db, "tip_stage")
+    columns = ", ".join(_TIP_COLUMNS)
+    if shard_router.enabled:
+        outbox = _queue_for_shards(db, "tips", f"SELECT * FROM tip_stage s WHERE {_REFERENCES_EXIST} ORDER BY s.ordinal")
+        db.commit()
+        # A tip's key includes its business, so its shard enforces uniqueness and skips duplicates.
+        # Rows still queued are counted as inserted; the shard_outbox job skips any that turn out duplicate.
+        delivered = _deliver_now(db, outbox) if outbox else {}
+        queued = len(outbox) if delivered is None else 0
+        inserted = queued or len(delivered.get("tips", []))
+        return {
+            "inserted": inserted,
+            "duplicates": len(rows) - len(rejected) - inserted,
+            "rejected": rejected,
+            "queued": queued,
+        }
+    inserted_keys = db.execute(text(f"""
+        INSERT INTO tips ({columns})
+        SELECT {columns} FROM tip_stage s
+        WHERE {_REFERENCES_EXIST}
+        ORDER BY s.ordinal
+        ON CONFLICT (user_id, business_id) DO NOTHING
+        RETURNING business_id, user_id
+    """)).all()
+    inserted = len(inserted_keys)
+    if inserted:
+        db.execute(
+            text("""
+                SELECT pg_notify(:channel, json_build_object('table', 'tips', 'op', 'INSERT',
+                       'keys', json_build_object('business_id', business_id, 'user_id', user_id))::text)
+                FROM unnest(CAST(:business_ids AS text[]), CAST(:user_ids AS text[])) AS changed(business_id, user_id)
+            """),
+            {
+                "channel": CHANGE_CHANNEL,
+                "business_ids": [row.business_id for row in inserted_keys],
+                "user_ids": [row.user_id for row in inserted_keys],
+            },
+        )
+    db.commit()
+    return {"inserted": inserted, "duplicates": len(rows) - len(rejected) - inserted, "rejected": rejected, "queued": 0}
 
 # User CRUD operations
 def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[models.User]:
-    return db.query(models.User).offset(skip).limit(limit).all()
+    return db.query(models.User).offset(skip).limit(_page_limit(limit)).all()
 
 def get_user(db: Session, user_id: str) -> Optional[models.User]:
     return db.query(models.User).filter(models.User.user_id == user_id).first()
 
+def suggest_users(db: Session, prefix: str, limit: int = 10):
+    """Users whose name or any word in it starts with ``prefix``"""
+    return db.query(
+        models.User.user_id,
+        models.User.name,
+        models.User.review_count
+    ).filter(
+        _name_word_starts_with(models.User.name, prefix)
+    ).order_by(models.User.review_count.desc().nullslast()).limit(_page_limit(limit)).all()
+
 # Tip CRUD operations
 def get_tips(db: Session, skip: int = 0, limit: int = 100) -> List[models.Tip]:
-    return db.query(models.Tip).offset(skip).limit(limit).all()
+    return db.query(models.Tip).offset(skip).limit(_page_limit(limit)).all()
 
 def get_tip(db: Session, user_id: str, business_id: str) -> Optional[models.Tip]:
-    return db.query(models.Tip).filter(
-        models.Tip.user_id == user_id, 
-        models.Tip.business_id == business_id
-    ).first()
+    def query(session: Session) -> Optional[models.Tip]:
+        return session.query(models.Tip).filter(
+            models.Tip.user_id == user_id, 
+            models.Tip.business_id == business_id
+        ).first()
+
+    if shard_router.enabled:
+        return shard_router.run(shard_router.shard_for(business_id), query)
+    return query(db)
 
 def get_tips_by_business(db: Session, business_id: str, skip: int = 0, limit: int = 100) -> List[models.Tip]:
-    return db.query(models.Tip).filter(models.Tip.business_id == business_id).offset(skip).limit(limit).all()
+    return db.query(models.Tip).filter(models.Tip.business_id == business_id).offset(skip).limit(_page_limit(limit)).all()
 
 def get_tips_by_user(db: Session, user_id: str, skip: int = 0, limit: int = 100) -> List[models.Tip]:
-    return db.query(models.Tip).filter(models.Tip.user_id == user_id).offset(skip).limit(limit).all()
+    return db.query(models.Tip).filter(models.Tip.user_id == user_id).offset(skip).limit(_page_limit(limit)).all()
 
 # Enhanced tip CRUD operations with names
 def get_tips_with_names(db: Session, skip: int = 0, limit: int = 100):
     """Get tips with user and business names - optimized for performance"""
-    safe_limit = min(limit, 50)  # Conservative limit for tips
-    
-    return db.query(
-        models.Tip.user_id,
-        models.Tip.business_id,
-        models.Tip.text,
-        models.Tip.date,
-        models.Tip.compliment_count,
-        models.Tip.year,
-        models.User.name.label('user_name'),
-        models.Business.name.label('business_name')
-    ).select_from(models.Tip)\
-     .outerjoin(models.User, models.Tip.user_id == models.User.user_id)\
-     .outerjoin(models.Business, models.Tip.business_id == models.Business.business_id)\
-     .order_by(models.Tip.date.desc())\
-     .offset(skip).limit(safe_limit).all()
+    safe_limit = _page_limit(limit, 50)  # Conservative limit for tips
+    if shard_router.enabled:
+        return _merged_read(db, _SHARD_TIPS, _newest_tip, True, skip, safe_limit)
+    return _read_with_names(db, _TIPS, skip=skip, limit=safe_limit)
 
 def get_tips_by_business_with_names(db: Session, business_id: str, skip: int = 0, limit: int = 100):
     """Get tips by business with user and business names - optimized"""
-    safe_limit = min(limit, 25)  # Very conservative for business-specific queries
-    
-    return db.query(
-        models.Tip.user_id,
-        models.Tip.business_id,
-        models.Tip.text,
-        models.Tip.date,
-        models.Tip.compliment_count,
-        models.Tip.year,
-        models.User.name.label('user_name'),
-        models.Business.name.label('business_name')
-    ).select_from(models.Tip)\
-     .outerjoin(models.User, models.Tip.user_id == models.User.user_id)\
-     .outerjoin(models.Business, models.Tip.business_id == models.Business.business_id)\
-     .filter(models.Tip.business_id == business_id)\
-     .order_by(models.Tip.date.desc())\
-     .offset(skip).limit(safe_limit).all()
+    safe_limit = _page_limit(limit, 25)  # Very conservative for business-specific queries
+    if shard_router.enabled:
+        return _attach_names(db, shard_router.read(
+            _TIPS_BY_BUSINESS[1], business_id=business_id, skip=skip, limit=safe_limit
+        ))
+    return _read_with_names(db, _TIPS_BY_BUSINESS, business_id=business_id, skip=skip, limit=safe_limit)
 
 def get_tips_by_user_with_names(db: Session, user_id: str, skip: int = 0, limit: int = 100):
     """Get tips by user with user and business names - optimized"""
-    safe_limit = min(limit, 25)  # Very conservative for user-specific queries
-    
-    return db.query(
-        models.Tip.user_id,
-        models.Tip.business_id,
-        models.Tip.text,
-        models.Tip.date,
-        models.Tip.compliment_count,
-        models.Tip.year,
-        models.User.name.label('user_name'),
-        models.Business.name.label('business_name')
-    ).select_from(models.Tip)\
-     .outerjoin(models.User, models.Tip.user_id == models.User.user_id)\
-     .outerjoin(models.Business, models.Tip.business_id == models.Business.business_id)\
-     .filter(models.Tip.user_id == user_id)\
-     .order_by(models.Tip.date.desc())\
-     .offset(skip).limit(safe_limit).all()
+    safe_limit = _page_limit(limit, 25)  # Very conservative for user-specific queries
+    if shard_router.enabled:
+        return _merged_read(db, _SHARD_TIPS_BY_USER, _newest_tip, True, skip, safe_limit, user_id=user_id)
+    return _read_with_names(db, _TIPS_BY_USER, user_id=user_id, skip=skip, limit=safe_limit)
 
 # Checkin CRUD operations
 def get_checkins(db: Session, skip: int = 0, limit: int = 100) -> List[models.Checkin]:
-    return db.query(models.Checkin).offset(skip).limit(limit).all()
+    return db.query(models.Checkin).offset(skip).limit(_page_limit(limit)).all()
 
 def get_checkin(db: Session, business_id: str, date: str) -> Optional[models.Checkin]:
     return db.query(models.Checkin).filter(
@@ -220,4 +802,4 @@ def get_checkin(db: Session, business_id: str, date: str) -> Optional[models.Che
     ).first()
 
 def get_checkins_by_business(db: Session, business_id: str, skip: int = 0, limit: int = 100) -> List[models.Checkin]:
-    return db.query(models.Checkin).filter(models.Checkin.business_id == business_id).offset(skip).limit(limit).all()
\ No newline at end of file
+    return db.query(models.Checkin).filter(models.Checkin.business_id == business_id).offset(skip).limit(_page_limit(limit)).all()
\ No newline at end of file
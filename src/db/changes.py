@@ -0,0 +1,151 @@
+"""
+Entity change feed from Postgres LISTEN/NOTIFY.
+
+Triggers installed by migration 0005 publish one notification per changed row
+on ``entity_changes``. Each worker runs a ``ChangeFeed`` thread on its own
+connection, taken out of the pool. The thread collects notifications for
+``batch_window`` seconds, de-duplicates them, and passes the batch to every
+subscriber. Notifications sent while the listener is disconnected are lost, so
+after each (re)connect subscribers get a ``RESYNC`` change telling them to
+drop everything they cached.
+"""
+import json
+import logging
+import select
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "entity_changes"
+
+
+class EntityChange(NamedTuple):
+    table: str  # "*" for RESYNC
+    op: str  # INSERT, UPDATE, DELETE, TRUNCATE, BULK or RESYNC
+    keys: Dict[str, str]  # key columns of the changed row; empty means the whole table
+
+    @property
+    def whole_table(self) -> bool:
+        return not self.keys
+
+
+RESYNC = EntityChange("*", "RESYNC", {})
+
+Subscriber = Callable[[List[EntityChange]], None]
+
+
+def parse_notification(payload: str) -> Optional[EntityChange]:
+    try:
+        data = json.loads(payload)
+        keys = {name: str(value) for name, value in (data.get("keys") or {}).items() if value is not None}
+        return EntityChange(data["table"], data["op"], keys)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        logger.warning("Ignoring malformed change notification: %r", payload[:200])
+        return None
+
+
+def suspend_row_notifications(db: Session) -> None:
+    """Skip per-row notifications for the rest of this transaction (bulk maintenance)"""
+    db.execute(text("SET LOCAL app.change_notify = 'off'"))
+
+
+def notify_table_changed(db: Session, table: str) -> None:
+    """Announce, on commit, that arbitrary rows of ``table`` changed"""
+    payload = json.dumps({"table": table, "op": "BULK"})
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+
+
+class ChangeFeed:
+    """Background LISTEN loop fanning out batches of entity changes to subscribers"""
+
+    def __init__(self, batch_window: float = 0.1, reconnect_seconds: float = 5.0):
+        self.batch_window = batch_window
+        self.reconnect_seconds = reconnect_seconds
+        self.received = 0
+        self.batches = 0
+        self.connected = False
+        self.last_change_at: Optional[float] = None
+        self._subscribers: List[Subscriber] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, callback: Subscriber) -> None:
+        self._subscribers.append(callback)
+
+    def publish(self, changes: List[EntityChange]) -> None:
+        """Deliver ``changes`` to every subscriber; one failing subscriber does not affect the others"""
+        self.batches += 1
+        for callback in self._subscribers:
+            try:
+                callback(changes)
+            except Exception:
+                logger.exception("Change feed subscriber %r failed", callback)
+
+    def _listen(self, engine: Engine) -> None:
+        pooled = engine.raw_connection()
+        # The listener holds its connection for the life of the worker; keep it out of the pool
+        pooled.detach()
+        connection = pooled.dbapi_connection
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            self.connected = True
+            logger.info("Change feed listening on %s", CHANNEL)
+            self.publish([RESYNC])
+            while not self._stop.is_set():
+                if select.select([connection], [], [], 1.0) == ([], [], []):
+                    continue
+                # Give the rest of a burst (e.g. a multi-row commit) a moment to arrive
+                time.sleep(self.batch_window)
+                connection.poll()
+                while select.select([connection], [], [], 0)[0]:
+                    connection.poll()
+                notifies = connection.notifies[:]
+                del connection.notifies[:]
+                changes = [change for change in map(parse_notification, (n.payload for n in notifies)) if change]
+                if changes:
+                    self.received += len(changes)
+                    self.last_change_at = time.time()
+                    unique = {(c.table, c.op, tuple(sorted(c.keys.items()))): c for c in changes}
+                    self.publish(list(unique.values()))
+        finally:
+            self.connected = False
+            connection.close()
+
+    def _run(self, engine: Engine) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen(engine)
+            except Exception:
+                logger.exception("Change feed connection failed; reconnecting in %.0fs", self.reconnect_seconds)
+                self._stop.wait(self.reconnect_seconds)
+
+    def start(self, engine: Engine) -> None:
+        if engine.dialect.name != "postgresql":
+            logger.info("Change feed requires PostgreSQL; not started")
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(engine,), name="change-feed", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "connected": self.connected,
+            "subscribers": len(self._subscribers),
+            "received": self.received,
+            "batches": self.batches,
+            "last_change_at": self.last_change_at,
+        }
+
+
+change_feed = ChangeFeed()
@@ -1,13 +1,158 @@
-from sqlalchemy import create_engine
+import asyncio
+import threading
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from ..core.config import settings
+from .slow_query import SlowQueryLog
+
+def _detached_connections() -> int:
+    """Connections a server worker holds outside its pool for its whole life"""
+    return 1 if settings.change_feed_enabled else 0
+
+def _engine_options() -> dict:
+    """Pool configuration; serverless mode keeps a single connection alive across invocations"""
+    if settings.serverless:
+        return {
+            "pool_size": 1,
+            "max_overflow": 0,
+            "pool_pre_ping": True,
+            "pool_recycle": min(settings.db_pool_recycle_seconds, 300),
+        }
+    pool_size, max_overflow = settings.db_pool_size, settings.db_max_overflow
+    if settings.db_connection_budget > 0:
+        # Every worker builds its own pool, so the global budget is split evenly with no overflow.
+        # The change feed's LISTEN connection is detached from the pool, so it comes off the share;
+        # everything else in the worker (job runner, suggest/name refreshes, warmup, slow-query
+        # EXPLAIN, run_in_sessions fan-out) checks out of this pool and competes with requests.
+        share = settings.db_connection_budget // settings.worker_count
+        pool_size, max_overflow = max(1, share - _detached_connections()), 0
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
 
-engine = create_engine(settings.database_url, echo=settings.debug)
+engine = create_engine(settings.database_url, echo=settings.debug, **_engine_options())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.slow_query_threshold_ms,
+    max_entries=settings.slow_query_max_entries,
+    explain_sample_rate=settings.slow_query_explain_sample_rate,
+)
+if settings.slow_query_log_enabled:
+    slow_query_log.install(engine)
+
+@event.listens_for(SessionLocal, "after_begin")
+def _apply_session_options(session, transaction, connection):
+    """Apply the per-request statement timeout and remember the DBAPI connection for cancellation"""
+    pooled = connection.connection
+    with session.info.setdefault("cancel_lock", threading.Lock()):
+        session.info["dbapi_connection"] = pooled.dbapi_connection
+        pooled.info["cancel_session_info"] = session.info
+    timeout_ms = session.info.get("statement_timeout_ms")
+    if timeout_ms is not None and connection.dialect.name == "postgresql":
+        # SET LOCAL lasts until the transaction ends, i.e. until the session is closed; 0 disables the timeout
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+@event.listens_for(engine, "checkin")
+def _forget_cancel_target(dbapi_connection, connection_record):
+    """Runs before the connection is back in the pool, so a late cancel() cannot reach its next user"""
+    owner = connection_record.info.pop("cancel_session_info", None)
+    if owner is not None:
+        with owner["cancel_lock"]:
+            if owner.get("dbapi_connection") is dbapi_connection or dbapi_connection is None:
+                owner.pop("dbapi_connection", None)
+
+def _cancel_running_query(session) -> None:
+    lock = session.info.get("cancel_lock")
+    if lock is None:
+        return
+    # Held across cancel() so the connection cannot be checked in and reused meanwhile
+    with lock:
+        dbapi_connection = session.info.get("dbapi_connection")
+        if dbapi_connection is not None and hasattr(dbapi_connection, "cancel"):
+            dbapi_connection.cancel()
+
+async def _cancel_on_disconnect(request: Request, *sessions, poll_interval: float = 0.5) -> None:
+    while True:
+        await asyncio.sleep(poll_interval)
+        if await request.is_disconnected():
+            for session in sessions:
+                await run_in_threadpool(_cancel_running_query, session)
+            return
+
+def get_db_session(statement_timeout_ms: Optional[int] = None):
+    """Build a session dependency with a statement timeout that cancels its query if the client goes away"""
+    timeout_ms = settings.statement_timeout_ms if statement_timeout_ms is None else statement_timeout_ms
+
+    async def get_db(request: Request):
+        db = SessionLocal()
+        db.info["statement_timeout_ms"] = timeout_ms
+        watcher = asyncio.create_task(_cancel_on_disconnect(request, db))
+        try:
+            yield db
+        finally:
+            watcher.cancel()
+            await run_in_threadpool(db.close)
+
+    return get_db
+
+async def run_in_sessions(
+    request: Request,
+    calls: Sequence[Callable[[Any], Any]],
+    statement_timeout_ms: Optional[int] = None,
+    concurrent: bool = True,
+) -> List[Tuple[Any, float]]:
+    """Run each ``call(session)`` and return ``(result, elapsed_ms)`` per call, in order.
+
+    With ``concurrent`` every call gets its own session (and pooled connection)
+    and they run in parallel in the threadpool, so the total latency is that of
+    the slowest call; otherwise they run one after another on a single session.
+    Statement timeouts and cancellation on client disconnect apply as for
+    ``get_db_session``.
+    """
+    timeout_ms = settings.statement_timeout_ms if statement_timeout_ms is None else statement_timeout_ms
+    sessions = [SessionLocal() for _ in (calls if concurrent else calls[:1])]
+    for session in sessions:
+        session.info["statement_timeout_ms"] = timeout_ms
+
+    def timed(call, session):
+        started = time.perf_counter()
+        return call(session), (time.perf_counter() - started) * 1000
+
+    def run_one(call, session):
+        try:
+            return timed(call, session)
+        finally:
+            session.close()
+
+    def run_all(session):
+        try:
+            return [timed(call, session) for call in calls]
+        finally:
+            session.close()
+
+    watcher = asyncio.create_task(_cancel_on_disconnect(request, *sessions))
+    try:
+        if concurrent:
+            return list(await asyncio.gather(*(
+                run_in_threadpool(run_one, call, session) for call, session in zip(calls, sessions)
+            )))
+        return await run_in_threadpool(run_all, sessions[0])
+    finally:
+        watcher.cancel()
+
 def init_db():
-    # Import models here to avoid circular imports
-    from .models import Business, Review, User, Tip, Checkin
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    """Bring the schema up to date; deployments run ``alembic upgrade head`` instead of calling this at startup"""
+    from .migrate import upgrade_to_head
+    upgrade_to_head()
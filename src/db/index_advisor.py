@@ -0,0 +1,459 @@
+"""
+Index advisor for the query shapes of ``src/crud/crud.py``.
+
+Instead of guessing which indexes the CRUD functions need (as
+``optimize_database_indexes.sql`` did), this tool:
+
+1. calls every public read function of ``crud`` (``get_*``, ``suggest_*``,
+   ``search_*``) with sample arguments taken from the database: the most
+   reviewed business and user, that business's city, state and a name
+   prefix, and so on. Statements are captured with a SQLAlchemy
+   ``before_cursor_execute`` listener and grouped by the slow query log's
+   fingerprint (``src/db/slow_query.py``). Prepared statements are turned
+   off, so every statement reaches the listener as SQL
+2. runs ``EXPLAIN (FORMAT JSON)`` on each shape and flags sequential scans of
+   tables above ``--min-rows``, explicit sorts, and the indexes the plans use
+3. derives candidate indexes from the flagged nodes: the equality columns of
+   a scan, followed by the keys of the sort above it (or by a range column)
+4. tries each candidate: ``CREATE INDEX`` inside a transaction, ``EXPLAIN``
+   again for the shapes on that table, then ``ROLLBACK``. Candidates the
+   planner uses and that lower a shape's plan cost by at least
+   ``--min-gain`` are kept, ranked by the summed cost reduction
+5. lists indexes on the tables involved that no plan uses, with their size
+   and ``pg_stat_user_indexes`` scan count (unique and primary key indexes
+   are left out)
+
+Costs are planner cost units, so the benefit is an estimate from the current
+statistics. ANALYZE the tables first. Step 4 takes a SHARE lock on each
+table while its candidate builds, so run this against a local copy of the
+database, not production. Leave ``DB_SHARD_URLS`` unset: the listener is on
+the primary engine, so review and tip reads routed to shards are not seen.
+
+    python -m src.db.index_advisor                      # report
+    python -m src.db.index_advisor --write-migration    # also write the next Alembic revision
+    python -m src.db.index_advisor --json report.json
+"""
+import argparse
+import inspect
+import json
+import logging
+import os
+import re
+from datetime import date
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from .slow_query import fingerprint, normalize_statement
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIR = os.path.join(os.path.dirname(__file__), "migrations", "versions")
+CANDIDATE_NAME = "index_advisor_candidate"
+
+# Short table names used in index names (idx_users_..., as in the existing migrations)
+_TABLE_PREFIXES = {"yelp_users": "users"}
+
+_SCAN_NODES = ("Seq Scan", "Index Scan", "Index Only Scan", "Bitmap Heap Scan")
+_SORT_NODES = ("Sort", "Incremental Sort")
+# ``(col)::text = 'x'::text`` / ``col = $1`` / ``(col = ANY (...))`` in Filter, Index Cond and Recheck Cond
+_EQUALITY = re.compile(r"\(*(?:\w+\.)?(\w+)\)?(?:::[\w ]+)?\s+=\s+(?!\(*(?:[a-z_]\w*\.)?[a-z_]\w*\)?(?:::[\w ]+)?\))")
+_RANGE = re.compile(r"\(*(?:\w+\.)?(\w+)\)?(?:::[\w ]+)?\s+(?:>=?|<=?)\s")
+# ``reviews.date DESC NULLS LAST``; expressions and collations are left alone
+_SORT_KEY = re.compile(r"^\(?(?:(\w+)\.)?(\w+)\)?(?:::[\w ]+)?((?: DESC)?(?: NULLS (?:FIRST|LAST))?)$")
+
+
+class Shape:
+    """One distinct statement: the first SQL and parameters seen, and the functions that issued it"""
+
+    def __init__(self, statement: str, parameters: Any, function: str):
+        self.fingerprint = fingerprint(normalize_statement(statement))
+        self.statement = statement
+        self.parameters = parameters
+        self.functions = [function]
+        self.plan: Optional[dict] = None
+        self.cost = 0.0
+        self.tables: Set[str] = set()
+        self.indexes: Set[str] = set()
+        self.flags: List[str] = []
+        self.error: Optional[str] = None
+
+
+def sample_arguments(db: Session) -> Dict[str, Any]:
+    """Argument values by parameter name, taken from the busiest rows of the database"""
+    business = db.execute(text("""
+        SELECT business_id, name, city, state FROM business
+        WHERE review_count IS NOT NULL AND city IS NOT NULL AND state IS NOT NULL
+        ORDER BY review_count DESC LIMIT 1
+    """)).one()
+    user_id = db.execute(text(
+        "SELECT user_id FROM yelp_users WHERE review_count IS NOT NULL ORDER BY review_count DESC LIMIT 1"
+    )).scalar()
+    review_id = db.execute(
+        text("SELECT review_id FROM reviews WHERE business_id = :b LIMIT 1"), {"b": business.business_id}
+    ).scalar()
+    tip = db.execute(text("SELECT user_id, business_id FROM tips LIMIT 1")).first()
+    checkin_date = db.execute(
+        text("SELECT date FROM checkins WHERE business_id = :b LIMIT 1"), {"b": business.business_id}
+    ).scalar()
+    prefix = (business.name or "a")[:3].lower()
+    return {
+        "business_id": business.business_id,
+        "user_id": user_id,
+        "review_id": review_id,
+        "city": business.city,
+        "state": business.state,
+        "name": prefix,
+        "prefix": prefix,
+        "q": prefix,
+        "min_stars": 4.0,
+        "date": checkin_date or "",
+        "review_ids": [review_id],
+        "keys": [tuple(tip)] if tip else [],
+        "business_ids": [business.business_id],
+    }
+
+
+def read_functions() -> Dict[str, Any]:
+    from ..crud import crud
+
+    return {
+        name: function for name, function in inspect.getmembers(crud, inspect.isfunction)
+        if function.__module__ == crud.__name__ and name.startswith(("get_", "suggest_", "search_"))
+    }
+
+
+def capture_shapes(engine, session_factory) -> Dict[str, Shape]:
+    """Run every crud read function once and collect the distinct SELECTs they issue"""
+    shapes: Dict[str, Shape] = {}
+    current = {"function": ""}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().lower().startswith(("select", "with")):
+            return
+        shape = Shape(statement, parameters, current["function"])
+        if shape.fingerprint in shapes:
+            if current["function"] not in shapes[shape.fingerprint].functions:
+                shapes[shape.fingerprint].functions.append(current["function"])
+        else:
+            shapes[shape.fingerprint] = shape
+
+    db = session_factory()
+    try:
+        samples = sample_arguments(db)
+    finally:
+        db.close()
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        for name, function in sorted(read_functions().items()):
+            parameters = list(inspect.signature(function).parameters.values())[1:]
+            missing = [p.name for p in parameters if p.default is inspect.Parameter.empty and p.name not in samples]
+            if missing:
+                logger.warning("Skipping %s: no sample for %s", name, ", ".join(missing))
+                continue
+            current["function"] = name
+            db = session_factory()
+            try:
+                function(db, **{p.name: samples[p.name] for p in parameters if p.name in samples})
+            except Exception as exc:
+                logger.warning("Skipping %s: %s: %s", name, exc.__class__.__name__, str(exc).splitlines()[0])
+            finally:
+                db.rollback()
+                db.close()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    return shapes
+
+
+def _nodes(plan: dict, parent: Optional[dict] = None):
+    """(node, parent) for every node of a plan"""
+    yield plan, parent
+    for child in plan.get("Plans", ()):
+        yield from _nodes(child, plan)
+
+
+def _conditions(node: dict) -> str:
+    return " ".join(node.get(key, "") for key in ("Index Cond", "Recheck Cond", "Filter"))
+
+
+def explain(connection, shape: Shape) -> dict:
+    result = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {shape.statement}", shape.parameters).scalar()
+    return (json.loads(result) if isinstance(result, str) else result)[0]["Plan"]
+
+
+def _ordering(sort: dict, scans: List[dict]) -> Optional[Tuple[dict, List[str]]]:
+    """The scan a Sort's keys all come from, and the keys as index columns; None for expressions or several tables"""
+    aliases, ordering = set(), []
+    for key in sort.get("Sort Key", ()):
+        match = _SORT_KEY.match(key)
+        if match is None:
+            return None
+        aliases.add(match.group(1))
+        ordering.append(match.group(2) + match.group(3))
+    if len(aliases) != 1:
+        return None
+    alias = aliases.pop()
+    matching = [scan for scan in scans if alias is None and len(scans) == 1 or scan.get("Alias") == alias]
+    return (matching[0], ordering) if len(matching) == 1 else None
+
+
+def analyze_plan(shape: Shape, plan: dict, row_counts: Dict[str, float], min_rows: int) -> List[Tuple[str, Tuple[str, ...]]]:
+    """Record cost, tables, indexes and flags of ``plan``; returns candidate indexes as (table, columns)"""
+    shape.plan = plan
+    shape.cost = plan["Total Cost"]
+    candidates = []
+    for node, parent in _nodes(plan):
+        node_type = node["Node Type"]
+        if "Index Name" in node:
+            shape.indexes.add(node["Index Name"])
+        table = node.get("Relation Name")
+        if node_type in _SORT_NODES:
+            shape.flags.append(f"sort on {', '.join(node.get('Sort Key', ()))}")
+            # An index in sort order lets the planner read rows in order and stop at the LIMIT
+            scans = [n for n, _ in _nodes(node) if n["Node Type"] in _SCAN_NODES and "Relation Name" in n]
+            found = _ordering(node, scans)
+            if found is not None:
+                scan, ordering = found
+                columns = list(dict.fromkeys(_EQUALITY.findall(_conditions(scan))))
+                columns += [column for column in ordering if column.split()[0] not in columns]
+                candidates.append((scan["Relation Name"], tuple(columns)))
+        elif table is not None and node_type in _SCAN_NODES:
+            shape.tables.add(table)
+            # A bare scan under a LIMIT reads only the rows it returns
+            if node_type != "Seq Scan" or row_counts.get(table, 0) < min_rows:
+                continue
+            if "Filter" not in node and parent is not None and parent["Node Type"] == "Limit":
+                continue
+            shape.flags.append(f"seq scan on {table} ({row_counts[table]:.0f} rows)")
+            conditions = _conditions(node)
+            columns = list(dict.fromkeys(_EQUALITY.findall(conditions)))
+            columns += [column for column in _RANGE.findall(conditions)[:1] if column not in columns]
+            if columns:
+                candidates.append((table, tuple(columns)))
+    return candidates
+
+
+def index_name(table: str, columns: Tuple[str, ...]) -> str:
+    parts = [column.split()[0] for column in columns]
+    if any(" DESC" in column for column in columns):
+        parts.append("desc")
+    return f"idx_{_TABLE_PREFIXES.get(table, table)}_{'_'.join(parts)}"[:63]
+
+
+def try_candidate(engine, table: str, columns: Tuple[str, ...], shapes: List[Shape]) -> Dict[str, float]:
+    """Plan cost of each shape with the candidate index in place (only shapes whose plan uses it)"""
+    costs = {}
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            connection.exec_driver_sql(f"CREATE INDEX {CANDIDATE_NAME} ON {table} ({', '.join(columns)})")
+            for shape in shapes:
+                plan = explain(connection, shape)
+                if any(node.get("Index Name") == CANDIDATE_NAME for node, _ in _nodes(plan)):
+                    costs[shape.fingerprint] = plan["Total Cost"]
+        finally:
+            transaction.rollback()
+    return costs
+
+
+def unused_indexes(connection, tables: Set[str], used: Set[str]) -> List[Dict[str, Any]]:
+    rows = connection.execute(text("""
+        SELECT c.relname AS index, t.relname AS "table", pg_relation_size(c.oid) AS bytes,
+               s.idx_scan AS scans, pg_get_indexdef(c.oid) AS definition
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_class t ON t.oid = i.indrelid
+        LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = i.indexrelid
+        WHERE t.relname = ANY(:tables) AND NOT i.indisunique AND NOT i.indisprimary
+        ORDER BY pg_relation_size(c.oid) DESC
+    """), {"tables": sorted(tables)}).mappings().all()
+    return [dict(row) for row in rows if row["index"] not in used]
+
+
+def advise(min_rows: int, min_gain: float) -> Dict[str, Any]:
+    from .database import SessionLocal, engine
+
+    # EXECUTE of a prepared statement would hide the SQL from the listener and from EXPLAIN
+    settings.db_prepared_statements = False
+    shapes = capture_shapes(engine, SessionLocal)
+    logger.info("Captured %d query shapes", len(shapes))
+
+    with engine.connect() as connection:
+        row_counts = dict(connection.execute(text(
+            "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace"
+        )).all())
+        candidates: Dict[Tuple[str, Tuple[str, ...]], List[Shape]] = {}
+        for shape in shapes.values():
+            try:
+                plan = explain(connection, shape)
+            except Exception as exc:
+                shape.error = f"{exc.__class__.__name__}: {str(exc).splitlines()[0]}"
+                connection.rollback()
+                continue
+            for candidate in analyze_plan(shape, plan, row_counts, min_rows):
+                candidates.setdefault(candidate, []).append(shape)
+        connection.rollback()
+
+    proposals = []
+    for (table, columns), flagged in candidates.items():
+        on_table = [shape for shape in shapes.values() if table in shape.tables and shape.plan is not None]
+        costs = try_candidate(engine, table, columns, on_table)
+        benefits = {
+            shape.fingerprint: (shape.cost, costs[shape.fingerprint])
+            for shape in on_table
+            if shape.fingerprint in costs and costs[shape.fingerprint] <= shape.cost * (1 - min_gain)
+        }
+        if not benefits:
+            continue
+        proposals.append({
+            "name": index_name(table, columns),
+            "table": table,
+            "definition": f"ON {table} ({', '.join(columns)})",
+            "benefit": round(sum(before - after for before, after in benefits.values()), 2),
+            "shapes": [
+                {"functions": shapes[f].functions, "cost_before": before, "cost_after": after}
+                for f, (before, after) in benefits.items()
+            ],
+        })
+    proposals.sort(key=lambda proposal: -proposal["benefit"])
+    # Two candidates can help the same shapes; keep the better one per name
+    proposals = list({proposal["name"]: proposal for proposal in reversed(proposals)}.values())[::-1]
+
+    used = {index for shape in shapes.values() for index in shape.indexes}
+    tables = {table for shape in shapes.values() for table in shape.tables}
+    with engine.connect() as connection:
+        unused = unused_indexes(connection, tables, used)
+
+    return {
+        "shapes": [
+            {
+                "fingerprint": shape.fingerprint,
+                "functions": shape.functions,
+                "cost": shape.cost,
+                "indexes": sorted(shape.indexes),
+                "flags": shape.flags,
+                "error": shape.error,
+                "statement": normalize_statement(shape.statement),
+            }
+            for shape in sorted(shapes.values(), key=lambda shape: -shape.cost)
+        ],
+        "proposals": proposals,
+        "unused_indexes": unused,
+    }
+
+
+def next_revision() -> Tuple[str, str]:
+    """(new revision, current head) from the numbered files in the versions directory"""
+    numbers = [int(name[:4]) for name in os.listdir(VERSIONS_DIR) if re.match(r"^\d{4}_.*\.py$", name)]
+    head = max(numbers)
+    return f"{head + 1:04d}", f"{head:04d}"
+
+
+def render_migration(proposals: List[Dict[str, Any]]) -> Tuple[str, str]:
+    """(file name, source) of an Alembic revision creating ``proposals``"""
+    revision, head = next_revision()
+    entries = []
+    for proposal in proposals:
+        for shape in proposal["shapes"]:
+            entries.append(
+                f"    # {', '.join(shape['functions'])}: cost {shape['cost_before']:.1f} -> {shape['cost_after']:.1f}"
+            )
+        entries.append(f"    '{proposal['name']}': \"{proposal['definition']}\",")
+    tables = ", ".join(f"'{table}'" for table in sorted({proposal["table"] for proposal in proposals}))
+    source = f'''"""Indexes proposed by the index advisor
+
+Generated by ``python -m src.db.index_advisor`` from the plans of the CRUD
+query shapes. Each comment gives the planner cost of the shapes that use the
+index, without and with it.
+
+Revision ID: {revision}
+Revises: {head}
+Create Date: {date.today().isoformat()}
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '{revision}'
+down_revision = '{head}'
+branch_labels = None
+depends_on = None
+
+INDEXES = {{
+{chr(10).join(entries)}
+}}
+
+
+def _drop_if_invalid(name):
+    """A failed CONCURRENTLY build leaves an invalid index that IF NOT EXISTS would keep; drop it to rebuild"""
+    invalid = op.get_bind().execute(
+        sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {{"name": name}}
+    ).scalar()
+    if invalid:
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {{name}}")
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES.items():
+            _drop_if_invalid(name)
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {{name}} {{definition}}")
+        for table in ({tables},):
+            op.execute(f"ANALYZE {{table}}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {{name}}")
+'''
+    return f"{revision}_advised_indexes.py", source
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print("Query shapes (most expensive first):")
+    for shape in report["shapes"]:
+        status = shape["error"] or "; ".join(shape["flags"]) or "ok"
+        indexes = ", ".join(shape["indexes"]) or "no index"
+        print(f"  {shape['cost']:>10.1f}  {', '.join(shape['functions'])}  [{indexes}]  {status}")
+    print("\nProposed indexes (by estimated cost reduction):")
+    for proposal in report["proposals"]:
+        print(f"  {proposal['benefit']:>10.1f}  {proposal['name']} {proposal['definition']}")
+        for shape in proposal["shapes"]:
+            print(f"              {', '.join(shape['functions'])}: {shape['cost_before']:.1f} -> {shape['cost_after']:.1f}")
+    if not report["proposals"]:
+        print("  none")
+    print("\nIndexes no CRUD shape uses (jobs, search filters or constraints may still need them):")
+    for index in report["unused_indexes"]:
+        print(f"  {index['index']} on {index['table']}: {index['bytes'] / 1048576:.1f} MB, {index['scans']} scans")
+    if not report["unused_indexes"]:
+        print("  none")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-rows", type=int, default=10000, help="flag sequential scans of tables at least this large")
+    parser.add_argument("--min-gain", type=float, default=0.2,
+                        help="keep an index only for shapes whose cost it lowers by at least this fraction")
+    parser.add_argument("--write-migration", action="store_true", help="write the proposals as the next Alembic revision")
+    parser.add_argument("--json", metavar="PATH", help="also write the full report as JSON")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    report = advise(args.min_rows, args.min_gain)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    if args.write_migration and report["proposals"]:
+        filename, source = render_migration(report["proposals"])
+        path = os.path.join(VERSIONS_DIR, filename)
+        with open(path, "w") as f:
+            f.write(source)
+        print(f"\nWrote {path}")
+
+
+if __name__ == "__main__":
+    main()
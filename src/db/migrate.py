@@ -0,0 +1,38 @@
+"""
+Schema revision helpers built on the Alembic migrations in ``src/db/migrations``
+"""
+import os
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+
+
+@lru_cache(maxsize=1)
+def expected_revision() -> Optional[str]:
+    """Head revision shipped with this build"""
+    from alembic.script import ScriptDirectory
+    return ScriptDirectory(MIGRATIONS_DIR).get_current_head()
+
+
+def current_revision(connection: Connection) -> Optional[str]:
+    """Revision recorded in the database, or None when migrations never ran"""
+    try:
+        return connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except DBAPIError:
+        connection.rollback()
+        return None
+
+
+def upgrade_to_head() -> None:
+    """Apply pending migrations (same as ``alembic upgrade head``)"""
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    command.upgrade(config, "head")
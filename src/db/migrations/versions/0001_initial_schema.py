@@ -0,0 +1,95 @@
+"""Initial schema for the Yelp tables
+
+Existing databases loaded from the Yelp dataset already have these tables,
+so everything is created with IF NOT EXISTS; upgrading such a database simply
+records the revision.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-10-20
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'business',
+        sa.Column('business_id', sa.String(), primary_key=True),
+        sa.Column('name', sa.String()),
+        sa.Column('address', sa.String()),
+        sa.Column('city', sa.String()),
+        sa.Column('state', sa.String()),
+        sa.Column('postal_code', sa.String()),
+        sa.Column('latitude', sa.Float()),
+        sa.Column('longitude', sa.Float()),
+        sa.Column('stars', sa.Float()),
+        sa.Column('review_count', sa.Integer()),
+        sa.Column('is_open', sa.Integer()),
+        sa.Column('attributes', sa.String()),
+        sa.Column('categories', sa.String()),
+        sa.Column('hours', sa.String()),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'reviews',
+        sa.Column('review_id', sa.String(), primary_key=True),
+        sa.Column('user_id', sa.String()),
+        sa.Column('business_id', sa.String()),
+        sa.Column('stars', sa.Float()),
+        sa.Column('useful', sa.Integer()),
+        sa.Column('funny', sa.Integer()),
+        sa.Column('cool', sa.Integer()),
+        sa.Column('text', sa.Text()),
+        sa.Column('date', sa.DateTime()),
+        sa.Column('year', sa.Integer()),
+        sa.Column('month', sa.Integer()),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'yelp_users',
+        sa.Column('user_id', sa.String(), primary_key=True),
+        sa.Column('name', sa.String()),
+        sa.Column('review_count', sa.Integer()),
+        sa.Column('yelping_since', sa.DateTime()),
+        sa.Column('friends', sa.String()),
+        sa.Column('useful', sa.Integer()),
+        sa.Column('funny', sa.Integer()),
+        sa.Column('cool', sa.Integer()),
+        sa.Column('fans', sa.Integer()),
+        sa.Column('elite', sa.String()),
+        sa.Column('average_stars', sa.Float()),
+        *[
+            sa.Column(f'compliment_{kind}', sa.Integer())
+            for kind in ('hot', 'more', 'profile', 'cute', 'list', 'note',
+                         'plain', 'cool', 'funny', 'writer', 'photos')
+        ],
+        if_not_exists=True,
+    )
+    op.create_table(
+        'tips',
+        sa.Column('user_id', sa.String(), primary_key=True),
+        sa.Column('business_id', sa.String(), primary_key=True),
+        sa.Column('text', sa.Text()),
+        sa.Column('date', sa.DateTime()),
+        sa.Column('compliment_count', sa.Integer()),
+        sa.Column('year', sa.Integer()),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'checkins',
+        sa.Column('business_id', sa.String(), primary_key=True),
+        sa.Column('date', sa.String(), primary_key=True),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    for table in ('checkins', 'tips', 'yelp_users', 'reviews', 'business'):
+        op.drop_table(table, if_exists=True)
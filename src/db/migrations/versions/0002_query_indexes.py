@@ -0,0 +1,81 @@
+"""Query indexes from optimize_database_indexes.sql
+
+Indexes are built with CREATE INDEX CONCURRENTLY outside a transaction so
+the tables stay writable while they build. ``idx_reviews_recent`` from the
+SQL script is not included: its predicate uses CURRENT_DATE, which is not
+immutable and therefore cannot appear in an index predicate.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-10-20
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    # Foreign-key lookups (present on the loaded Yelp database, created here for fresh ones)
+    'idx_reviews_user_id': "ON reviews (user_id)",
+    'idx_reviews_business_id': "ON reviews (business_id)",
+    'idx_tips_user_id': "ON tips (user_id)",
+    'idx_tips_business_id': "ON tips (business_id)",
+    'idx_business_name_trgm': "ON business USING GIN (name gin_trgm_ops)",
+    'idx_business_stars_reviews': (
+        "ON business (stars DESC, review_count DESC) "
+        "WHERE stars IS NOT NULL AND review_count IS NOT NULL"
+    ),
+    'idx_business_city': "ON business (city) WHERE city IS NOT NULL",
+    'idx_business_state': "ON business (state) WHERE state IS NOT NULL",
+    'idx_business_location': (
+        "ON business (state, city, stars DESC, review_count DESC) "
+        "WHERE state IS NOT NULL AND city IS NOT NULL"
+    ),
+    'idx_users_review_count_desc': (
+        "ON yelp_users (review_count DESC NULLS LAST) WHERE review_count IS NOT NULL"
+    ),
+    'idx_users_name_trgm': "ON yelp_users USING GIN (name gin_trgm_ops) WHERE name IS NOT NULL",
+    'idx_users_stats': (
+        "ON yelp_users (fans DESC, useful DESC, review_count DESC) "
+        "WHERE fans IS NOT NULL OR useful IS NOT NULL"
+    ),
+    'idx_reviews_user_date_desc': "ON reviews (user_id, date DESC) WHERE date IS NOT NULL",
+    'idx_reviews_business_stars': (
+        "ON reviews (business_id, stars DESC, date DESC) WHERE stars IS NOT NULL"
+    ),
+    'idx_reviews_feedback': (
+        "ON reviews (useful DESC, funny DESC, cool DESC) "
+        "WHERE useful > 0 OR funny > 0 OR cool > 0"
+    ),
+    'idx_tips_user_date_desc': "ON tips (user_id, date DESC) WHERE date IS NOT NULL",
+    'idx_users_active': "ON yelp_users (yelping_since DESC) WHERE yelping_since IS NOT NULL",
+}
+
+
+def _drop_if_invalid(name):
+    """A failed CONCURRENTLY build leaves an invalid index that IF NOT EXISTS would keep; drop it to rebuild"""
+    invalid = op.get_bind().execute(
+        sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+    if invalid:
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES.items():
+            _drop_if_invalid(name)
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+        for table in ('business', 'yelp_users', 'reviews', 'tips'):
+            op.execute(f"ANALYZE {table}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
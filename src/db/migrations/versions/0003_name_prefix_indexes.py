@@ -0,0 +1,44 @@
+"""Prefix indexes for typeahead name lookups
+
+``lower(name) text_pattern_ops`` lets ``lower(name) LIKE 'abc%'`` use a
+B-tree range scan regardless of the database collation.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-10-21
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'idx_business_name_prefix': "ON business (lower(name) text_pattern_ops) WHERE name IS NOT NULL",
+    'idx_users_name_prefix': "ON yelp_users (lower(name) text_pattern_ops) WHERE name IS NOT NULL",
+}
+
+
+def _drop_if_invalid(name):
+    """A failed CONCURRENTLY build leaves an invalid index that IF NOT EXISTS would keep; drop it to rebuild"""
+    invalid = op.get_bind().execute(
+        sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+    if invalid:
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES.items():
+            _drop_if_invalid(name)
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,32 @@
+"""Business similarity table filled by ``python -m src.jobs.similar_businesses``
+
+The (business_id, rank) primary key serves ``/businesses/{id}/similar`` as a
+single index range read in rank order.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-10-22
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'business_similarity',
+        sa.Column('business_id', sa.String(), primary_key=True),
+        sa.Column('rank', sa.Integer(), primary_key=True),
+        sa.Column('similar_business_id', sa.String(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.Column('support', sa.Integer(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('business_similarity')
@@ -0,0 +1,83 @@
+"""Change notification triggers for the entity change feed
+
+Every row change on business, reviews, tips and yelp_users sends
+``pg_notify('entity_changes', {"table", "op", "keys"})`` with the row's key
+columns; TRUNCATE sends one statement-level notification without keys.
+Notifications are delivered on commit, and identical payloads within one
+transaction are collapsed by Postgres. Bulk maintenance can skip per-row
+notifications with ``SET LOCAL app.change_notify = 'off'`` and announce one
+table-level change instead (see ``src/db/changes.py``).
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-10-23
+"""
+from alembic import op
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# table -> key columns included in each notification
+TABLE_KEYS = {
+    'business': ('business_id',),
+    'reviews': ('review_id', 'business_id', 'user_id'),
+    'tips': ('business_id', 'user_id'),
+    'yelp_users': ('user_id',),
+}
+
+NOTIFY_FUNCTION = """
+CREATE OR REPLACE FUNCTION notify_entity_change() RETURNS trigger AS $$
+DECLARE
+    row_data jsonb;
+    keys jsonb := '{}'::jsonb;
+    key text;
+BEGIN
+    IF current_setting('app.change_notify', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_LEVEL = 'STATEMENT' THEN
+        PERFORM pg_notify('entity_changes', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP)::text);
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        row_data := to_jsonb(OLD);
+    ELSE
+        row_data := to_jsonb(NEW);
+    END IF;
+    FOREACH key IN ARRAY TG_ARGV LOOP
+        keys := keys || jsonb_build_object(key, row_data -> key);
+    END LOOP;
+    PERFORM pg_notify(
+        'entity_changes',
+        jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'keys', keys)::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade():
+    op.execute(NOTIFY_FUNCTION)
+    for table, keys in TABLE_KEYS.items():
+        arguments = ", ".join(f"'{key}'" for key in keys)
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_notify_change ON {table}")
+        op.execute(
+            f"CREATE TRIGGER {table}_notify_change AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION notify_entity_change({arguments})"
+        )
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_notify_truncate ON {table}")
+        op.execute(
+            f"CREATE TRIGGER {table}_notify_truncate AFTER TRUNCATE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION notify_entity_change()"
+        )
+
+
+def downgrade():
+    for table in TABLE_KEYS:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_notify_truncate ON {table}")
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_notify_change ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS notify_entity_change()")
@@ -0,0 +1,49 @@
+"""Maintenance job queue and checkpoints for ``src/jobs/runner.py``
+
+One row per job run. ``cursor`` is the last key processed and is committed in
+the same transaction as each batch, so a job that is stopped, cancelled or
+crashes resumes exactly after the last completed batch.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-10-24
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'maintenance_jobs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('params', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('cursor', sa.String(), nullable=True),
+        sa.Column('processed', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('changed', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('total_estimate', sa.BigInteger(), nullable=True),
+        sa.Column('cancel_requested', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('owner', sa.String(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+    # Runners poll for claimable jobs
+    op.create_index(
+        'idx_maintenance_jobs_active', 'maintenance_jobs', ['id'],
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+
+
+def downgrade():
+    op.drop_index('idx_maintenance_jobs_active', table_name='maintenance_jobs')
+    op.drop_table('maintenance_jobs')
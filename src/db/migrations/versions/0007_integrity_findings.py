@@ -0,0 +1,59 @@
+"""Integrity findings and scan chunk checksums for ``src/jobs/integrity.py``
+
+``integrity_findings`` holds one row per dangling reference or count
+mismatch, indexed by user and business so per-entity lookups are index
+scans. ``integrity_chunks`` records the key range, row count and checksum of
+every chunk of the last full scan; incremental runs re-check only the chunks
+whose checksum changed.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-10-25
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'integrity_findings',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('check_name', sa.String(), nullable=False),
+        sa.Column('row_key', sa.String(), nullable=False),
+        sa.Column('scan', sa.String(), nullable=False),
+        sa.Column('scan_key', sa.String(), nullable=False),
+        sa.Column('user_id', sa.String(), nullable=True),
+        sa.Column('business_id', sa.String(), nullable=True),
+        sa.Column('detail', sa.JSON(), nullable=True),
+        sa.Column('first_seen_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('last_seen_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.UniqueConstraint('check_name', 'row_key', name='uq_integrity_findings_check_row'),
+    )
+    op.create_index('idx_integrity_findings_scan_key', 'integrity_findings', ['scan', 'scan_key'])
+    op.create_index('idx_integrity_findings_user_id', 'integrity_findings', ['user_id', 'check_name'])
+    op.create_index('idx_integrity_findings_business_id', 'integrity_findings', ['business_id', 'check_name'])
+
+    op.create_table(
+        'integrity_chunks',
+        sa.Column('scan', sa.String(), primary_key=True),
+        sa.Column('seq', sa.Integer(), primary_key=True),
+        sa.Column('lo', sa.String(), nullable=True),  # exclusive; NULL = start of the table
+        sa.Column('hi', sa.String(), nullable=True),  # inclusive; NULL = end of the table
+        sa.Column('row_count', sa.BigInteger(), nullable=False),
+        sa.Column('checksum', sa.String(), nullable=True),
+        sa.Column('checked_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table('integrity_chunks')
+    op.drop_index('idx_integrity_findings_business_id', table_name='integrity_findings')
+    op.drop_index('idx_integrity_findings_user_id', table_name='integrity_findings')
+    op.drop_index('idx_integrity_findings_scan_key', table_name='integrity_findings')
+    op.drop_table('integrity_findings')
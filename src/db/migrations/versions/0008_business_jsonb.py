@@ -0,0 +1,221 @@
+"""Business attributes and hours as JSONB
+
+The Yelp dump stores both columns as text. ``attributes`` values are
+themselves Python literals (``"u'free'"``, ``"False"``,
+``"{'garage': False, 'street': True}"``) and ``hours`` maps day names to
+``"7:0-20:0"``. Both are parsed in Python and written to new JSONB columns in
+keyset batches, one committed UPDATE per batch. Per-row change notifications
+are suspended during the backfill, which then sends one table-level
+notification. The text columns are then dropped and the JSONB columns take
+their names:
+
+- ``attributes``: ``{"WiFi": "free", "BusinessParking": {"garage": false}, "RestaurantsPriceRange2": 2}``
+- ``hours``: ``{"Monday": {"open": "07:00", "close": "20:00"}}``, where a close
+  at or before the open time runs past midnight
+
+``idx_business_attributes`` (GIN, jsonb_path_ops) serves containment filters
+such as ``attributes @> '{"WiFi": "free"}'``. "Open at" is a range question
+that containment cannot answer, so ``idx_business_open_slots`` indexes the
+hour-of-week slots (0 = Monday 00:00) each business is open in.
+``business_open_at(hours, dow, minute)`` then re-checks the exact minute.
+Both call ``public.business_hours_spans`` schema-qualified: index
+expressions are evaluated with a restricted search_path by pg_restore and
+by maintenance commands since PostgreSQL 17.
+Rows whose text cannot be parsed are left NULL and counted in the migration
+log.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2025-10-26
+"""
+import ast
+import json
+import logging
+import re
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+BATCH_SIZE = 5000
+
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+_SPAN = re.compile(r"^\s*(\d{1,2}):(\d{1,2})\s*-\s*(\d{1,2}):(\d{1,2})\s*$")
+
+FUNCTIONS = """
+CREATE OR REPLACE FUNCTION business_hours_spans(hours jsonb)
+RETURNS TABLE (dow int, open_minute int, close_minute int)
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    -- close_minute is past open_minute; > 1440 when the business closes after midnight
+    SELECT s.dow, s.open_minute,
+           CASE WHEN s.close_minute <= s.open_minute THEN s.close_minute + 1440 ELSE s.close_minute END
+    FROM (
+        SELECT array_position(
+                   ARRAY['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'], d.key
+               ) - 1 AS dow,
+               split_part(d.value->>'open', ':', 1)::int * 60 + split_part(d.value->>'open', ':', 2)::int AS open_minute,
+               split_part(d.value->>'close', ':', 1)::int * 60 + split_part(d.value->>'close', ':', 2)::int AS close_minute
+        FROM jsonb_each(CASE WHEN jsonb_typeof($1) = 'object' THEN $1 ELSE '{}'::jsonb END) AS d
+        WHERE jsonb_typeof(d.value) = 'object'
+    ) AS s
+    WHERE s.dow IS NOT NULL
+$$;
+
+CREATE OR REPLACE FUNCTION business_open_slots(hours jsonb)
+RETURNS int[]
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT coalesce(array_agg(DISTINCT (s.dow * 24 + h) % 168), '{}')
+    FROM public.business_hours_spans($1) AS s,
+         generate_series(s.open_minute / 60, (s.close_minute - 1) / 60) AS h
+$$;
+
+CREATE OR REPLACE FUNCTION business_open_at(hours jsonb, dow int, minute int)
+RETURNS boolean
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT EXISTS (
+        SELECT 1 FROM public.business_hours_spans($1) AS s
+        WHERE (s.dow = $2 AND $3 >= s.open_minute AND $3 < s.close_minute)
+           OR (s.dow = ($2 + 6) % 7 AND $3 + 1440 < s.close_minute)
+    )
+$$;
+"""
+
+INDEXES = {
+    'idx_business_attributes': "ON business USING GIN (attributes jsonb_path_ops)",
+    'idx_business_open_slots': "ON business USING GIN (business_open_slots(hours))",
+}
+
+
+def _load(raw):
+    """Parse a stored dict: JSON first, then a Python literal (how the Yelp loader wrote it)"""
+    try:
+        return json.loads(raw)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(raw)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def _attribute_value(value):
+    """``"u'free'"`` -> ``"free"``, ``"False"`` -> false, ``"2"`` -> 2, nested dict strings -> objects"""
+    if isinstance(value, dict):
+        return {str(key): _attribute_value(item) for key, item in value.items()}
+    if not isinstance(value, str):
+        return value
+    try:
+        parsed = ast.literal_eval(value.strip())
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return value
+    if isinstance(parsed, (dict, str, bool, int, float)) or parsed is None:
+        return _attribute_value(parsed) if isinstance(parsed, dict) else parsed
+    return value
+
+
+def parse_attributes(raw):
+    if raw is None or not raw.strip():
+        return None
+    data = _load(raw)
+    return _attribute_value(data) if isinstance(data, dict) else None
+
+
+def parse_hours(raw):
+    if raw is None or not raw.strip():
+        return None
+    data = _load(raw)
+    if not isinstance(data, dict):
+        return None
+    hours = {}
+    for day, span in data.items():
+        match = _SPAN.match(span) if day in DAYS and isinstance(span, str) else None
+        if match is None:
+            continue
+        open_h, open_m, close_h, close_m = (int(part) for part in match.groups())
+        if max(open_h, close_h) > 24 or max(open_m, close_m) > 59:
+            continue
+        hours[day] = {"open": f"{open_h % 24:02d}:{open_m:02d}", "close": f"{close_h % 24:02d}:{close_m:02d}"}
+    return hours
+
+
+def _backfill(connection) -> None:
+    """Parse the text columns into the JSONB ones, one committed UPDATE per keyset batch"""
+    connection.execute(sa.text("SET app.change_notify = 'off'"))
+    after, rows, unparsed = None, 0, 0
+    while True:
+        batch = connection.execute(sa.text("""
+            SELECT business_id, attributes, hours FROM business
+            WHERE CAST(:after AS text) IS NULL OR business_id > :after
+            ORDER BY business_id LIMIT :limit
+        """), {"after": after, "limit": BATCH_SIZE}).all()
+        if not batch:
+            break
+        ids, attributes, hours = [], [], []
+        for business_id, raw_attributes, raw_hours in batch:
+            parsed_attributes, parsed_hours = parse_attributes(raw_attributes), parse_hours(raw_hours)
+            unparsed += (parsed_attributes is None and bool(raw_attributes and raw_attributes.strip()))
+            unparsed += (parsed_hours is None and bool(raw_hours and raw_hours.strip()))
+            ids.append(business_id)
+            attributes.append(None if parsed_attributes is None else json.dumps(parsed_attributes))
+            hours.append(None if parsed_hours is None else json.dumps(parsed_hours))
+        connection.execute(sa.text("""
+            UPDATE business
+            SET attributes_jsonb = CAST(v.attributes AS jsonb), hours_jsonb = CAST(v.hours AS jsonb)
+            FROM unnest(CAST(:ids AS text[]), CAST(:attributes AS text[]), CAST(:hours AS text[]))
+                 AS v(business_id, attributes, hours)
+            WHERE business.business_id = v.business_id
+        """), {"ids": ids, "attributes": attributes, "hours": hours})
+        after = ids[-1]
+        rows += len(batch)
+    connection.execute(sa.text("RESET app.change_notify"))
+    connection.execute(sa.text(
+        "SELECT pg_notify('entity_changes', json_build_object('table', 'business', 'op', 'BULK')::text)"
+    ))
+    logger.info("Converted attributes/hours of %d businesses to JSONB (%d values unparseable, left NULL)", rows, unparsed)
+
+
+def _drop_if_invalid(name):
+    """A failed CONCURRENTLY build leaves an invalid index that IF NOT EXISTS would keep; drop it to rebuild"""
+    invalid = op.get_bind().execute(
+        sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+    if invalid:
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def upgrade():
+    op.add_column('business', sa.Column('attributes_jsonb', postgresql.JSONB(), nullable=True))
+    op.add_column('business', sa.Column('hours_jsonb', postgresql.JSONB(), nullable=True))
+    op.execute(FUNCTIONS)
+    with op.get_context().autocommit_block():
+        _backfill(op.get_bind())
+    op.drop_column('business', 'attributes')
+    op.drop_column('business', 'hours')
+    op.alter_column('business', 'attributes_jsonb', new_column_name='attributes')
+    op.alter_column('business', 'hours_jsonb', new_column_name='hours')
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES.items():
+            _drop_if_invalid(name)
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+        op.execute("ANALYZE business")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    # The original text is not restored verbatim: values come back as JSON text
+    op.alter_column('business', 'attributes', type_=sa.String(), postgresql_using='attributes::text')
+    op.alter_column('business', 'hours', type_=sa.String(), postgresql_using='hours::text')
+    op.execute("DROP FUNCTION IF EXISTS business_open_at(jsonb, int, int)")
+    op.execute("DROP FUNCTION IF EXISTS business_open_slots(jsonb)")
+    op.execute("DROP FUNCTION IF EXISTS business_hours_spans(jsonb)")
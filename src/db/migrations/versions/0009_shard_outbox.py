@@ -0,0 +1,40 @@
+"""Review id registry and write outbox for sharded reviews and tips
+
+``sharded_review_ids`` maps every review on the shards to its business, so
+the write API can keep review_id unique across shards and a lookup by id
+reads one shard. ``shard_outbox`` holds rows the write API has committed on
+the primary until they are inserted on their shard (see ``src/db/shards.py``).
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2025-10-27
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'sharded_review_ids',
+        sa.Column('review_id', sa.String(), primary_key=True),
+        sa.Column('business_id', sa.String(), nullable=False),
+    )
+    op.create_table(
+        'shard_outbox',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('table_name', sa.String(), nullable=False),
+        sa.Column('row', postgresql.JSONB(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table('shard_outbox')
+    op.drop_table('sharded_review_ids')
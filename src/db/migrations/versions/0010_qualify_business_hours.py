@@ -0,0 +1,50 @@
+"""Schema-qualify business_hours_spans in the business hours functions
+
+``business_open_slots`` is used by ``idx_business_open_slots``, and index
+expressions are evaluated with a restricted search_path by pg_restore and
+by maintenance commands (VACUUM, ANALYZE, REINDEX, REFRESH) since PostgreSQL
+17, where the unqualified ``business_hours_spans`` call cannot be resolved.
+0008 now creates the functions qualified; this replaces them on databases
+that were already migrated. The bodies are otherwise unchanged, so the
+index does not need to be rebuilt.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2025-10-27
+"""
+from alembic import op
+
+
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+FUNCTIONS = """
+CREATE OR REPLACE FUNCTION business_open_slots(hours jsonb)
+RETURNS int[]
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT coalesce(array_agg(DISTINCT (s.dow * 24 + h) % 168), '{}')
+    FROM public.business_hours_spans($1) AS s,
+         generate_series(s.open_minute / 60, (s.close_minute - 1) / 60) AS h
+$$;
+
+CREATE OR REPLACE FUNCTION business_open_at(hours jsonb, dow int, minute int)
+RETURNS boolean
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT EXISTS (
+        SELECT 1 FROM public.business_hours_spans($1) AS s
+        WHERE (s.dow = $2 AND $3 >= s.open_minute AND $3 < s.close_minute)
+           OR (s.dow = ($2 + 6) % 7 AND $3 + 1440 < s.close_minute)
+    )
+$$;
+"""
+
+
+def upgrade():
+    op.execute(FUNCTIONS)
+
+
+def downgrade():
+    # The qualified bodies are equivalent under the default search_path, so they are kept
+    pass
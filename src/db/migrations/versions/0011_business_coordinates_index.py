@@ -0,0 +1,46 @@
+"""Coordinate index for radius searches
+
+``/businesses/search`` bounds a radius with a latitude/longitude box before
+the exact distance check; the box's latitude range is a B-tree range scan
+here, with longitude checked from the index entries.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2025-10-27
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'idx_business_coordinates': (
+        "ON business (latitude, longitude) WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+    ),
+}
+
+
+def _drop_if_invalid(name):
+    """A failed CONCURRENTLY build leaves an invalid index that IF NOT EXISTS would keep; drop it to rebuild"""
+    invalid = op.get_bind().execute(
+        sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+    if invalid:
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES.items():
+            _drop_if_invalid(name)
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,150 @@
+"""Changed-key marks that drive incremental integrity scans
+
+Statement-level triggers record, in ``integrity_marks``, the key (in each
+scan's key order) of every row an integrity scan has to re-check: the
+changed rows themselves, and for a deleted, inserted or re-keyed business or
+user, the reviews, tips and checkins that point at it. Incremental scans
+re-check only the chunks holding marked keys and delete the marks as they
+go (see ``src/jobs/integrity.py``). Parent updates that keep the key, such
+as review_count updates, mark only the count scans.
+
+TRUNCATE cannot name its rows, so it drops the chunks of the affected scans
+and their next run is a full one. Bulk loads can skip the marks with
+``SET LOCAL app.integrity_marks = 'off'`` and run a full scan afterwards.
+Chunk checksums are no longer used.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2025-10-27
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+# table -> marks for a set of its rows ({rows}), as SELECT scan, key
+ROW_MARKS = {
+    'reviews': """
+        SELECT s.scan, s.key FROM {rows} r
+        CROSS JOIN LATERAL (VALUES ('reviews', r.review_id), ('user_counts', r.user_id),
+                                   ('business_counts', r.business_id)) AS s(scan, key)
+    """,
+    'tips': "SELECT 'tips', r.user_id FROM {rows} r",
+    'checkins': "SELECT 'checkins', r.business_id FROM {rows} r",
+    'business': "SELECT 'business_counts', r.business_id FROM {rows} r",
+    'yelp_users': "SELECT 'user_counts', r.user_id FROM {rows} r",
+}
+
+# parent table -> (key column, marks for the rows pointing at a set of its keys ({keys}, aliased k(key)))
+KEY_MARKS = {
+    'business': ('business_id', """
+        SELECT 'checkins', k.key FROM {keys}
+        UNION ALL SELECT 'reviews', v.review_id FROM {keys} JOIN reviews v ON v.business_id = k.key
+        UNION ALL SELECT 'tips', t.user_id FROM {keys} JOIN tips t ON t.business_id = k.key
+    """),
+    'yelp_users': ('user_id', """
+        SELECT 'tips', k.key FROM {keys}
+        UNION ALL SELECT 'reviews', v.review_id FROM {keys} JOIN reviews v ON v.user_id = k.key
+    """),
+}
+
+# table -> scans whose chunks a TRUNCATE invalidates
+TRUNCATED_SCANS = {
+    'reviews': ('reviews', 'user_counts', 'business_counts'),
+    'tips': ('tips',),
+    'checkins': ('checkins',),
+    'business': ('reviews', 'tips', 'checkins', 'business_counts'),
+    'yelp_users': ('reviews', 'tips', 'user_counts'),
+}
+
+# Sorted so that concurrent writers take the mark rows' locks in the same order
+_INSERT_MARKS = """
+        INSERT INTO integrity_marks (scan, key)
+        SELECT DISTINCT m.scan, m.key FROM ({marks}) AS m(scan, key)
+        WHERE m.key IS NOT NULL
+        ORDER BY m.scan, m.key
+        ON CONFLICT DO NOTHING;
+"""
+
+
+def _marks(table: str, op_name: str) -> str:
+    rows = {'INSERT': ['new_rows'], 'DELETE': ['old_rows'], 'UPDATE': ['new_rows', 'old_rows']}[op_name]
+    if table not in KEY_MARKS:
+        return " UNION ALL ".join(ROW_MARKS[table].format(rows=relation) for relation in rows)
+    key, key_marks = KEY_MARKS[table]
+    if op_name == 'UPDATE':
+        # Only re-keyed rows change what references resolve to
+        keys = (f"((SELECT {key} FROM new_rows EXCEPT SELECT {key} FROM old_rows) "
+                f"UNION (SELECT {key} FROM old_rows EXCEPT SELECT {key} FROM new_rows))")
+    else:
+        keys = f"(SELECT {key} FROM {rows[0]})"
+    marks = [ROW_MARKS[table].format(rows=relation) for relation in rows]
+    marks.append(key_marks.format(keys=f"{keys} AS k(key)"))
+    return " UNION ALL ".join(marks)
+
+
+def _function(table: str) -> str:
+    branches = "\n    ".join(
+        f"{'IF' if i == 0 else 'ELSIF'} TG_OP = '{op_name}' THEN" + _INSERT_MARKS.format(marks=_marks(table, op_name))
+        for i, op_name in enumerate(('INSERT', 'DELETE', 'UPDATE'))
+    )
+    scans = ", ".join(f"'{scan}'" for scan in TRUNCATED_SCANS[table])
+    return f"""
+CREATE OR REPLACE FUNCTION integrity_mark_{table}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM integrity_chunks WHERE scan IN ({scans});
+        RETURN NULL;
+    END IF;
+    IF current_setting('app.integrity_marks', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+    {branches}
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def _triggers(table: str) -> list:
+    """Transition tables allow one event per trigger, so each event has its own"""
+    return [
+        (f"{table}_integrity_insert", f"AFTER INSERT ON {table} REFERENCING NEW TABLE AS new_rows"),
+        (f"{table}_integrity_delete", f"AFTER DELETE ON {table} REFERENCING OLD TABLE AS old_rows"),
+        (f"{table}_integrity_update",
+         f"AFTER UPDATE ON {table} REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+        (f"{table}_integrity_truncate", f"AFTER TRUNCATE ON {table}"),
+    ]
+
+
+def install(execute) -> None:
+    """Create the marks functions and triggers with ``execute(sql)`` (also used by the tests)"""
+    for table in ROW_MARKS:
+        execute(_function(table))
+        for name, event in _triggers(table):
+            execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+            execute(f"CREATE TRIGGER {name} {event} FOR EACH STATEMENT EXECUTE FUNCTION integrity_mark_{table}()")
+
+
+def upgrade():
+    op.create_table(
+        'integrity_marks',
+        sa.Column('scan', sa.String(), primary_key=True),
+        sa.Column('key', sa.String(), primary_key=True),
+    )
+    install(op.execute)
+    op.drop_column('integrity_chunks', 'checksum')
+
+
+def downgrade():
+    op.add_column('integrity_chunks', sa.Column('checksum', sa.String(), nullable=True))
+    for table in ROW_MARKS:
+        for name, _ in _triggers(table):
+            op.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        op.execute(f"DROP FUNCTION IF EXISTS integrity_mark_{table}()")
+    op.drop_table('integrity_marks')
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey
+from sqlalchemy import JSON, BigInteger, Boolean, Column, Integer, String, Float, Text, DateTime, ForeignKey, UniqueConstraint, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -16,9 +17,9 @@ class Business(Base):
     stars = Column(Float)
     review_count = Column(Integer)
     is_open = Column(Integer)
-    attributes = Column(String)
+    attributes = Column(JSONB)  # {"WiFi": "free", "BusinessParking": {"garage": false}, ...}
     categories = Column(String)
-    hours = Column(String)
+    hours = Column(JSONB)  # {"Monday": {"open": "07:00", "close": "20:00"}, ...}
 
 class Review(Base):
     __tablename__ = 'reviews'
@@ -75,4 +76,88 @@ class Checkin(Base):
     __tablename__ = 'checkins'
 
     business_id = Column(String, primary_key=True)
-    date = Column(String, primary_key=True)  # Note: date is stored as text in your DB
\ No newline at end of file
+    date = Column(String, primary_key=True)  # Note: date is stored as text in your DB
+
+class BusinessSimilarity(Base):
+    __tablename__ = 'business_similarity'
+
+    business_id = Column(String, primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    similar_business_id = Column(String, nullable=False)
+    score = Column(Float, nullable=False)
+    support = Column(Integer, nullable=False)
+
+class ShardedReviewId(Base):
+    """Home business of every review on the shards (src/db/shards.py): keeps review_id unique across shards"""
+    __tablename__ = 'sharded_review_ids'
+
+    review_id = Column(String, primary_key=True)
+    business_id = Column(String, nullable=False)
+
+class ShardOutbox(Base):
+    """Rows accepted by the write API and committed on the primary, waiting to be inserted on their shard"""
+    __tablename__ = 'shard_outbox'
+
+    id = Column(BigInteger, primary_key=True)
+    table_name = Column(String, nullable=False)  # reviews | tips
+    row = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+class MaintenanceJob(Base):
+    __tablename__ = 'maintenance_jobs'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    params = Column(JSON, nullable=False, default=dict)
+    status = Column(String, nullable=False, default="queued")  # queued | running | done | failed | cancelled
+    cursor = Column(String)  # last key processed
+    processed = Column(BigInteger, nullable=False, default=0)
+    changed = Column(BigInteger, nullable=False, default=0)
+    total_estimate = Column(BigInteger)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    owner = Column(String)
+    error = Column(Text)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    started_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    @property
+    def progress(self):
+        """Fraction of the estimated rows processed (None until estimated)"""
+        if self.status == "done":
+            return 1.0
+        if not self.total_estimate:
+            return None
+        return min(1.0, self.processed / self.total_estimate)
+
+class IntegrityFinding(Base):
+    __tablename__ = 'integrity_findings'
+    __table_args__ = (UniqueConstraint('check_name', 'row_key', name='uq_integrity_findings_check_row'),)
+
+    id = Column(BigInteger, primary_key=True)
+    check_name = Column(String, nullable=False)  # e.g. review_orphan_business, user_review_count
+    row_key = Column(String, nullable=False)  # key of the offending row (user_id/business_id for tips)
+    scan = Column(String, nullable=False)  # integrity scan that reported it
+    scan_key = Column(String, nullable=False)  # the row's key in that scan's key order
+    user_id = Column(String)
+    business_id = Column(String)
+    detail = Column(JSON)
+    first_seen_at = Column(DateTime, nullable=False, server_default=func.now())
+    last_seen_at = Column(DateTime, nullable=False, server_default=func.now())
+
+class IntegrityChunk(Base):
+    __tablename__ = 'integrity_chunks'
+
+    scan = Column(String, primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    lo = Column(String)  # exclusive; None = start of the table
+    hi = Column(String)  # inclusive; None = end of the table
+    row_count = Column(BigInteger, nullable=False)
+    checked_at = Column(DateTime, nullable=False, server_default=func.now())
+
+class IntegrityMark(Base):
+    __tablename__ = 'integrity_marks'
+
+    scan = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)  # in the scan's key order; written by the 0012 triggers
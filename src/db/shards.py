@@ -0,0 +1,452 @@
+"""
+Horizontal sharding of ``reviews`` and ``tips`` by ``business_id``.
+
+With ``DB_SHARD_URLS`` set, reviews and tips live on those databases instead
+of the primary. A business's rows all sit on one shard, chosen by jump
+consistent hashing of the business id. Adding a shard therefore moves only
+about 1/N of the businesses, all of them to the new shard.
+Businesses, users and everything else stay on the primary.
+
+``src/crud/crud.py`` routes through the module-level ``shard_router``:
+
+- reads and writes for one business go to its shard
+- per-user and global lists run on every shard concurrently. Each shard
+  returns its first ``skip + limit`` rows in the list's sort order, and the
+  results are k-way merged (``heapq.merge``) and sliced. ``skip`` is capped
+  at ``DB_SHARD_MAX_SKIP``, since every shard reads that many rows
+- a review looked up by id is read from the one shard its business maps to,
+  found through ``sharded_review_ids``
+- user and business names come from the name dictionaries or, while those are
+  not loaded, from one batched lookup on the primary
+
+Shards hold only the two tables, without change triggers. Change
+notifications for ingested rows are sent from the primary.
+
+Writes go through an outbox on the primary. The write API checks references,
+claims each review_id in ``sharded_review_ids`` (so ids stay unique across
+shards), updates counts and stars, and queues the rows in ``shard_outbox``,
+all in one primary transaction. After that commit the rows are inserted on
+their shards, announced, and removed from the outbox. If that step fails, the
+rows stay queued and the ``shard_outbox`` maintenance job (or
+``python -m src.db.shards deliver``) inserts them later. Shard inserts skip
+primary key conflicts, so delivering a row twice is harmless. Counts
+therefore include queued rows that readers cannot see yet.
+
+The API's CRUD paths, the review diagnostics endpoint and the static page
+generator's user lookups read through the shards. Maintenance jobs that
+read reviews or tips, the similar-businesses job and the analytics snapshot
+export still read the primary's tables, so they are refused while shards
+are configured.
+
+Adding a shard, from a shell with the new ``DB_SHARD_URLS``::
+
+    python -m src.db.shards init                # create tables and indexes where missing
+    python -m src.db.shards rebalance           # copy rows to their new shard
+    # deploy the new DB_SHARD_URLS to the API
+    python -m src.db.shards rebalance --delete  # copy stragglers, then drop rows from their old shard
+    python -m src.db.shards check               # rows per shard; fails if any is not on its home shard
+    python -m src.db.shards deliver             # insert rows still queued in shard_outbox
+
+The first move off the primary is the same with ``--from-primary``, which
+also fills ``sharded_review_ids`` for the reviews it copies. Reads
+skip rows found on a shard that is not their home, so lists stay free of
+duplicates between the deploy and ``--delete``.
+"""
+import argparse
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import create_engine, delete, event, inspect, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..core.config import settings
+from .changes import CHANNEL as CHANGE_CHANNEL
+from .database import _apply_session_options, _engine_options, slow_query_log
+
+logger = logging.getLogger(__name__)
+
+_JUMP_MULTIPLIER = 2862933555777941757
+_MASK64 = 2**64 - 1
+
+# Rows per read and insert when copying between databases
+_COPY_ROWS = 2000
+
+# table -> (primary key columns, indexes created by ``init``)
+SHARDED_TABLES = {
+    "reviews": (("review_id",), {
+        "idx_reviews_business_id": "reviews (business_id)",
+        "idx_reviews_user_id": "reviews (user_id)",
+    }),
+    "tips": (("user_id", "business_id"), {
+        "idx_tips_business_id": "tips (business_id)",
+        "idx_tips_user_id": "tips (user_id)",
+    }),
+}
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach): a bucket in [0, buckets) for a 64-bit key"""
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * _JUMP_MULTIPLIER + 1) & _MASK64
+        jump = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+
+def shard_of(business_id: str, shards: int) -> int:
+    key = int.from_bytes(hashlib.blake2b(business_id.encode("utf-8"), digest_size=8).digest(), "big")
+    return jump_hash(key, shards)
+
+
+def byte_order(column):
+    """``column`` sorted by code point (as Python compares str) on PostgreSQL shards, whatever their collation.
+
+    Per-shard lists must be sorted exactly as the merge compares them.
+    """
+    if any(url.startswith("postgresql") for url in settings.db_shard_urls):
+        return column.collate("C")
+    return column
+
+
+class ShardRouter:
+    """Engines and sessions for the configured shards; engines are created on first use"""
+
+    def __init__(self, urls: Sequence[str], fanout_threads: int):
+        self.urls = list(urls)
+        self.fanout_threads = fanout_threads
+        self._engines: Optional[List[Engine]] = None
+        self._sessions: List[sessionmaker] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.urls)
+
+    @property
+    def count(self) -> int:
+        return len(self.urls)
+
+    def _open(self) -> None:
+        with self._lock:
+            if self._engines is not None:
+                return
+            engines = []
+            for url in self.urls:
+                options = _engine_options() if url.startswith("postgresql") else {}
+                engine = create_engine(url, **options)
+                if settings.slow_query_log_enabled:
+                    slow_query_log.install(engine)
+                maker = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+                event.listen(maker, "after_begin", _apply_session_options)
+                engines.append(engine)
+                self._sessions.append(maker)
+            self._executor = ThreadPoolExecutor(max_workers=self.fanout_threads, thread_name_prefix="shard")
+            self._engines = engines
+
+    @property
+    def engines(self) -> List[Engine]:
+        if self._engines is None:
+            self._open()
+        return self._engines
+
+    def shard_for(self, business_id: str) -> int:
+        return shard_of(business_id, self.count)
+
+    def home(self, row, shard: int) -> bool:
+        """Whether ``row`` belongs on ``shard``; false for copies a rebalance has yet to delete"""
+        return row.business_id is None or self.shard_for(row.business_id) == shard
+
+    def session(self, shard: int) -> Session:
+        if self._engines is None:
+            self._open()
+        session = self._sessions[shard]()
+        session.info["statement_timeout_ms"] = settings.statement_timeout_ms
+        return session
+
+    def run(self, shard: int, call: Callable[[Session], Any]) -> Any:
+        """``call(session)`` on a short-lived session of ``shard``"""
+        session = self.session(shard)
+        try:
+            return call(session)
+        finally:
+            session.close()
+
+    def fan_out(self, call: Callable[[int, Session], Any]) -> List[Any]:
+        """``call(shard, session)`` on every shard concurrently; results in shard order"""
+        if self._engines is None:
+            self._open()
+        futures = [
+            self._executor.submit(self.run, shard, lambda session, shard=shard: call(shard, session))
+            for shard in range(self.count)
+        ]
+        return [future.result() for future in futures]
+
+    def read(self, statement, **params) -> list:
+        """A registered statement on the shard holding ``params["business_id"]``"""
+        return self.run(self.shard_for(params["business_id"]), lambda session: statement.execute(session, **params).all())
+
+    def read_all(self, statement, **params) -> List[list]:
+        """A registered statement on every shard, without rows whose home is another shard"""
+        return self.fan_out(lambda shard, session: [
+            row for row in statement.execute(session, **params).all() if self.home(row, shard)
+        ])
+
+    def insert(self, table: str, rows: List[Dict[str, Any]], returning: Sequence[str]) -> list:
+        """Insert ``rows`` on their shards, skipping primary key conflicts; returns ``returning`` of the inserted rows"""
+        from . import models
+
+        model = {"reviews": models.Review, "tips": models.Tip}[table]
+        by_shard: Dict[int, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_shard.setdefault(self.shard_for(row["business_id"]), []).append(row)
+
+        def insert_on(shard: int, session: Session) -> list:
+            dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+            shard_rows = by_shard.get(shard, [])
+            inserted = []
+            # Chunked to stay under the bind parameter limits
+            for i in range(0, len(shard_rows), _COPY_ROWS):
+                statement = dialect.insert(model).values(shard_rows[i:i + _COPY_ROWS]).on_conflict_do_nothing(
+                    index_elements=list(SHARDED_TABLES[table][0])
+                ).returning(*(getattr(model, column) for column in returning))
+                inserted += session.execute(statement).all()
+            session.commit()
+            return inserted
+
+        return [row for inserted in self.fan_out(insert_on) for row in inserted]
+
+
+shard_router = ShardRouter(settings.db_shard_urls, settings.db_shard_fanout_threads)
+
+# Keys of the change notification sent for each row delivered from the outbox
+_NOTIFY_KEYS = {"reviews": ("review_id", "business_id", "user_id"), "tips": ("business_id", "user_id")}
+
+
+def _outbox_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """An outbox row (``to_jsonb`` of the staged row) with its timestamp parsed back"""
+    if row.get("date"):
+        row = {**row, "date": datetime.fromisoformat(row["date"])}
+    return row
+
+
+def _notify_inserted(db: Session, table: str, rows: list) -> None:
+    """pg_notify one INSERT per delivered row, sent when ``db`` commits"""
+    keys = _NOTIFY_KEYS[table]
+    arrays = ", ".join(f"CAST(:{key} AS text[])" for key in keys)
+    pairs = ", ".join(f"'{key}', {key}" for key in keys)
+    db.execute(text(f"""
+        SELECT pg_notify(:channel, json_build_object('table', :table, 'op', 'INSERT',
+               'keys', json_build_object({pairs}))::text)
+        FROM unnest({arrays}) AS changed({', '.join(keys)})
+    """), {"channel": CHANGE_CHANNEL, "table": table,
+           **{key: [getattr(row, key) for row in rows] for key in keys}})
+
+
+def deliver_outbox(router: ShardRouter, db: Session, ids: Sequence[int], commit: bool = True) -> Dict[str, list]:
+    """Insert outbox entries ``ids`` on their shards, announce the inserted rows and delete the entries.
+
+    Entries locked by another delivery are skipped. Returns the notification
+    keys of the rows inserted, per table. With ``commit=False`` the caller
+    commits the deletes and notifications.
+    """
+    from .models import ShardOutbox
+
+    entries = db.execute(
+        select(ShardOutbox.id, ShardOutbox.table_name, ShardOutbox.row)
+        .where(ShardOutbox.id.in_(list(ids))).order_by(ShardOutbox.id).with_for_update(skip_locked=True)
+    ).all()
+    inserted: Dict[str, list] = {}
+    for table in SHARDED_TABLES:
+        rows = [_outbox_row(entry.row) for entry in entries if entry.table_name == table]
+        if rows:
+            inserted[table] = router.insert(table, rows, returning=_NOTIFY_KEYS[table])
+            if inserted[table]:
+                _notify_inserted(db, table, inserted[table])
+    if entries:
+        db.execute(delete(ShardOutbox).where(ShardOutbox.id.in_([entry.id for entry in entries])))
+    if commit:
+        db.commit()
+    return inserted
+
+
+def pending_outbox(db: Session, older_than_seconds: float, after: Optional[int], limit: int) -> List[int]:
+    """Ids of outbox entries after ``after`` queued over ``older_than_seconds`` ago (younger ones are still being delivered)"""
+    return db.execute(text("""
+        SELECT id FROM shard_outbox
+        WHERE created_at < now() - make_interval(secs => :age) AND id > :after
+        ORDER BY id LIMIT :limit
+    """), {"age": older_than_seconds, "after": after or 0, "limit": limit}).scalars().all()
+
+
+def deliver_pending(router: ShardRouter, db: Session, older_than_seconds: float, batch_size: int = 500) -> Dict[str, int]:
+    """Deliver every outbox entry queued more than ``older_than_seconds`` ago; returns rows inserted per table"""
+    inserted: Dict[str, int] = {table: 0 for table in SHARDED_TABLES}
+    after = None
+    while True:
+        ids = pending_outbox(db, older_than_seconds, after, batch_size)
+        if not ids:
+            return inserted
+        for table, rows in deliver_outbox(router, db, ids).items():
+            inserted[table] += len(rows)
+        after = ids[-1]
+
+
+def init_shards(router: ShardRouter) -> None:
+    """Create the sharded tables and their indexes on every shard where missing"""
+    from . import models
+
+    tables = [models.Review.__table__, models.Tip.__table__]
+    for shard, engine in enumerate(router.engines):
+        models.Base.metadata.create_all(engine, tables=tables)
+        with engine.begin() as connection:
+            for _, indexes in SHARDED_TABLES.values():
+                for name, definition in indexes.items():
+                    connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+        logger.info("Shard %d: %s", shard, ", ".join(sorted(inspect(engine).get_table_names())))
+
+
+def _business_batches(session: Session, table: str, batch_size: int) -> Iterable[List[str]]:
+    """Distinct business ids of ``table`` in keyset batches"""
+    after = None
+    while True:
+        ids = session.execute(text(f"""
+            SELECT DISTINCT business_id FROM {table}
+            WHERE business_id IS NOT NULL AND (CAST(:after AS text) IS NULL OR business_id > :after)
+            ORDER BY business_id LIMIT :limit
+        """), {"after": after, "limit": batch_size}).scalars().all()
+        session.rollback()
+        if not ids:
+            return
+        yield ids
+        after = ids[-1]
+
+
+def _register_review_ids(primary: Session, reviews, business_ids: List[str]) -> None:
+    """Claim the ids of the businesses' reviews in ``sharded_review_ids``, as the write API does for new reviews"""
+    from .models import ShardedReviewId
+
+    dialect = postgresql if primary.get_bind().dialect.name == "postgresql" else sqlite
+    primary.execute(dialect.insert(ShardedReviewId).from_select(
+        ["review_id", "business_id"],
+        select(reviews.c.review_id, reviews.c.business_id).where(reviews.c.business_id.in_(business_ids)),
+    ).on_conflict_do_nothing(index_elements=["review_id"]))
+
+
+def _move(router: ShardRouter, source: Session, source_shard: Optional[int], table: str,
+          batch_size: int, delete: bool) -> int:
+    """Copy rows of ``table`` whose home is not ``source_shard`` (None: the primary) there; returns rows copied"""
+    from . import models
+
+    sharded = {"reviews": models.Review, "tips": models.Tip}[table].__table__
+    moved = 0
+    for business_ids in _business_batches(source, table, batch_size):
+        targets: Dict[int, List[str]] = {}
+        for business_id in business_ids:
+            shard = router.shard_for(business_id)
+            if shard != source_shard:
+                targets.setdefault(shard, []).append(business_id)
+        for ids in targets.values():
+            rows = source.execute(
+                select(sharded).where(sharded.c.business_id.in_(ids)).execution_options(yield_per=_COPY_ROWS)
+            ).mappings()
+            for chunk in rows.partitions():
+                # Conflicts are rows copied by an earlier, interrupted run
+                router.insert(table, [dict(row) for row in chunk], returning=SHARDED_TABLES[table][0][:1])
+                moved += len(chunk)
+            if source_shard is None and table == "reviews":
+                _register_review_ids(source, sharded, ids)
+            if delete:
+                if source_shard is None and source.get_bind().dialect.name == "postgresql":
+                    # The rows did not change, they only left the primary: no per-row notifications
+                    source.execute(text("SET LOCAL app.change_notify = 'off'"))
+                source.execute(sharded.delete().where(sharded.c.business_id.in_(ids)))
+                source.commit()
+            else:
+                source.commit()
+    return moved
+
+
+def rebalance(router: ShardRouter, from_primary: bool, delete: bool, batch_size: int) -> Dict[str, int]:
+    """Copy every row to its home shard; with ``delete`` also remove it from where it was"""
+    from .database import SessionLocal
+
+    moved: Dict[str, int] = {}
+    sources = [(shard, lambda shard=shard: router.session(shard)) for shard in range(router.count)]
+    if from_primary:
+        sources.insert(0, (None, SessionLocal))
+    for source_shard, open_session in sources:
+        session = open_session()
+        session.info["statement_timeout_ms"] = 0
+        try:
+            for table in SHARDED_TABLES:
+                started = time.perf_counter()
+                count = _move(router, session, source_shard, table, batch_size, delete)
+                name = "primary" if source_shard is None else f"shard {source_shard}"
+                moved[f"{name} {table}"] = count
+                logger.info("%s %s: %d rows %s in %.1fs", name, table, count,
+                            "moved" if delete else "copied", time.perf_counter() - started)
+        finally:
+            session.close()
+    return moved
+
+
+def check(router: ShardRouter) -> List[Dict[str, Any]]:
+    """Rows per shard and rows not on their home shard (with none misplaced, none can be on two shards)"""
+    def scan(shard: int, session: Session) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"shard": shard}
+        for table in SHARDED_TABLES:
+            rows = session.execute(
+                text(f"SELECT business_id FROM {table}").execution_options(yield_per=_COPY_ROWS)
+            ).scalars()
+            result[table] = result[f"{table}_misplaced"] = 0
+            for business_id in rows:
+                result[table] += 1
+                result[f"{table}_misplaced"] += business_id is not None and router.shard_for(business_id) != shard
+        return result
+
+    return router.fan_out(scan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["init", "rebalance", "check", "deliver"])
+    parser.add_argument("--from-primary", action="store_true", help="rebalance: also move rows off the primary")
+    parser.add_argument("--delete", action="store_true", help="rebalance: remove rows from where they were")
+    parser.add_argument("--batch-size", type=int, default=500, help="rebalance: businesses per batch")
+    parser.add_argument("--older-than", type=float, default=60.0,
+                        help="deliver: only entries queued at least this many seconds ago")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not shard_router.enabled:
+        raise SystemExit("DB_SHARD_URLS is empty")
+    if args.command == "init":
+        init_shards(shard_router)
+    elif args.command == "rebalance":
+        print(rebalance(shard_router, args.from_primary, args.delete, args.batch_size))
+    elif args.command == "deliver":
+        from .database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            print(deliver_pending(shard_router, db, older_than_seconds=args.older_than))
+        finally:
+            db.close()
+    elif args.command == "check":
+        results = check(shard_router)
+        for result in results:
+            print(result)
+        if any(result[f"{table}_misplaced"] for result in results for table in SHARDED_TABLES):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
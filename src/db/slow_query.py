@@ -0,0 +1,222 @@
+"""
+Slow-query log with sampled EXPLAIN capture.
+
+Statements slower than ``settings.slow_query_threshold_ms`` are normalized
+into a fingerprint and aggregated in a bounded in-memory store. For a sample
+of new fingerprints the plan is captured with ``EXPLAIN (ANALYZE off, FORMAT
+JSON)`` on a background thread, against the engine the statement ran on
+(the primary or a shard), so the request that triggered it never waits on
+the extra round trip.
+
+Hot reads run as prepared statements (``DB_PREPARED_STATEMENTS``), which
+reach the listener as ``EXECUTE name (...)``. They are fingerprinted by
+their registered SQL and EXPLAINed as ``EXPLAIN EXECUTE``, after preparing
+them on the EXPLAIN connection (see ``src/db/statements.py``).
+"""
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .statements import executed_statement
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_BIND_PARAM = re.compile(r"%\(\w+\)s|%s|\$\d+|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+# Statements we can safely EXPLAIN without ANALYZE
+_EXPLAINABLE = ("select", "with", "update", "delete", "insert")
+# Our own EXPLAINs, and the one-off PREPARE of a statement whose EXECUTEs are recorded
+_NOT_RECORDED = ("EXPLAIN", "PREPARE")
+
+
+def normalize_statement(statement: str) -> str:
+    """Replace literals and bind parameters with ``?`` and collapse whitespace"""
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _BIND_PARAM.sub("?", normalized)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _IN_LIST.sub("(?...)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+def fingerprint(normalized_statement: str) -> str:
+    """Stable short identifier for a normalized statement"""
+    return hashlib.md5(normalized_statement.encode("utf-8")).hexdigest()[:16]
+
+
+class SlowQueryEntry:
+    """Aggregated timings and captured plan for one query fingerprint"""
+
+    __slots__ = (
+        "fingerprint", "statement", "count", "total_ms", "max_ms",
+        "first_seen", "last_seen", "plan", "plan_captured_at", "explain_error",
+    )
+
+    def __init__(self, query_fingerprint: str, statement: str):
+        self.fingerprint = query_fingerprint
+        self.statement = statement
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.first_seen = time.time()
+        self.last_seen = self.first_seen
+        self.plan: Optional[Any] = None
+        self.plan_captured_at: Optional[float] = None
+        self.explain_error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "statement": self.statement,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 2),
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "plan": self.plan,
+            "plan_captured_at": self.plan_captured_at,
+            "explain_error": self.explain_error,
+        }
+
+
+class SlowQueryLog:
+    """Bounded, thread-safe store of slow statements keyed by fingerprint"""
+
+    def __init__(self, threshold_ms: float, max_entries: int, explain_sample_rate: float):
+        self.threshold_ms = threshold_ms
+        self.max_entries = max_entries
+        self.explain_sample_rate = explain_sample_rate
+        self._entries: "OrderedDict[str, SlowQueryEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending_explains: set = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+
+    def install(self, engine: Engine) -> None:
+        """Attach timing hooks to ``engine``; may be called for several engines"""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["slow_query_start"].pop()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms >= self.threshold_ms and not statement.lstrip().upper().startswith(_NOT_RECORDED):
+            self.record(statement, parameters, elapsed_ms, executemany, conn.engine)
+
+    def _handle_error(self, exception_context):
+        # A failed statement never reaches after_cursor_execute; drop its start time so the stack,
+        # which lives on the pooled DBAPI connection, does not grow with every error
+        conn = exception_context.connection
+        if conn is not None and exception_context.execution_context is not None:
+            started = conn.info.get("slow_query_start")
+            if started:
+                started.pop()
+
+    def record(
+        self, statement: str, parameters: Any, elapsed_ms: float, executemany: bool = False,
+        engine: Optional[Engine] = None,
+    ) -> None:
+        """Aggregate one slow statement; a sample of new fingerprints is EXPLAINed on ``engine``"""
+        prepared = executed_statement(statement)
+        normalized = normalize_statement(prepared.sql if prepared is not None else statement)
+        key = fingerprint(normalized)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = SlowQueryEntry(key, normalized)
+                self._entries[key] = entry
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+            entry.count += 1
+            entry.total_ms += elapsed_ms
+            entry.max_ms = max(entry.max_ms, elapsed_ms)
+            entry.last_seen = time.time()
+            wants_plan = (
+                entry.plan is None
+                and entry.explain_error is None
+                and key not in self._pending_explains
+            )
+            if wants_plan and not executemany and random.random() < self.explain_sample_rate:
+                self._pending_explains.add(key)
+            else:
+                wants_plan = False
+        if wants_plan:
+            self._submit_explain(engine, key, statement, parameters)
+
+    def _submit_explain(self, engine: Optional[Engine], key: str, statement: str, parameters: Any) -> None:
+        explainable = statement.lstrip().lower().startswith(_EXPLAINABLE) or executed_statement(statement) is not None
+        if self._closed or engine is None or not explainable:
+            with self._lock:
+                self._pending_explains.discard(key)
+            return
+        executor = self._executor
+        if executor is None:
+            executor = self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+        try:
+            executor.submit(self._explain, engine, key, statement, parameters)
+        except RuntimeError:
+            # close() ran since the check above
+            with self._lock:
+                self._pending_explains.discard(key)
+
+    def _explain(self, engine: Engine, key: str, statement: str, parameters: Any) -> None:
+        plan = None
+        error = None
+        try:
+            with engine.connect() as conn:
+                prepared = executed_statement(statement)
+                if prepared is not None:
+                    # EXPLAIN EXECUTE needs the statement prepared in this server session too
+                    prepared.prepare(conn)
+                result = conn.exec_driver_sql(
+                    "EXPLAIN (ANALYZE off, FORMAT JSON) " + statement, parameters or ()
+                )
+                plan = result.scalar()
+        except Exception as exc:  # EXPLAIN is best-effort diagnostics
+            logger.warning("EXPLAIN failed for slow query %s: %s", key, exc)
+            error = str(exc)
+        with self._lock:
+            self._pending_explains.discard(key)
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.plan = plan
+                entry.explain_error = error
+                entry.plan_captured_at = time.time()
+
+    def snapshot(self, order_by: str = "total_ms", limit: int = 50) -> List[Dict[str, Any]]:
+        """Return aggregated entries sorted descending by ``order_by``"""
+        with self._lock:
+            entries = [entry.as_dict() for entry in self._entries.values()]
+        entries.sort(key=lambda e: e.get(order_by) or 0, reverse=True)
+        return entries[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._pending_explains.clear()
+
+    def close(self) -> None:
+        """Stop the EXPLAIN thread, dropping queued EXPLAINs (call on shutdown, before disposing the engines)"""
+        self._closed = True
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,115 @@
+"""
+Precompiled statement registry for hot read paths.
+
+Building a ``db.query(...)`` with a dozen labeled columns and two outer joins
+and compiling it to SQL costs more CPU per call than the indexed lookup it
+issues. A ``PreparedStatement`` is built once at import with named bind
+parameters and compiled once per process. On PostgreSQL each pooled connection
+PREPAREs it the first time it runs there. After that only
+``EXECUTE name (...)`` is sent, so the server skips parsing, and after a few
+executions it also skips planning.
+
+Prepared statements belong to a server session. Turn them off
+(``DB_PREPARED_STATEMENTS=false``) behind a transaction-mode pooler such as
+PgBouncer. They are never used in serverless mode, because RDS Proxy pins
+sessions that PREPARE. Statements then go through SQLAlchemy's compiled cache.
+
+The slow-query log sees only ``EXECUTE name (...)``; it looks the name up
+with ``executed_statement`` to fingerprint the registered SQL and EXPLAINs
+the ``EXECUTE`` itself.
+"""
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from sqlalchemy.engine import Connection, Result
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Executable
+
+from ..core.config import settings
+
+_BIND_PARAM = re.compile(r"%\((\w+)\)s")
+_EXECUTE = re.compile(r"\s*EXECUTE\s+(\w+)", re.IGNORECASE)
+
+# info key on the pooled DBAPI connection; cleared by SQLAlchemy when the connection is replaced
+_PREPARED_KEY = "prepared_statements"
+
+
+class PreparedStatement:
+    """One registered statement: the SQLAlchemy construct plus its PREPARE/EXECUTE text"""
+
+    def __init__(self, name: str, statement: Executable):
+        self.name = name
+        self.statement = statement
+        self.sql: Optional[str] = None
+        self.prepare_sql: Optional[str] = None
+        self.execute_sql: Optional[str] = None
+        self._defaults: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _compile(self, connection: Connection) -> None:
+        """Render ``PREPARE name AS ...`` with $n placeholders and the matching ``EXECUTE`` template"""
+        compiled = self.statement.compile(dialect=connection.dialect)
+        sql = str(compiled)
+        names: list = []
+
+        def positional(match):
+            if match.group(1) not in names:
+                names.append(match.group(1))
+            return f"${names.index(match.group(1)) + 1}"
+
+        # The PREPARE text is sent without parameters, so pyformat's escaped %% must be unescaped
+        body = _BIND_PARAM.sub(positional, sql).replace("%%", "%")
+        arguments = ", ".join(f"%({name})s" for name in names)
+        # Values fixed at build time, e.g. the LIMIT 1 of a single-row lookup
+        self._defaults = {name: value for name, value in compiled.params.items() if value is not None}
+        self.sql = body
+        self.prepare_sql = f"PREPARE {self.name} AS {body}"
+        self.execute_sql = f"EXECUTE {self.name} ({arguments})" if names else f"EXECUTE {self.name}"
+
+    def execute(self, db: Session, **params: Any) -> Result:
+        connection = db.connection()
+        if not use_prepared_statements(connection):
+            return db.execute(self.statement, params)
+        if self.execute_sql is None:
+            with self._lock:
+                if self.execute_sql is None:
+                    self._compile(connection)
+        self.prepare(connection)
+        return connection.exec_driver_sql(self.execute_sql, {**self._defaults, **params})
+
+    def prepare(self, connection: Connection) -> None:
+        """PREPARE on ``connection``'s server session unless it already holds the statement"""
+        prepared = connection.connection.info.setdefault(_PREPARED_KEY, set())
+        if self.name not in prepared:
+            # PREPARE is not transactional, so it survives a rollback of the surrounding transaction
+            connection.exec_driver_sql(self.prepare_sql)
+            prepared.add(self.name)
+
+
+STATEMENTS: Dict[str, PreparedStatement] = {}
+
+
+def register(name: str, statement: Executable) -> PreparedStatement:
+    """Add ``statement`` to the registry under ``name``, which is also its server-side name"""
+    if name in STATEMENTS:
+        raise ValueError(f"Statement {name!r} is already registered")
+    STATEMENTS[name] = PreparedStatement(name, statement)
+    return STATEMENTS[name]
+
+
+def executed_statement(sql: str) -> Optional[PreparedStatement]:
+    """The registered statement that ``sql`` runs, if it is an ``EXECUTE name (...)`` sent by ``execute``"""
+    match = _EXECUTE.match(sql)
+    if match is None:
+        return None
+    statement = STATEMENTS.get(match.group(1))
+    return statement if statement is not None and statement.prepare_sql is not None else None
+
+
+def use_prepared_statements(connection: Connection) -> bool:
+    return (
+        settings.db_prepared_statements
+        and not settings.serverless
+        and connection.dialect.name == "postgresql"
+    )
@@ -0,0 +1,333 @@
+"""
+Incremental integrity checks for dangling references and count mismatches.
+
+Each scan is a ``BatchJob`` over one table in key order:
+
+    integrity_reviews          reviews whose business_id or user_id does not exist
+    integrity_tips             tips whose business_id or user_id does not exist
+    integrity_checkins         checkins whose business_id does not exist
+    integrity_user_counts      yelp_users.review_count differs from the user's reviews
+    integrity_business_counts  business.review_count differs from the business's reviews
+
+A full scan checks the table one chunk (one batch of keys) at a time and
+records each chunk's key range and row count in ``integrity_chunks``. The
+chunks become visible only when the scan completes, and the last one is
+open-ended so later inserts past it are covered. Later runs are incremental:
+triggers (migration 0012) mark, in ``integrity_marks``, the scan key of every
+row that has to be re-checked, and a run re-checks only the chunks holding
+marks. A changed review, tip or checkin marks itself and its user's and
+business's counts; a deleted, inserted or re-keyed business or user marks
+the reviews, tips and checkins that point at it, so orphans created by
+deleting a parent are found too. Each chunk's marks are deleted in the
+transaction that re-checks it, before the check, so a change committed
+after that is re-checked by the next run. TRUNCATE drops the affected
+scans' chunks, so their next run is full.
+
+Findings are upserted into ``integrity_findings`` keyed by (check, row), so
+``first_seen_at`` survives re-checks. Findings in a re-checked range that no
+longer reproduce are deleted.
+
+    python -m src.jobs.integrity            # every scan; incremental where a full scan exists
+    python -m src.jobs.integrity --full
+"""
+import argparse
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from ..db import models
+from ..db.database import SessionLocal
+from .runner import BatchJob, enqueue, job_runner, register
+
+logger = logging.getLogger(__name__)
+
+# Marked chunks re-checked per batch in incremental mode
+_CHUNKS_PER_BATCH = 10
+
+# Chunks of :scan holding at least one marked key
+_MARKED_CHUNKS = """
+    FROM integrity_chunks c
+    WHERE c.scan = :scan AND EXISTS (
+        SELECT 1 FROM integrity_marks m
+        WHERE m.scan = c.scan AND (c.lo IS NULL OR m.key > c.lo) AND (c.hi IS NULL OR m.key <= c.hi)
+    )
+"""
+
+_UPSERT_FINDINGS = """
+    INSERT INTO integrity_findings (check_name, row_key, scan, scan_key, user_id, business_id, detail)
+    {findings}
+    ON CONFLICT (check_name, row_key) DO UPDATE
+    SET scan = EXCLUDED.scan, scan_key = EXCLUDED.scan_key, user_id = EXCLUDED.user_id,
+        business_id = EXCLUDED.business_id, detail = EXCLUDED.detail, last_seen_at = now()
+"""
+
+
+def _in_range(column: str) -> str:
+    """``column`` in the chunk (:lo, :hi]; a NULL bound is open"""
+    return f"(CAST(:lo AS text) IS NULL OR {column} > :lo) AND (CAST(:hi AS text) IS NULL OR {column} <= :hi)"
+
+
+class IntegrityScan(BatchJob):
+    """Full or incremental (marked chunks) scan of one table; see the module docstring"""
+
+    scan: str = ""
+    checks: Tuple[str, ...] = ()
+    # SELECT check_name, row_key, scan, scan_key, user_id, business_id, detail of the rows in (:lo, :hi] that fail
+    findings_sql: str = ""
+
+    @property
+    def _pending(self) -> str:
+        return f"{self.scan}:pending"
+
+    def start(self, db: Session, params: Dict[str, Any]) -> Dict[str, Any]:
+        has_chunks = db.query(models.IntegrityChunk.seq).filter(models.IntegrityChunk.scan == self.scan).first()
+        mode = "incremental" if has_chunks and not params.get("full") else "full"
+        if mode == "full":
+            db.query(models.IntegrityChunk).filter(models.IntegrityChunk.scan == self._pending).delete()
+        return {**params, "mode": mode}
+
+    def next_keys(self, db: Session, after: Optional[str], limit: int, params: Dict[str, Any]) -> List[str]:
+        if params["mode"] == "full":
+            return super().next_keys(db, after, limit, params)
+        rows = db.execute(
+            text(
+                f"SELECT c.seq {_MARKED_CHUNKS} "
+                "AND (CAST(:after AS integer) IS NULL OR c.seq > CAST(:after AS integer)) ORDER BY c.seq LIMIT :limit"
+            ),
+            {"scan": self.scan, "after": after, "limit": _CHUNKS_PER_BATCH},
+        )
+        return [str(row[0]) for row in rows]
+
+    def estimate_total(self, db: Session, params: Dict[str, Any]) -> Optional[int]:
+        if params["mode"] == "full":
+            return super().estimate_total(db, params)
+        return db.execute(text(f"SELECT count(*) {_MARKED_CHUNKS}"), {"scan": self.scan}).scalar()
+
+    def check(self, db: Session, lo: Optional[str], hi: Optional[str]) -> int:
+        """Record the findings in (lo, hi] and drop earlier ones there that no longer reproduce"""
+        recorded = db.execute(
+            text(_UPSERT_FINDINGS.format(findings=self.findings_sql)), {"lo": lo, "hi": hi}
+        ).rowcount
+        # Rows upserted above carry this transaction's now(); anything older in the range is resolved
+        db.execute(
+            text(f"DELETE FROM integrity_findings WHERE scan = :scan AND {_in_range('scan_key')} AND last_seen_at < now()"),
+            {"scan": self.scan, "lo": lo, "hi": hi},
+        )
+        return recorded
+
+    def recheck(self, db: Session, lo: Optional[str], hi: Optional[str]) -> Tuple[int, int]:
+        """Clear the chunk's marks, then check it; returns (rows in the chunk, findings recorded)"""
+        # Marks committed after this delete survive it, and their rows are re-checked by the next run
+        db.execute(text(f"DELETE FROM integrity_marks WHERE scan = :scan AND {_in_range('key')}"),
+                   {"scan": self.scan, "lo": lo, "hi": hi})
+        row_count = db.execute(
+            text(f"SELECT count(*) FROM {self.table} WHERE {_in_range(self.key_column)}"), {"lo": lo, "hi": hi}
+        ).scalar()
+        return row_count, self.check(db, lo, hi)
+
+    def _add_chunk(self, db: Session, scan: str, seq: int, lo: Optional[str], hi: Optional[str]) -> int:
+        row_count, recorded = self.recheck(db, lo, hi)
+        db.add(models.IntegrityChunk(scan=scan, seq=seq, lo=lo, hi=hi, row_count=row_count))
+        return recorded
+
+    def process(self, db: Session, after: Optional[str], keys: List[str], params: Dict[str, Any]) -> int:
+        if params["mode"] == "full":
+            seq = db.query(func.coalesce(func.max(models.IntegrityChunk.seq) + 1, 0)).filter(
+                models.IntegrityChunk.scan == self._pending
+            ).scalar()
+            return self._add_chunk(db, self._pending, seq, after, keys[-1])
+
+        recorded = 0
+        chunks = db.query(models.IntegrityChunk).filter(
+            models.IntegrityChunk.scan == self.scan, models.IntegrityChunk.seq.in_([int(key) for key in keys])
+        ).order_by(models.IntegrityChunk.seq)
+        for chunk in chunks:
+            chunk.row_count, found = self.recheck(db, chunk.lo, chunk.hi)
+            chunk.checked_at = func.now()
+            recorded += found
+        return recorded
+
+    def complete(self, db: Session, after: Optional[str], params: Dict[str, Any]) -> None:
+        if params["mode"] != "full":
+            return
+        # Reopen the last chunk to the end of the table, then swap the new chunks in
+        chunks = db.query(models.IntegrityChunk).filter(models.IntegrityChunk.scan == self._pending)
+        last = chunks.order_by(models.IntegrityChunk.seq.desc()).first()
+        seq, lo = (last.seq, last.lo) if last is not None else (0, None)
+        if last is not None:
+            db.delete(last)
+            db.flush()
+        self._add_chunk(db, self._pending, seq, lo, None)
+        db.flush()
+        db.query(models.IntegrityChunk).filter(models.IntegrityChunk.scan == self.scan).delete()
+        chunks.update({models.IntegrityChunk.scan: self.scan})
+
+
+@register
+class ReviewReferences(IntegrityScan):
+    name = "integrity_reviews"
+    description = "Find reviews whose business or user does not exist"
+    scan, table, key_column = "reviews", "reviews", "review_id"
+    reads_sharded_tables = True
+    checks = ("review_orphan_business", "review_orphan_user")
+    findings_sql = f"""
+        SELECT 'review_orphan_business', r.review_id, 'reviews', r.review_id, r.user_id, r.business_id, CAST(NULL AS json)
+        FROM reviews r
+        WHERE {_in_range('r.review_id')} AND r.business_id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM business b WHERE b.business_id = r.business_id)
+        UNION ALL
+        SELECT 'review_orphan_user', r.review_id, 'reviews', r.review_id, r.user_id, r.business_id, CAST(NULL AS json)
+        FROM reviews r
+        WHERE {_in_range('r.review_id')} AND r.user_id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM yelp_users u WHERE u.user_id = r.user_id)
+    """
+
+
+@register
+class TipReferences(IntegrityScan):
+    name = "integrity_tips"
+    description = "Find tips whose business or user does not exist"
+    scan, table, key_column = "tips", "tips", "user_id"
+    reads_sharded_tables = True
+    checks = ("tip_orphan_business", "tip_orphan_user")
+    findings_sql = f"""
+        SELECT 'tip_orphan_business', t.user_id || '/' || t.business_id, 'tips', t.user_id, t.user_id, t.business_id,
+               CAST(NULL AS json)
+        FROM tips t
+        WHERE {_in_range('t.user_id')}
+          AND NOT EXISTS (SELECT 1 FROM business b WHERE b.business_id = t.business_id)
+        UNION ALL
+        SELECT 'tip_orphan_user', t.user_id || '/' || t.business_id, 'tips', t.user_id, t.user_id, t.business_id,
+               CAST(NULL AS json)
+        FROM tips t
+        WHERE {_in_range('t.user_id')}
+          AND NOT EXISTS (SELECT 1 FROM yelp_users u WHERE u.user_id = t.user_id)
+    """
+
+
+@register
+class CheckinReferences(IntegrityScan):
+    name = "integrity_checkins"
+    description = "Find checkins whose business does not exist"
+    scan, table, key_column = "checkins", "checkins", "business_id"
+    checks = ("checkin_orphan_business",)
+    findings_sql = f"""
+        SELECT 'checkin_orphan_business', c.business_id, 'checkins', c.business_id, CAST(NULL AS varchar),
+               c.business_id, CAST(NULL AS json)
+        FROM (SELECT DISTINCT business_id FROM checkins WHERE {_in_range('business_id')}) c
+        WHERE NOT EXISTS (SELECT 1 FROM business b WHERE b.business_id = c.business_id)
+    """
+
+
+@register
+class UserReviewCounts(IntegrityScan):
+    name = "integrity_user_counts"
+    description = "Find users whose review_count differs from their reviews (fix with fix_review_counts)"
+    scan, table, key_column = "user_counts", "yelp_users", "user_id"
+    reads_sharded_tables = True
+    checks = ("user_review_count",)
+    findings_sql = f"""
+        SELECT 'user_review_count', u.user_id, 'user_counts', u.user_id, u.user_id, CAST(NULL AS varchar),
+               json_build_object('stated', u.review_count, 'actual', c.actual)
+        FROM yelp_users u
+        CROSS JOIN LATERAL (SELECT count(*) AS actual FROM reviews r WHERE r.user_id = u.user_id) c
+        WHERE {_in_range('u.user_id')} AND u.review_count IS DISTINCT FROM c.actual
+    """
+
+
+@register
+class BusinessReviewCounts(IntegrityScan):
+    name = "integrity_business_counts"
+    description = "Find businesses whose review_count differs from their reviews"
+    scan, table, key_column = "business_counts", "business", "business_id"
+    reads_sharded_tables = True
+    checks = ("business_review_count",)
+    findings_sql = f"""
+        SELECT 'business_review_count', b.business_id, 'business_counts', b.business_id, CAST(NULL AS varchar),
+               b.business_id, json_build_object('stated', b.review_count, 'actual', c.actual)
+        FROM business b
+        CROSS JOIN LATERAL (SELECT count(*) AS actual FROM reviews r WHERE r.business_id = b.business_id) c
+        WHERE {_in_range('b.business_id')} AND b.review_count IS DISTINCT FROM c.actual
+    """
+
+
+SCANS = (ReviewReferences, TipReferences, CheckinReferences, UserReviewCounts, BusinessReviewCounts)
+
+
+def enqueue_scans(db: Session, full: bool = False) -> List[models.MaintenanceJob]:
+    """Queue every integrity scan that is not already queued or running"""
+    active = {
+        name for (name,) in db.query(models.MaintenanceJob.name).filter(
+            models.MaintenanceJob.name.in_([scan.name for scan in SCANS]),
+            models.MaintenanceJob.status.in_(("queued", "running")),
+        )
+    }
+    return [enqueue(db, scan.name, {"full": True} if full else {}) for scan in SCANS if scan.name not in active]
+
+
+def summary(db: Session) -> Dict[str, Any]:
+    """Open findings per check and the coverage of every scan"""
+    findings = {
+        check_name: {"count": count, "first_seen_at": first_seen, "last_seen_at": last_seen}
+        for check_name, count, first_seen, last_seen in db.query(
+            models.IntegrityFinding.check_name,
+            func.count(),
+            func.min(models.IntegrityFinding.first_seen_at),
+            func.max(models.IntegrityFinding.last_seen_at),
+        ).group_by(models.IntegrityFinding.check_name)
+    }
+    chunks = {
+        scan: {"chunks": count, "rows": int(rows or 0), "oldest_check_at": oldest, "latest_check_at": latest}
+        for scan, count, rows, oldest, latest in db.query(
+            models.IntegrityChunk.scan,
+            func.count(),
+            func.sum(models.IntegrityChunk.row_count),
+            func.min(models.IntegrityChunk.checked_at),
+            func.max(models.IntegrityChunk.checked_at),
+        ).group_by(models.IntegrityChunk.scan)
+    }
+    scans = []
+    for scan in SCANS:
+        last_job = db.query(models.MaintenanceJob).filter(
+            models.MaintenanceJob.name == scan.name
+        ).order_by(models.MaintenanceJob.id.desc()).first()
+        scans.append({
+            "job": scan.name,
+            "scan": scan.scan,
+            "checks": {check: findings.get(check, {"count": 0})["count"] for check in scan.checks},
+            "coverage": chunks.get(scan.scan),
+            "last_run": None if last_job is None else {
+                "id": last_job.id,
+                "status": last_job.status,
+                "mode": (last_job.params or {}).get("mode"),
+                "finished_at": last_job.finished_at,
+            },
+        })
+    return {"findings": findings, "scans": scans}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="rescan everything and rebuild the chunks")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    db = SessionLocal()
+    try:
+        job_ids = [job.id for job in enqueue_scans(db, full=args.full)]
+    finally:
+        db.close()
+    for job_id in job_ids:
+        if job_runner.claim(job_id) is not None:
+            job_runner.execute(job_id)
+    db = SessionLocal()
+    try:
+        for check_name, stats in sorted(summary(db)["findings"].items()):
+            print(f"{check_name:<26} {stats['count']:>10,}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Recompute ``yelp_users.review_count`` from ``reviews``, one batch of users at a time.
+
+Replaces the single ``UPDATE ... FROM (SELECT ... GROUP BY user_id)`` over
+every user in ``fix_review_counts.py``. Each batch locks its users in id
+order (the order the write API uses), then counts their reviews through
+``idx_reviews_user_id`` in a second statement. The count's snapshot is
+therefore taken after any concurrent ingest holding one of those rows has
+committed. Only users whose count differs are updated, so the row triggers
+notify exactly the changed users.
+
+    python -m src.jobs.runner run fix_review_counts
+"""
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+from sqlalchemy.types import String
+
+from .runner import BatchJob, register
+
+_LOCK_USERS = text(
+    "SELECT user_id FROM yelp_users WHERE user_id = ANY(:keys) ORDER BY user_id FOR UPDATE"
+).bindparams(bindparam("keys", type_=ARRAY(String)))
+
+_UPDATE_COUNTS = text(
+    """
+    UPDATE yelp_users u
+    SET review_count = c.actual
+    FROM (
+        SELECT k.user_id, (SELECT count(*) FROM reviews r WHERE r.user_id = k.user_id) AS actual
+        FROM unnest(:keys) AS k(user_id)
+    ) c
+    WHERE u.user_id = c.user_id AND u.review_count IS DISTINCT FROM c.actual
+    """
+).bindparams(bindparam("keys", type_=ARRAY(String)))
+
+
+@register
+class FixUserReviewCounts(BatchJob):
+    name = "fix_review_counts"
+    description = "Recompute yelp_users.review_count from the reviews table"
+    table = "yelp_users"
+    key_column = "user_id"
+    reads_sharded_tables = True
+
+    def process(self, db: Session, after: Optional[str], keys: List[str], params: Dict[str, Any]) -> int:
+        db.execute(_LOCK_USERS, {"keys": keys})
+        return db.execute(_UPDATE_COUNTS, {"keys": keys}).rowcount
@@ -0,0 +1,455 @@
+"""
+Chunked, resumable maintenance jobs.
+
+A ``BatchJob`` walks one table in primary-key order, ``batch_size`` keys at a
+time. Each batch is its own short transaction with ``lock_timeout`` and
+``statement_timeout`` set. The job's checkpoint (``maintenance_jobs.cursor``)
+is advanced in the same transaction, so a stopped or crashed job resumes
+after the last committed batch and never repeats or skips one.
+
+Between batches the runner sleeps so that the job is busy for at most
+``duty_cycle`` of wall time (0.25 means sleeping three times as long as the
+batch took), which leaves the pool and the disks to API traffic. A batch that
+hits ``lock_timeout`` is retried after a back-off instead of queueing behind
+API writes. Cancellation is a flag on the job row, checked before every
+batch.
+
+Jobs are queued in ``maintenance_jobs`` (see ``/api/v1/admin/jobs``) and
+claimed with ``FOR UPDATE SKIP LOCKED``, so any number of runners (the
+sidecar below, or API workers with ``JOBS_RUNNER_ENABLED``) can share the
+queue. A ``running`` job whose heartbeat is older than
+``JOBS_STALE_SECONDS`` is treated as orphaned and taken over. Runners also
+queue the jobs in ``JOBS_SCHEDULE`` (name -> interval in seconds) when their
+last run finished longer ago than the interval.
+
+    python -m src.jobs.runner                                   # sidecar: run queued jobs until stopped
+    python -m src.jobs.runner run fix_review_counts             # run one job in the foreground
+    python -m src.jobs.runner enqueue fix_review_counts --batch-size 5000
+    python -m src.jobs.runner list
+    python -m src.jobs.runner cancel 12
+"""
+import argparse
+import importlib
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db import models
+from ..db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Modules whose BatchJob subclasses are registered on import
+JOB_MODULES = ("src.jobs.review_counts", "src.jobs.integrity", "src.jobs.shard_outbox")
+
+_LOCK_NOT_AVAILABLE = "55P03"
+_MAX_LOCK_RETRIES = 10
+_SCHEDULE_LOCK = 0x6A6F6273  # pg_advisory_xact_lock key for enqueue_due
+
+JOBS: Dict[str, "BatchJob"] = {}
+
+
+def register(job_class):
+    """Class decorator adding a BatchJob to the registry under its ``name``"""
+    JOBS[job_class.name] = job_class()
+    return job_class
+
+
+def available_jobs() -> Dict[str, "BatchJob"]:
+    for module in JOB_MODULES:
+        importlib.import_module(module)
+    return JOBS
+
+
+class BatchJob(ABC):
+    """One maintenance task over ``table``, processed in ``key_column`` order"""
+
+    name: str = ""
+    description: str = ""
+    table: str = ""
+    key_column: str = ""
+    # Reads reviews or tips, which are on the shards (not the primary) when DB_SHARD_URLS is set
+    reads_sharded_tables: bool = False
+
+    def start(self, db: Session, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Called once before the first batch; the returned params are stored with the job"""
+        return params
+
+    def next_keys(self, db: Session, after: Optional[str], limit: int, params: Dict[str, Any]) -> List[str]:
+        """The next ``limit`` keys after the checkpoint"""
+        rows = db.execute(
+            text(
+                f"SELECT {self.key_column} FROM {self.table} "
+                f"WHERE CAST(:after AS text) IS NULL OR {self.key_column} > :after "
+                f"ORDER BY {self.key_column} LIMIT :limit"
+            ),
+            {"after": after, "limit": limit},
+        )
+        return [row[0] for row in rows]
+
+    @abstractmethod
+    def process(self, db: Session, after: Optional[str], keys: List[str], params: Dict[str, Any]) -> int:
+        """Do the work for the keys after ``after`` up to ``keys[-1]``; returns the number of rows changed"""
+
+    def complete(self, db: Session, after: Optional[str], params: Dict[str, Any]) -> None:
+        """Called in the transaction that marks the job done"""
+
+    def estimate_total(self, db: Session, params: Dict[str, Any]) -> Optional[int]:
+        """Approximate row count of ``table`` from planner statistics"""
+        if db.get_bind().dialect.name != "postgresql":
+            return db.execute(text(f"SELECT count(*) FROM {self.table}")).scalar()
+        estimate = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"), {"table": self.table}
+        ).scalar()
+        return estimate if estimate and estimate > 0 else None
+
+
+def _add_job(db: Session, name: str, params: Optional[Dict[str, Any]] = None) -> models.MaintenanceJob:
+    if name not in available_jobs():
+        raise ValueError(f"Unknown job {name!r}; available: {', '.join(sorted(JOBS))}")
+    if settings.db_shard_urls and JOBS[name].reads_sharded_tables:
+        raise ValueError(f"Job {name!r} reads reviews/tips from the primary and cannot run with DB_SHARD_URLS set")
+    job = models.MaintenanceJob(name=name, params=params or {}, status="queued")
+    db.add(job)
+    return job
+
+
+def enqueue(db: Session, name: str, params: Optional[Dict[str, Any]] = None) -> models.MaintenanceJob:
+    job = _add_job(db, name, params)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def request_cancel(db: Session, job_id: int) -> Optional[models.MaintenanceJob]:
+    """Cancel a queued job now, or flag a running one to stop before its next batch"""
+    job = db.get(models.MaintenanceJob, job_id, with_for_update=True)
+    if job is None:
+        return None
+    if job.status == "queued":
+        job.status = "cancelled"
+        job.finished_at = func.now()
+    elif job.status == "running":
+        job.cancel_requested = True
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def resume(db: Session, job_id: int) -> Optional[models.MaintenanceJob]:
+    """Requeue a failed or cancelled job; it continues from its checkpoint"""
+    job = db.get(models.MaintenanceJob, job_id, with_for_update=True)
+    if job is None:
+        return None
+    if job.status in ("failed", "cancelled"):
+        job.status = "queued"
+        job.cancel_requested = False
+        job.error = None
+        job.finished_at = None
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def valid_schedule(schedule: Dict[str, float]) -> Dict[str, float]:
+    """``schedule`` without (and logging) names that are not registered jobs"""
+    jobs = available_jobs()
+    unknown = sorted(name for name in schedule if name not in jobs)
+    if unknown:
+        logger.error("JOBS_SCHEDULE names unknown jobs %s; available: %s", ", ".join(unknown), ", ".join(sorted(jobs)))
+    return {name: interval for name, interval in schedule.items() if name in jobs}
+
+
+def enqueue_due(db: Session, schedule: Dict[str, float]) -> List[models.MaintenanceJob]:
+    """Queue each scheduled job that is not queued or running and last finished more than its interval ago"""
+    queued = []
+    if not schedule:
+        return queued
+    # One runner at a time decides, so concurrent runners do not queue the same job twice
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _SCHEDULE_LOCK})
+    for name, interval in schedule.items():
+        if settings.db_shard_urls and getattr(available_jobs().get(name), "reads_sharded_tables", False):
+            continue
+        recent = db.execute(
+            text(
+                "SELECT 1 FROM maintenance_jobs WHERE name = :name AND (status IN ('queued', 'running') "
+                "OR finished_at > now() - make_interval(secs => :interval)) LIMIT 1"
+            ),
+            {"name": name, "interval": interval},
+        ).first()
+        if recent is None:
+            queued.append(_add_job(db, name))
+    db.commit()
+    return queued
+
+
+def _is_lock_timeout(exc: OperationalError) -> bool:
+    code = getattr(exc.orig, "pgcode", None) or getattr(exc.orig, "sqlstate", None)
+    return code == _LOCK_NOT_AVAILABLE
+
+
+class JobRunner:
+    """Claims queued jobs and executes them batch by batch"""
+
+    def __init__(self, owner: Optional[str] = None):
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.current_job: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _begin_batch(self, db: Session) -> None:
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text(f"SET LOCAL statement_timeout = {int(settings.jobs_statement_timeout_ms)}"))
+            db.execute(text(f"SET LOCAL lock_timeout = {int(settings.jobs_lock_timeout_ms)}"))
+
+    def claim(self, job_id: Optional[int] = None) -> Optional[int]:
+        """Take the oldest queued (or orphaned running) job, or only ``job_id``; returns its id"""
+        db = SessionLocal()
+        try:
+            claimed = db.execute(
+                text(
+                    """
+                    UPDATE maintenance_jobs
+                    SET status = 'running', owner = :owner, heartbeat_at = now(),
+                        started_at = COALESCE(started_at, now())
+                    WHERE id = (
+                        SELECT id FROM maintenance_jobs
+                        WHERE (status = 'queued'
+                               OR (status = 'running' AND heartbeat_at < now() - make_interval(secs => :stale)))
+                          AND (CAST(:job_id AS integer) IS NULL OR id = :job_id)
+                        ORDER BY id
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id
+                    """
+                ),
+                {"owner": self.owner, "stale": settings.jobs_stale_seconds, "job_id": job_id},
+            ).scalar()
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+    def execute(self, job_id: int, on_progress: Optional[Callable[[models.MaintenanceJob], None]] = None) -> str:
+        """Run a claimed job until it finishes, fails, is cancelled or the runner stops; returns its status"""
+        self.current_job = job_id
+        try:
+            return self._execute(job_id, on_progress)
+        finally:
+            self.current_job = None
+
+    def _execute(self, job_id: int, on_progress) -> str:
+        db = SessionLocal()
+        try:
+            job = db.get(models.MaintenanceJob, job_id)
+            task = available_jobs().get(job.name)
+            if task is None:
+                return self._finish(db, job, "failed", f"Unknown job {job.name!r}")
+            params = dict(job.params or {})
+            batch_size = int(params.get("batch_size") or settings.jobs_batch_size)
+            duty_cycle = min(1.0, max(0.01, float(params.get("duty_cycle") or settings.jobs_duty_cycle)))
+            self._begin_batch(db)
+            if job.cursor is None and job.processed == 0:
+                params = task.start(db, params)
+                job.params = params
+            if job.total_estimate is None:
+                job.total_estimate = task.estimate_total(db, params)
+            db.commit()
+            logger.info("Job %d %s: starting after %r (batch %d, duty cycle %.2f)",
+                        job_id, job.name, job.cursor, batch_size, duty_cycle)
+
+            lock_retries = 0
+            while True:
+                if self._stop.is_set():
+                    # Hand the job back; the next runner resumes from the checkpoint
+                    job = db.get(models.MaintenanceJob, job_id, with_for_update=True)
+                    job.status, job.owner = "queued", None
+                    db.commit()
+                    logger.info("Job %d %s: requeued at %r", job_id, job.name, job.cursor)
+                    return "queued"
+
+                started = time.perf_counter()
+                try:
+                    self._begin_batch(db)
+                    job = db.get(models.MaintenanceJob, job_id, with_for_update=True, populate_existing=True)
+                    if job.owner != self.owner or job.status != "running":
+                        db.rollback()
+                        logger.warning("Job %d %s: taken over by %s; stopping", job_id, job.name, job.owner)
+                        return job.status
+                    if job.cancel_requested:
+                        return self._finish(db, job, "cancelled")
+                    keys = task.next_keys(db, job.cursor, batch_size, params)
+                    if not keys:
+                        task.complete(db, job.cursor, params)
+                        return self._finish(db, job, "done")
+                    changed = task.process(db, job.cursor, keys, params)
+                    job.cursor = keys[-1]
+                    job.processed += len(keys)
+                    job.changed += changed
+                    job.heartbeat_at = func.now()
+                    db.commit()
+                    lock_retries = 0
+                except OperationalError as exc:
+                    db.rollback()
+                    if not _is_lock_timeout(exc) or lock_retries >= _MAX_LOCK_RETRIES:
+                        raise
+                    lock_retries += 1
+                    backoff = min(30.0, 0.5 * 2 ** lock_retries)
+                    logger.info("Job %d: batch hit lock_timeout; retrying in %.1fs", job_id, backoff)
+                    self._pause(db, job_id, backoff)
+                    continue
+
+                db.refresh(job)
+                if on_progress is not None:
+                    on_progress(job)
+                elapsed = time.perf_counter() - started
+                self._pause(db, job_id, elapsed * (1.0 - duty_cycle) / duty_cycle)
+        except Exception as exc:
+            db.rollback()
+            logger.exception("Job %d failed", job_id)
+            job = db.get(models.MaintenanceJob, job_id)
+            return self._finish(db, job, "failed", f"{type(exc).__name__}: {exc}"[:2000])
+        finally:
+            db.close()
+
+    def _pause(self, db: Session, job_id: int, seconds: float) -> None:
+        """Sleep between batches, renewing the heartbeat so a long duty-cycle sleep is not taken for an orphaned job"""
+        deadline = time.monotonic() + seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.wait(min(remaining, settings.jobs_stale_seconds / 3)):
+                return
+            if deadline - time.monotonic() > 0:
+                db.execute(
+                    text(
+                        "UPDATE maintenance_jobs SET heartbeat_at = now() "
+                        "WHERE id = :id AND owner = :owner AND status = 'running'"
+                    ),
+                    {"id": job_id, "owner": self.owner},
+                )
+                db.commit()
+
+    def _finish(self, db: Session, job: models.MaintenanceJob, status: str, error: Optional[str] = None) -> str:
+        job.status = status
+        job.error = error
+        job.finished_at = func.now()
+        job.heartbeat_at = func.now()
+        db.commit()
+        logger.info("Job %d %s: %s after %d keys, %d rows changed", job.id, job.name, status, job.processed, job.changed)
+        return status
+
+    def run_forever(self) -> None:
+        schedule = valid_schedule(settings.jobs_schedule)
+        while not self._stop.is_set():
+            # Separate from claiming, so a scheduling failure does not stop queued jobs from running
+            if schedule:
+                db = SessionLocal()
+                try:
+                    for job in enqueue_due(db, schedule):
+                        logger.info("Queued scheduled job %d %s", job.id, job.name)
+                except Exception:
+                    logger.exception("Could not queue scheduled jobs")
+                finally:
+                    db.close()
+            try:
+                job_id = self.claim()
+            except Exception:
+                logger.exception("Could not poll maintenance_jobs")
+                job_id = None
+            if job_id is None:
+                self._stop.wait(settings.jobs_poll_seconds)
+            else:
+                self.execute(job_id)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run_forever, name="job-runner", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 0) -> None:
+        """Stop after the current batch; a running job is requeued at its checkpoint"""
+        self._stop.set()
+        if self._thread is not None and timeout:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"owner": self.owner, "running": self._thread is not None and self._thread.is_alive(),
+                "current_job": self.current_job}
+
+
+job_runner = JobRunner()
+
+
+def _print_progress(job: models.MaintenanceJob) -> None:
+    progress = f"{job.progress:.1%}" if job.progress is not None else "?"
+    print(f"job {job.id} {job.name}: {job.processed:,} keys ({progress}), {job.changed:,} changed, at {job.cursor!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command")
+    for command in ("run", "enqueue"):
+        sub = commands.add_parser(command, help=f"{command} a job")
+        sub.add_argument("name", help="job name (see 'list')")
+        sub.add_argument("--batch-size", type=int, help="keys per batch (default: JOBS_BATCH_SIZE)")
+        sub.add_argument("--duty-cycle", type=float, help="max fraction of time spent working (default: JOBS_DUTY_CYCLE)")
+    commands.add_parser("list", help="list available jobs and recent runs")
+    cancel = commands.add_parser("cancel", help="cancel a queued or running job")
+    cancel.add_argument("job_id", type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    def stop_gracefully(signum, frame):
+        logger.info("Stopping after the current batch")
+        job_runner.stop()
+
+    if args.command is None:
+        signal.signal(signal.SIGTERM, stop_gracefully)
+        signal.signal(signal.SIGINT, stop_gracefully)
+        logger.info("Job runner %s polling every %.1fs", job_runner.owner, settings.jobs_poll_seconds)
+        job_runner.run_forever()
+        return
+
+    db = SessionLocal()
+    try:
+        if args.command == "list":
+            for name, task in sorted(available_jobs().items()):
+                print(f"{name:<24} {task.description}")
+            print()
+            for job in db.query(models.MaintenanceJob).order_by(models.MaintenanceJob.id.desc()).limit(20):
+                _print_progress(job)
+                print(f"    status={job.status} created={job.created_at} finished={job.finished_at}")
+            return
+        if args.command == "cancel":
+            job = request_cancel(db, args.job_id)
+            print(f"job {args.job_id}: {job.status if job else 'not found'}")
+            return
+        params = {key: value for key, value in
+                  (("batch_size", args.batch_size), ("duty_cycle", args.duty_cycle)) if value is not None}
+        job = enqueue(db, args.name, params)
+    finally:
+        db.close()
+    print(f"queued job {job.id} ({job.name})")
+    if args.command == "run":
+        if job_runner.claim(job.id) is None:
+            raise SystemExit(f"job {job.id} was claimed by another runner; follow it with 'list'")
+        # Ctrl-C requeues the job at its checkpoint; 'run' it again or let a runner pick it up
+        signal.signal(signal.SIGINT, stop_gracefully)
+        print(f"job {job.id}: {job_runner.execute(job.id, on_progress=_print_progress)}")
+
+
+if __name__ == "__main__":
+    # Job modules register into ``src.jobs.runner``; run that module's CLI rather than this ``__main__`` copy
+    from src.jobs import runner
+    runner.main()
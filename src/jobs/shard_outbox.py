@@ -0,0 +1,39 @@
+"""
+Deliver rows left in ``shard_outbox`` to their shards.
+
+The write API inserts its rows on the shards right after the primary
+transaction commits (see ``src/db/shards.py``). When that step fails, for
+example because a shard is down, the rows stay in the outbox and this job
+inserts them. Entries younger than ``older_than_seconds`` (default 60) are
+left to the request that queued them. Schedule it with
+``JOBS_SCHEDULE='{"shard_outbox": 60}'`` whenever ``DB_SHARD_URLS`` is set.
+
+    python -m src.jobs.runner run shard_outbox
+"""
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..db.shards import deliver_outbox, pending_outbox, shard_router
+from .runner import BatchJob, register
+
+
+@register
+class DeliverShardOutbox(BatchJob):
+    name = "shard_outbox"
+    description = "Insert rows queued in shard_outbox on their shards"
+    table = "shard_outbox"
+    key_column = "id"
+
+    def start(self, db: Session, params: Dict[str, Any]) -> Dict[str, Any]:
+        if not shard_router.enabled:
+            raise ValueError("DB_SHARD_URLS is empty")
+        return params
+
+    def next_keys(self, db: Session, after: Optional[str], limit: int, params: Dict[str, Any]) -> List[str]:
+        ids = pending_outbox(db, float(params.get("older_than_seconds", 60)), int(after) if after else None, limit)
+        return [str(i) for i in ids]
+
+    def process(self, db: Session, after: Optional[str], keys: List[str], params: Dict[str, Any]) -> int:
+        inserted = deliver_outbox(shard_router, db, [int(key) for key in keys], commit=False)
+        return sum(len(rows) for rows in inserted.values())
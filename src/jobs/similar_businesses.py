@@ -0,0 +1,223 @@
+"""
+Item-item business similarity from co-review signals.
+
+Builds the binary user x business matrix from ``reviews`` and stores, for
+every business, the top-K businesses by cosine similarity of their reviewer
+sets in ``business_similarity``. ``/businesses/{id}/similar`` then reads one
+business's neighbours straight off the (business_id, rank) primary key.
+
+Memory: review pairs are streamed in user order, so users never need an id
+map; a user's businesses are kept until the next user starts, and users with
+more than ``--max-user-reviews`` reviews are dropped there, since they add
+little signal and most of the quadratic cost. The binary matrix itself is
+held in full, in CSC and CSR form, at about 16 bytes per remaining review.
+``X^T X`` is never materialized. Similarities are computed one block of
+business columns at a time (``X^T @ X[:, block]``), and each column is cut to
+its top-K before the next block. Blocks are sized from an upper bound of
+their product's entries (the summed reviewer degrees of their columns), so
+that at most ``--max-block-entries`` are held at once. A single column can
+exceed that bound, but only up to one entry per business.
+
+Each block's results replace its businesses' previous neighbours in their own
+transaction. Readers therefore see either the old or the new neighbours of a
+business, and a long run never holds one transaction open. The job reads the
+primary's ``reviews`` table, so it refuses to run with ``DB_SHARD_URLS`` set,
+and a run that finds no reviews leaves the previous results in place.
+
+    python -m src.jobs.similar_businesses --top-k 20 --block-size 2000 --max-block-entries 20000000
+"""
+import argparse
+import logging
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db import models
+from ..db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+_FETCH_SIZE = 100_000
+_INSERT_BATCH = 10_000
+
+
+def load_review_matrix(db: Session, max_user_reviews: int) -> Tuple[sparse.csc_matrix, List[str]]:
+    """Binary user x business matrix (CSC) and the business id of each column"""
+    business_ids: Dict[str, int] = {}
+    rows: List[np.ndarray] = []
+    cols: List[np.ndarray] = []
+    chunk_rows: List[int] = []
+    chunk_cols: List[int] = []
+    n_users = 0
+    current_user, current_columns = None, set()
+
+    def end_user() -> None:
+        nonlocal n_users
+        # Repeat reviews of the same business count once
+        if current_columns and (not max_user_reviews or len(current_columns) <= max_user_reviews):
+            chunk_rows.extend([n_users] * len(current_columns))
+            chunk_cols.extend(current_columns)
+            n_users += 1
+
+    # idx_reviews_user_id streams each user's reviews together
+    pairs = db.query(models.Review.user_id, models.Review.business_id).filter(
+        models.Review.user_id.isnot(None), models.Review.business_id.isnot(None)
+    ).order_by(models.Review.user_id).yield_per(_FETCH_SIZE)
+    for user_id, business_id in pairs:
+        if user_id != current_user:
+            end_user()
+            current_user, current_columns = user_id, set()
+            if len(chunk_rows) >= _FETCH_SIZE:
+                rows.append(np.array(chunk_rows, dtype=np.int32))
+                cols.append(np.array(chunk_cols, dtype=np.int32))
+                chunk_rows, chunk_cols = [], []
+        current_columns.add(business_ids.setdefault(business_id, len(business_ids)))
+    end_user()
+    rows.append(np.array(chunk_rows, dtype=np.int32))
+    cols.append(np.array(chunk_cols, dtype=np.int32))
+    row = np.concatenate(rows)
+    col = np.concatenate(cols)
+    del rows, cols, chunk_rows, chunk_cols
+
+    matrix = sparse.csc_matrix(
+        (np.ones(len(row), dtype=np.float32), (row, col)), shape=(n_users, len(business_ids)),
+    )
+    id_by_column = [None] * len(business_ids)
+    for business_id, column in business_ids.items():
+        id_by_column[column] = business_id
+    return matrix, id_by_column
+
+
+def column_blocks(matrix: sparse.csc_matrix, block_size: int, max_block_entries: int) -> Iterator[Tuple[int, int]]:
+    """(start, stop) column ranges whose ``X^T @ X[:, start:stop]`` has at most ``max_block_entries`` entries.
+
+    Column j of the product has at most one entry per business, and at most the
+    summed business counts of j's reviewers.
+    """
+    n_businesses = matrix.shape[1]
+    user_degree = np.bincount(matrix.indices, minlength=matrix.shape[0])
+    reach = np.concatenate(([0], np.cumsum(user_degree[matrix.indices], dtype=np.int64)))
+    entries = np.minimum(reach[matrix.indptr[1:]] - reach[matrix.indptr[:-1]], n_businesses)
+    start, held = 0, 0
+    for column in range(n_businesses):
+        if column > start and (held + entries[column] > max_block_entries or column - start >= block_size):
+            yield start, column
+            start, held = column, 0
+        held += int(entries[column])
+    if start < n_businesses:
+        yield start, n_businesses
+
+
+def top_k_similar(
+    matrix: sparse.csc_matrix, top_k: int, block_size: int, min_support: int, max_block_entries: int
+) -> Iterator[Tuple[int, int, List[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]]]:
+    """Yield (start, stop, results) per column block; results hold
+    (column, neighbour columns, cosine scores, co-reviewer counts) per business with neighbours
+    """
+    norms = np.sqrt(np.asarray(matrix.sum(axis=0)).ravel())
+    transposed = matrix.T.tocsr()
+    n_businesses = matrix.shape[1]
+    for start, stop in column_blocks(matrix, block_size, max_block_entries):
+        # Co-reviewer counts between every business and this block's businesses
+        co_counts = (transposed @ matrix[:, start:stop]).tocsc()
+        results = []
+        for offset in range(stop - start):
+            column = start + offset
+            lo, hi = co_counts.indptr[offset], co_counts.indptr[offset + 1]
+            neighbours = co_counts.indices[lo:hi]
+            support = co_counts.data[lo:hi]
+            keep = (neighbours != column) & (support >= min_support)
+            neighbours, support = neighbours[keep], support[keep]
+            if not len(neighbours):
+                continue
+            scores = support / (norms[neighbours] * norms[column])
+            if len(scores) > top_k:
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+                neighbours, scores, support = neighbours[best], scores[best], support[best]
+            order = np.lexsort((neighbours, -scores))
+            results.append((column, neighbours[order].copy(), scores[order], support[order]))
+        # Only the top-K of each column outlives the block
+        del co_counts
+        yield start, stop, results
+        logger.info("Similarity: %d/%d businesses", stop, n_businesses)
+
+
+def run(
+    top_k: int = 20, block_size: int = 2000, min_support: int = 2, max_user_reviews: int = 1000,
+    max_block_entries: int = 20_000_000,
+) -> int:
+    """Recompute ``business_similarity``; returns the number of rows written"""
+    if settings.db_shard_urls:
+        raise ValueError("The similarity job reads reviews from the primary and cannot run with DB_SHARD_URLS set")
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        matrix, business_ids = load_review_matrix(db, max_user_reviews)
+        db.commit()
+        if not business_ids:
+            # An empty source would clear every similarity row below; keep the last results instead
+            logger.warning("No reviews to compute similarities from; business_similarity left unchanged")
+            return 0
+        logger.info(
+            "Loaded %d users x %d businesses (%d reviews) in %.1fs",
+            matrix.shape[0], matrix.shape[1], matrix.nnz, time.perf_counter() - started,
+        )
+        table = models.BusinessSimilarity.__table__
+        written = 0
+        blocks = top_k_similar(matrix, top_k, block_size, min_support, max_block_entries)
+        for start, stop, results in blocks:
+            batch = []
+            for column, neighbours, scores, support in results:
+                business_id = business_ids[column]
+                for rank, (neighbour, score, count) in enumerate(zip(neighbours, scores, support), start=1):
+                    batch.append({
+                        "business_id": business_id,
+                        "rank": rank,
+                        "similar_business_id": business_ids[neighbour],
+                        "score": float(score),
+                        "support": int(count),
+                    })
+            # Businesses of the block that lost every neighbour are cleared too
+            db.execute(
+                text("DELETE FROM business_similarity WHERE business_id = ANY(:ids)"),
+                {"ids": business_ids[start:stop]},
+            )
+            for offset in range(0, len(batch), _INSERT_BATCH):
+                db.execute(insert(table), batch[offset:offset + _INSERT_BATCH])
+            db.commit()
+            written += len(batch)
+        # Businesses that no longer have reviews
+        db.execute(text("DELETE FROM business_similarity WHERE NOT (business_id = ANY(:ids))"), {"ids": business_ids})
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    logger.info("Wrote %d similarity rows in %.1fs", written, time.perf_counter() - started)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=20, help="neighbours stored per business")
+    parser.add_argument("--block-size", type=int, default=2000, help="business columns per similarity block")
+    parser.add_argument("--min-support", type=int, default=2, help="minimum shared reviewers")
+    parser.add_argument("--max-user-reviews", type=int, default=1000, help="skip users with more reviews (0 keeps all)")
+    parser.add_argument("--max-block-entries", type=int, default=20_000_000,
+                        help="upper bound of co-reviewer counts held per block (about 8 bytes each)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        run(args.top_k, args.block_size, args.min_support, args.max_user_reviews, args.max_block_entries)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+
+if __name__ == "__main__":
+    main()
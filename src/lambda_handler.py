@@ -1,19 +1,115 @@
 """
 Lambda handler for FastAPI application
+
+Cold starts are kept short by importing only the router that serves the
+request path. Other routers are imported the first time they are hit and
+their Mangum handlers are reused for the lifetime of the container. No DDL
+runs at startup, and the database engine keeps a single pooled connection
+that later invocations reuse (see ``serverless`` in ``src/core/config.py``).
 """
+import os
 import json
+import time
+import importlib
+import logging
+
+_INIT_STARTED = time.perf_counter()
+
+os.environ.setdefault("SERVERLESS", "true")
+
+from fastapi import FastAPI
 from mangum import Mangum
-from src.main import app
 
-# Create the Mangum handler
-handler = Mangum(app, lifespan="off")
+logger = logging.getLogger(__name__)
+
+# Path prefix -> (router module, tag); imported lazily on first request
+_ROUTERS = {
+    "/api/v1/businesses": ("src.api.business_routes", "businesses"),
+    "/api/v1/reviews": ("src.api.review_routes", "reviews"),
+    "/api/v1/users": ("src.api.user_routes", "users"),
+    "/api/v1/tips": ("src.api.tip_routes", "tips"),
+    "/api/v1/checkins": ("src.api.checkin_routes", "checkins"),
+    "/api/v1/analytics": ("src.api.analytics_routes", "analytics"),
+    "/api/v1/admin": ("src.api.admin_routes", "admin"),
+}
+
+# Documentation needs every router, so it is served by the full application
+_FULL_APP_PATHS = ("/docs", "/redoc", "/openapi.json")
+
+_handlers = {}
+_cold_start = True
+
+
+def _build_app(prefix=None):
+    from src.core.config import settings
+    from src.core.errors import install_exception_handlers
+    from src.core.middleware import install_middleware
+    from src.api import health_routes
+
+    app = FastAPI(
+        title=settings.api_title,
+        description=settings.api_description,
+        version=settings.api_version,
+        docs_url=None,
+        redoc_url=None,
+        openapi_url=None,
+    )
+    install_middleware(app)
+    install_exception_handlers(app)
+    if prefix is None:
+        app.include_router(health_routes.router)
+    else:
+        module_name, tag = _ROUTERS[prefix]
+        module = importlib.import_module(module_name)
+        app.include_router(module.router, prefix=prefix, tags=[tag])
+    return app
+
+
+def _route_key(path):
+    for prefix in _ROUTERS:
+        if path == prefix or path.startswith(prefix + "/"):
+            return prefix
+    if path.startswith(_FULL_APP_PATHS):
+        return "full"
+    return "base"
+
+
+def _get_handler(key):
+    handler = _handlers.get(key)
+    if handler is None:
+        if key == "full":
+            from src.main import app
+        else:
+            app = _build_app(None if key == "base" else key)
+        handler = Mangum(app, lifespan="off")
+        _handlers[key] = handler
+    return handler
+
+
+def _event_path(event):
+    # API Gateway v2 uses rawPath; v1 and ALB events use path
+    return event.get("rawPath") or event.get("path") or "/"
+
 
 def lambda_handler(event, context):
     """
     AWS Lambda handler function
     """
+    global _cold_start
     try:
-        return handler(event, context)
+        started = time.perf_counter()
+        key = _route_key(_event_path(event))
+        handler = _get_handler(key)
+        response = handler(event, context)
+        if _cold_start:
+            _cold_start = False
+            logger.info(json.dumps({
+                "cold_start": True,
+                "router": key,
+                "init_ms": round((started - _INIT_STARTED) * 1000, 1),
+                "first_invocation_ms": round((time.perf_counter() - started) * 1000, 1),
+            }))
+        return response
     except Exception as e:
         return {
             'statusCode': 500,
@@ -26,3 +122,7 @@ def lambda_handler(event, context):
                 'Access-Control-Allow-Origin': '*'
             }
         }
+
+
+# Kept for deployments configured with ``src.lambda_handler.handler``
+handler = lambda_handler
@@ -1,9 +1,17 @@
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
 
 from .core.config import settings
-from .db.database import init_db
-from .api import business_routes, review_routes, user_routes, tip_routes, checkin_routes
+from .core.errors import install_exception_handlers
+from .core.invalidation import install_invalidation
+from .core.live import live_hub
+from .core.middleware import install_middleware
+from .core.names import name_dictionaries
+from .core.suggest import suggest_service
+from .core.warmup import warmup
+from .db.changes import change_feed
+from .db.database import engine, slow_query_log
+from .jobs.runner import job_runner
+from .api import business_routes, review_routes, user_routes, tip_routes, checkin_routes, analytics_routes, admin_routes, health_routes, live_routes
 
 # Create FastAPI application
 app = FastAPI(
@@ -12,37 +20,56 @@ app = FastAPI(
     version=settings.api_version,
 )
 
-# Add CORS middleware for development
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000", "https://localhost:3000"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+install_middleware(app)
+install_exception_handlers(app)
 
 # Include routers
+app.include_router(health_routes.router)
 app.include_router(business_routes.router, prefix="/api/v1/businesses", tags=["businesses"])
 app.include_router(review_routes.router, prefix="/api/v1/reviews", tags=["reviews"])
 app.include_router(user_routes.router, prefix="/api/v1/users", tags=["users"])
 app.include_router(tip_routes.router, prefix="/api/v1/tips", tags=["tips"])
 app.include_router(checkin_routes.router, prefix="/api/v1/checkins", tags=["checkins"])
+app.include_router(analytics_routes.router, prefix="/api/v1/analytics", tags=["analytics"])
+app.include_router(live_routes.router, prefix="/api/v1/live", tags=["live"])
+app.include_router(admin_routes.router, prefix="/api/v1/admin", tags=["admin"])
 
 @app.on_event("startup")
 def startup_event():
-    """Initialize database on startup"""
-    init_db()
-
-@app.get("/")
-def read_root():
-    """Root endpoint"""
-    return {
-        "message": "Welcome to Yelp Data API",
-        "version": settings.api_version,
-        "docs": "/docs"
-    }
-
-@app.get("/health")
-def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy"}
\ No newline at end of file
+    """Start background services (no DDL; the schema is owned by migrations)"""
+    if settings.suggest_enabled:
+        suggest_service.start()
+    if settings.name_enrichment_enabled and not settings.serverless:
+        name_dictionaries.start()
+    if settings.change_feed_enabled and not settings.serverless:
+        install_invalidation(change_feed)
+        if settings.live_feed_enabled:
+            change_feed.subscribe(live_hub.on_changes)
+        change_feed.start(engine)
+    if settings.jobs_runner_enabled and not settings.serverless:
+        job_runner.start()
+
+@app.on_event("startup")
+async def start_warmup():
+    """Warm caches and buffers in the background; /health/ready reports 503 until it finishes"""
+    warmup.start(app)
+
+@app.on_event("startup")
+async def start_live_feed():
+    """Bind the live feed hub to this worker's event loop; rows arrive from the change feed thread"""
+    if settings.live_feed_enabled and settings.change_feed_enabled and not settings.serverless:
+        live_hub.start()
+        live_hub.close_on_exit_signal()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Stop background services and close pooled connections so graceful shutdown releases them immediately"""
+    warmup.stop()
+    live_hub.close()
+    suggest_service.stop()
+    name_dictionaries.stop()
+    change_feed.stop()
+    # Let the current batch commit so the running job is requeued at its checkpoint
+    job_runner.stop(timeout=settings.jobs_statement_timeout_ms / 1000)
+    slow_query_log.close()
+    engine.dispose()
@@ -1,8 +1,12 @@
-from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
 
 # Business schemas
+class BusinessHours(BaseModel):
+    open: str  # "HH:MM"; a close at or before open means the business closes after midnight
+    close: str
+
 class BusinessBase(BaseModel):
     business_id: str
     name: Optional[str] = None
@@ -15,14 +19,40 @@ class BusinessBase(BaseModel):
     stars: Optional[float] = None
     review_count: Optional[int] = None
     is_open: Optional[int] = None
-    attributes: Optional[str] = None
+    attributes: Optional[Dict[str, Any]] = None
     categories: Optional[str] = None
-    hours: Optional[str] = None
+    hours: Optional[Dict[str, BusinessHours]] = None
 
 class Business(BusinessBase):
     class Config:
         from_attributes = True
 
+class BusinessSearchResult(BusinessBase):
+    score: float
+    distance_km: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+class BusinessSearchPage(BaseModel):
+    results: List[BusinessSearchResult]
+    next_cursor: Optional[str] = None
+
+class SimilarBusiness(Business):
+    score: float
+    support: int
+
+class BusinessSuggestion(BaseModel):
+    business_id: str
+    name: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    stars: Optional[float] = None
+    review_count: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
 # Review schemas
 class ReviewBase(BaseModel):
     review_id: str
@@ -48,6 +78,46 @@ class ReviewWithNames(ReviewBase):
     class Config:
         from_attributes = True
 
+def _no_nul(value: Optional[str]) -> Optional[str]:
+    """Postgres text cannot hold NUL characters"""
+    if value is not None and "\x00" in value:
+        raise ValueError("must not contain NUL characters")
+    return value
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored without a time zone, in UTC"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class ReviewCreate(BaseModel):
+    review_id: Optional[str] = Field(None, max_length=64, description="Generated when omitted")
+    user_id: str
+    business_id: str
+    stars: float = Field(..., ge=1, le=5)
+    useful: int = Field(0, ge=0)
+    funny: int = Field(0, ge=0)
+    cool: int = Field(0, ge=0)
+    text: Optional[str] = None
+    date: Optional[datetime] = Field(None, description="Defaults to the time of ingestion")
+
+    _check_strings = field_validator("review_id", "user_id", "business_id", "text")(_no_nul)
+    _normalise_date = field_validator("date")(_naive_utc)
+
+class RejectedRow(BaseModel):
+    index: int
+    reason: str
+
+class IngestResult(BaseModel):
+    inserted: int
+    duplicates: int
+    rejected: List[RejectedRow] = []
+    # Committed, but waiting in shard_outbox because a shard was unavailable (included in inserted)
+    queued: int = 0
+
+class ReviewIngestResult(IngestResult):
+    review_ids: List[str] = []
+
 # User schemas
 class UserBase(BaseModel):
     user_id: str
@@ -77,6 +147,14 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class UserSuggestion(BaseModel):
+    user_id: str
+    name: Optional[str] = None
+    review_count: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
 # Tip schemas
 class TipBase(BaseModel):
     user_id: str
@@ -97,6 +175,16 @@ class TipWithNames(TipBase):
     class Config:
         from_attributes = True
 
+class TipCreate(BaseModel):
+    user_id: str
+    business_id: str
+    text: Optional[str] = None
+    date: Optional[datetime] = Field(None, description="Defaults to the time of ingestion")
+    compliment_count: int = Field(0, ge=0)
+
+    _check_strings = field_validator("user_id", "business_id", "text")(_no_nul)
+    _normalise_date = field_validator("date")(_naive_utc)
+
 # Checkin schemas
 class CheckinBase(BaseModel):
     business_id: str
@@ -104,4 +192,53 @@ class CheckinBase(BaseModel):
 
 class Checkin(CheckinBase):
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Composite business page schemas
+class BusinessPage(BaseModel):
+    business: Business
+    reviews: List[ReviewWithNames]
+    tips: List[TipWithNames]
+    checkins: List[Checkin]
+
+# Maintenance job schemas
+class MaintenanceJobCreate(BaseModel):
+    name: str
+    batch_size: Optional[int] = Field(None, ge=1, le=100000, description="Keys per batch (default: JOBS_BATCH_SIZE)")
+    duty_cycle: Optional[float] = Field(None, gt=0, le=1, description="Max fraction of time spent working (default: JOBS_DUTY_CYCLE)")
+
+class MaintenanceJob(BaseModel):
+    id: int
+    name: str
+    params: Dict[str, Any]
+    status: str
+    cursor: Optional[str] = None
+    processed: int
+    changed: int
+    total_estimate: Optional[int] = None
+    progress: Optional[float] = None
+    cancel_requested: bool
+    owner: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# Integrity schemas
+class IntegrityFinding(BaseModel):
+    id: int
+    check_name: str
+    row_key: str
+    scan: str
+    user_id: Optional[str] = None
+    business_id: Optional[str] = None
+    detail: Optional[Dict[str, Any]] = None
+    first_seen_at: datetime
+    last_seen_at: datetime
+
+    class Config:
+        from_attributes = True
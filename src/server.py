@@ -0,0 +1,62 @@
+"""
+Production server entry point: ``python -m src.server``
+
+Runs uvicorn with one worker process per CPU (or ``WORKERS``), the configured
+event loop and HTTP parser, and a database pool per worker sized from
+``DB_CONNECTION_BUDGET``. ``run.py`` remains the single-process development
+server.
+"""
+import importlib.util
+import logging
+import os
+
+import uvicorn
+
+from .core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_IMPLEMENTATIONS = {
+    "loop": {"uvloop": "uvloop", "asyncio": None},
+    "http": {"httptools": "httptools", "h11": "h11"},
+}
+
+
+def _resolve(kind: str, choice: str) -> str:
+    """Validate an explicit loop/http choice; 'auto' lets uvicorn pick the fastest installed one"""
+    if choice == "auto":
+        return choice
+    if choice not in _IMPLEMENTATIONS[kind]:
+        raise SystemExit(f"Unsupported {kind} implementation: {choice!r}")
+    module = _IMPLEMENTATIONS[kind][choice]
+    if module is not None and importlib.util.find_spec(module) is None:
+        raise SystemExit(f"{kind}={choice} requested but the '{module}' package is not installed")
+    return choice
+
+
+def main() -> None:
+    workers = settings.worker_count
+    # Workers re-read settings from the environment; pin the count so each sizes its pool the same way
+    os.environ["WORKERS"] = str(workers)
+    logger.info("Starting %d worker(s) on %s:%s", workers, settings.api_host, settings.api_port)
+    uvicorn.run(
+        "src.main:app",
+        host=settings.api_host,
+        port=settings.api_port,
+        workers=workers,
+        loop=_resolve("loop", settings.loop),
+        http=_resolve("http", settings.http),
+        backlog=settings.backlog,
+        timeout_keep_alive=settings.timeout_keep_alive,
+        timeout_graceful_shutdown=settings.timeout_graceful_shutdown,
+        limit_concurrency=settings.limit_concurrency,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.forwarded_allow_ips,
+        access_log=settings.access_log,
+        log_level="info",
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,354 @@
+"""
+Generate static JSON for the most visited read pages.
+
+Pages are rendered by GETting them through the app in process, so they come
+from the same routes, response models and serializers as live responses.
+The pages are:
+
+- the first review page of the top ``STATIC_PAGES_TOP_BUSINESSES``
+  businesses by review_count
+- the business lists of the top ``STATIC_PAGES_TOP_CITIES`` cities by
+  number of businesses
+- the business lists of every state
+
+Each page is written as ``<path>.json`` plus gzip/brotli/zstd variants (see
+``src/core/static_pages.py`` for the layout). Rendering and compression run in
+a process pool. ``manifest.json`` keeps a hash of every page, so a run only
+rewrites pages whose body changed and removes pages that left the set.
+
+With ``--watch`` the generator then follows the change feed and re-renders
+only pages of changed entities: a review's business, a changed business and
+its city and state, and the businesses a changed user has reviewed.
+Whole-table changes and reconnects (RESYNC) trigger a full run.
+
+The target is a directory or ``s3://bucket/prefix``. The API serves the
+directory itself with ``STATIC_PAGES_ENABLED``, or nginx can serve it with
+``try_files`` (see README).
+
+    python -m src.static.generate                    # full run (cron / systemd timer)
+    python -m src.static.generate --watch            # follow the change feed
+    python -m src.static.generate --target s3://my-bucket/pages --processes 8
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.static_pages import CITY_PAGE, MANIFEST, REVIEWS_PAGE, STATE_PAGE, SUFFIXES, page_name, safe_segment
+
+logger = logging.getLogger(__name__)
+
+# With --watch, how often an idle watcher re-stamps the manifest's generated_at while its change feed
+# is connected (pages are current while the feed is followed; see STATIC_PAGES_MAX_AGE_SECONDS)
+MANIFEST_REFRESH_SECONDS = 60.0
+
+
+class LocalStore:
+    """Page files under a directory, each replaced atomically"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, *name.split("/"))
+
+    def read(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self._path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, name: str, data: bytes, content_encoding: Optional[str] = None) -> None:
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def delete(self, name: str) -> None:
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+
+class S3Store:
+    """Page objects under a bucket prefix, with Content-Type and Content-Encoding set for direct serving"""
+
+    def __init__(self, bucket: str, prefix: str):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.client = boto3.client("s3")
+
+    def read(self, name: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.prefix + name)["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def write(self, name: str, data: bytes, content_encoding: Optional[str] = None) -> None:
+        extra = {"ContentEncoding": content_encoding} if content_encoding else {}
+        self.client.put_object(
+            Bucket=self.bucket, Key=self.prefix + name, Body=data, ContentType="application/json", **extra
+        )
+
+    def delete(self, name: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + name)
+
+
+def open_store(target: str):
+    if target.startswith("s3://"):
+        bucket, _, prefix = target[len("s3://"):].partition("/")
+        return S3Store(bucket, prefix)
+    return LocalStore(target)
+
+
+def delete_page(store, path: str) -> None:
+    for encoding in SUFFIXES:
+        store.delete(page_name(path, encoding))
+    store.delete(page_name(path))
+
+
+def page_set(db: Session) -> List[str]:
+    """Paths of every page to generate, most visited first"""
+    businesses = db.execute(text("""
+        SELECT business_id FROM business WHERE review_count IS NOT NULL
+        ORDER BY review_count DESC LIMIT :n
+    """), {"n": settings.static_pages_top_businesses}).scalars().all()
+    cities = db.execute(text("""
+        SELECT city FROM business WHERE city IS NOT NULL
+        GROUP BY city ORDER BY count(*) DESC LIMIT :n
+    """), {"n": settings.static_pages_top_cities}).scalars().all()
+    states = db.execute(text("SELECT DISTINCT state FROM business WHERE state IS NOT NULL")).scalars().all()
+    pages = [REVIEWS_PAGE.format(b) for b in businesses if safe_segment(b)]
+    pages += [CITY_PAGE.format(c) for c in cities if safe_segment(c)]
+    pages += [STATE_PAGE.format(s) for s in sorted(states) if safe_segment(s)]
+    return pages
+
+
+def affected_pages(db: Session, changes, pages: Set[str]) -> Optional[Set[str]]:
+    """Generated pages showing rows named by ``changes``; None when only a full run will do"""
+    business_ids: Set[str] = set()
+    changed_businesses: Set[str] = set()
+    user_ids: Set[str] = set()
+    for change in changes:
+        if change.op == "RESYNC" or (change.whole_table and change.table in ("business", "reviews", "yelp_users")):
+            return None
+        if change.table == "reviews" and "business_id" in change.keys:
+            business_ids.add(change.keys["business_id"])
+        elif change.table == "business" and "business_id" in change.keys:
+            changed_businesses.add(change.keys["business_id"])
+        elif change.table == "yelp_users" and "user_id" in change.keys:
+            user_ids.add(change.keys["user_id"])
+    if user_ids:
+        from ..db.shards import shard_router
+
+        # Reviews carry the reviewer's name; with DB_SHARD_URLS they are on the shards, not the primary
+        reviewed = text("SELECT DISTINCT business_id FROM reviews WHERE user_id IN :ids").bindparams(
+            bindparam("ids", expanding=True)
+        )
+        if shard_router.enabled:
+            parts = shard_router.fan_out(lambda shard, session: session.execute(reviewed, {"ids": list(user_ids)}).scalars().all())
+            business_ids.update(business_id for part in parts for business_id in part)
+        else:
+            business_ids.update(db.execute(reviewed, {"ids": list(user_ids)}).scalars())
+    paths = {REVIEWS_PAGE.format(b) for b in business_ids | changed_businesses}
+    if changed_businesses:
+        rows = db.execute(
+            text("SELECT city, state FROM business WHERE business_id = ANY(:ids)"), {"ids": list(changed_businesses)}
+        ).all()
+        paths.update(CITY_PAGE.format(city) for city, _ in rows if city)
+        paths.update(STATE_PAGE.format(state) for _, state in rows if state)
+    return paths & pages
+
+
+_worker: Dict[str, object] = {}
+
+
+def _init_worker(target: str) -> None:
+    # Render from the live queries only: no cached, static, rate limited or shed responses
+    settings.response_cache_enabled = False
+    settings.static_pages_enabled = False
+    settings.rate_limit_enabled = False
+    settings.load_shedding_enabled = False
+    from ..core.compression import build_encoders
+    from ..main import app
+
+    _worker["app"] = app
+    _worker["store"] = open_store(target)
+    # Compressed once and served many times, so the slowest levels pay off
+    _worker["encoders"] = build_encoders(settings.compression_encodings, gzip_level=9, brotli_quality=11, zstd_level=19)
+
+
+async def _render_batch(batch: List[Tuple[str, Optional[str]]]) -> List[Tuple[str, Optional[str], int]]:
+    from ..core.warmup import asgi_get
+
+    app, store, encoders = _worker["app"], _worker["store"], _worker["encoders"]
+    results = []
+    for path, previous in batch:
+        status, body = await asgi_get(app, path, "identity")
+        if status == 404:
+            delete_page(store, path)
+            results.append((path, None, status))
+            continue
+        if status != 200:
+            results.append((path, previous, status))
+            continue
+        digest = hashlib.sha256(body).hexdigest()
+        if digest != previous:
+            for encoding, encode in encoders.items():
+                store.write(page_name(path, encoding), encode(body), encoding)
+            # Written last: the server looks for the plain file before any variant
+            store.write(page_name(path), body)
+        results.append((path, digest, status))
+    return results
+
+
+def _render(batch: List[Tuple[str, Optional[str]]]) -> List[Tuple[str, Optional[str], int]]:
+    """Pool task: render ``(path, previous hash)`` pairs, writing pages whose body changed"""
+    return asyncio.run(_render_batch(batch))
+
+
+class Generator:
+    """Renders pages in a process pool and keeps the manifest of what the target holds"""
+
+    def __init__(self, target: str, processes: int, batch_size: int = 20):
+        self.store = open_store(target)
+        self.batch_size = batch_size
+        # spawn, not fork: the parent holds pooled connections and, with --watch, a listener thread
+        self.pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(target,),
+        )
+        manifest = self.store.read(MANIFEST)
+        self.pages: Dict[str, str] = json.loads(manifest)["pages"] if manifest else {}
+        self.manifest_written = 0.0
+
+    def render(self, paths: List[str]) -> Dict[str, int]:
+        started = time.perf_counter()
+        counts = {"pages": len(paths), "written": 0, "removed": 0, "failed": 0}
+        batches = [
+            [(path, self.pages.get(path)) for path in paths[i:i + self.batch_size]]
+            for i in range(0, len(paths), self.batch_size)
+        ]
+        for results in self.pool.map(_render, batches):
+            for path, digest, status in results:
+                if status == 404:
+                    counts["removed"] += self.pages.pop(path, None) is not None
+                elif status != 200:
+                    counts["failed"] += 1
+                elif digest != self.pages.get(path):
+                    self.pages[path] = digest
+                    counts["written"] += 1
+        self._write_manifest()
+        logger.info("Static pages %s in %.1fs", counts, time.perf_counter() - started)
+        return counts
+
+    def full(self) -> Dict[str, int]:
+        """Render the whole page set and remove pages that left it"""
+        from ..db.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            paths = page_set(db)
+        finally:
+            db.close()
+        stale = set(self.pages) - set(paths)
+        for path in stale:
+            delete_page(self.store, path)
+            del self.pages[path]
+        counts = self.render(paths)
+        counts["removed"] += len(stale)
+        return counts
+
+    def watch(self, interval: float) -> None:
+        """Re-render pages of changed entities every ``interval`` seconds; a full run on each (re)connect"""
+        from ..db.changes import ChangeFeed
+        from ..db.database import SessionLocal, engine
+
+        pending: list = []
+        lock = threading.Lock()
+
+        def collect(changes) -> None:
+            with lock:
+                pending.extend(changes)
+
+        feed = ChangeFeed()
+        feed.subscribe(collect)
+        feed.start(engine)
+        try:
+            while True:
+                time.sleep(interval)
+                with lock:
+                    changes = pending[:]
+                    del pending[:]
+                if not changes:
+                    # While the feed is down changes are missed, so the pages are not known to be current
+                    if feed.connected and time.monotonic() - self.manifest_written >= MANIFEST_REFRESH_SECONDS:
+                        self._write_manifest()
+                    continue
+                db = SessionLocal()
+                try:
+                    paths = affected_pages(db, changes, set(self.pages))
+                finally:
+                    db.close()
+                if paths is None:
+                    self.full()
+                elif paths:
+                    self.render(sorted(paths))
+        finally:
+            feed.stop()
+
+    def _write_manifest(self) -> None:
+        manifest = {"generated_at": datetime.now(timezone.utc).isoformat(), "pages": self.pages}
+        self.store.write(MANIFEST, json.dumps(manifest).encode("utf-8"))
+        self.manifest_written = time.monotonic()
+
+    def close(self) -> None:
+        self.pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default=settings.static_pages_dir,
+                        help="directory or s3://bucket/prefix (default: STATIC_PAGES_DIR)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="renderer processes")
+    parser.add_argument("--watch", action="store_true", help="follow the change feed after the first full run")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between incremental runs with --watch")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    # Exit through the finally below so the pool's processes are shut down with us
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    generator = Generator(args.target, args.processes)
+    try:
+        if args.watch:
+            # The feed's RESYNC on connect starts with a full run
+            generator.watch(args.interval)
+        else:
+            generator.full()
+    finally:
+        generator.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Parsing of the Yelp hours and attributes text by migration 0008"""
+import importlib
+
+business_jsonb = importlib.import_module("src.db.migrations.versions.0008_business_jsonb")
+parse_attributes, parse_hours = business_jsonb.parse_attributes, business_jsonb.parse_hours
+
+
+def test_hours_are_zero_padded_per_day():
+    raw = "{'Monday': '7:0-17:30', 'Tuesday': '10:5-2:0', \"Sunday\": '0:0-0:0'}"
+    assert parse_hours(raw) == {
+        "Monday": {"open": "07:00", "close": "17:30"},
+        # Closing after midnight is kept as the wall-clock time; business_hours_spans adds the day
+        "Tuesday": {"open": "10:05", "close": "02:00"},
+        # Yelp's "open all day"
+        "Sunday": {"open": "00:00", "close": "00:00"},
+    }
+
+
+def test_hours_accept_json_and_spaces_around_the_dash():
+    assert parse_hours('{"Friday": " 9:00 - 21:00 "}') == {"Friday": {"open": "09:00", "close": "21:00"}}
+
+
+def test_24_00_means_midnight():
+    assert parse_hours("{'Saturday': '18:0-24:0'}") == {"Saturday": {"open": "18:00", "close": "00:00"}}
+
+
+def test_unreadable_days_and_spans_are_dropped():
+    raw = (
+        "{'Monday': '25:0-26:0', 'Tuesday': '9:60-17:0', 'Wednesday': 'closed', 'Thursday': None, "
+        "'Funday': '9:0-17:0', 'Friday': '9:0-17:0'}"
+    )
+    assert parse_hours(raw) == {"Friday": {"open": "09:00", "close": "17:00"}}
+
+
+def test_missing_or_malformed_hours_are_null():
+    assert parse_hours(None) is None
+    assert parse_hours("   ") is None
+    assert parse_hours("None") is None
+    assert parse_hours("['Monday']") is None
+    assert parse_hours("{'Monday': ") is None
+    assert parse_hours("{}") == {}
+
+
+def test_attribute_literals_become_json_values():
+    raw = (
+        "{'WiFi': \"u'free'\", 'RestaurantsPriceRange2': '2', 'BikeParking': 'False', 'Smoking': 'None', "
+        "'BusinessParking': \"{'garage': False, 'street': True}\", 'Ambience': '[1, 2]'}"
+    )
+    assert parse_attributes(raw) == {
+        "WiFi": "free",
+        "RestaurantsPriceRange2": 2,
+        "BikeParking": False,
+        "Smoking": None,
+        "BusinessParking": {"garage": False, "street": True},
+        # Only scalars and dicts are unwrapped
+        "Ambience": "[1, 2]",
+    }
+    assert parse_attributes(None) is None
+    assert parse_attributes("not a dict") is None
@@ -0,0 +1,48 @@
+"""Accept-Encoding negotiation of src/core/compression.py"""
+import pytest
+
+from src.core.compression import negotiate_encoding
+
+AVAILABLE = ["br", "zstd", "gzip"]
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("GZip, deflate", "gzip"),
+    # Equal weights go to the server's preference order
+    ("gzip, br", "br"),
+    ("*", "br"),
+    # Higher q wins regardless of order, with or without spaces around ';'
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("br ; q=0.2, zstd ; q=0.9, gzip", "gzip"),
+    ("gzip;q=1.0, zstd;q=1", "zstd"),
+    # q=0 (or an unreadable q) means "not acceptable", even when * would allow it
+    ("br;q=0, *", "zstd"),
+    ("br;q=0, zstd;q=0, gzip;q=0", None),
+    ("br;q=abc, gzip;q=0.1", "gzip"),
+    ("*;q=0", None),
+    # Unlisted codings are not acceptable without *
+    ("deflate", None),
+])
+def test_negotiate_encoding_weighs_q_values(header, expected):
+    assert negotiate_encoding(header, AVAILABLE) == expected
+
+
+def test_refusing_identity_still_picks_a_listed_coding():
+    assert negotiate_encoding("identity;q=0, gzip", AVAILABLE) == "gzip"
+    assert negotiate_encoding("identity;q=0, *", AVAILABLE) == "br"
+    assert negotiate_encoding("identity;q=0, br;q=0.3, gzip;q=0.6", AVAILABLE) == "gzip"
+
+
+def test_identity_is_never_negotiated():
+    # identity is not an encoder; refusing it with nothing else acceptable leaves the response uncompressed
+    assert negotiate_encoding("identity;q=0", AVAILABLE) is None
+    assert negotiate_encoding("identity", AVAILABLE) is None
+    assert negotiate_encoding("gzip", []) is None
+
+
+def test_only_available_encodings_are_chosen():
+    assert negotiate_encoding("br, zstd", ["gzip"]) is None
+    assert negotiate_encoding("br;q=0.9, gzip;q=0.1", ["gzip"]) == "gzip"
@@ -0,0 +1,111 @@
+"""Incremental integrity scans driven by the 0012 changed-key triggers (needs PostgreSQL)
+
+Set TEST_DATABASE_URL to an empty, disposable database; the tests create and
+drop their own tables there.
+"""
+import importlib
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from src.db import models
+from src.jobs.integrity import BusinessReviewCounts, ReviewReferences, TipReferences
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+integrity_marks = importlib.import_module("src.db.migrations.versions.0012_integrity_marks")
+
+
+@pytest.fixture
+def db():
+    engine = create_engine(TEST_DATABASE_URL)
+    models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        integrity_marks.install(lambda sql: connection.execute(text(sql)))
+    session = Session(engine)
+    session.execute(text(
+        "INSERT INTO business (business_id, name, review_count) "
+        "SELECT 'b' || i, 'business ' || i, 2 FROM generate_series(0, 9) AS i"
+    ))
+    session.execute(text("INSERT INTO yelp_users (user_id, name, review_count) VALUES ('u0', 'user', 20)"))
+    session.execute(text(
+        "INSERT INTO reviews (review_id, user_id, business_id, stars) "
+        "SELECT 'r' || lpad(i::text, 2, '0'), 'u0', 'b' || (i % 10), 4 FROM generate_series(0, 19) AS i"
+    ))
+    session.execute(text(
+        "INSERT INTO tips (user_id, business_id, text) SELECT 'u0', 'b' || i, 'tip' FROM generate_series(0, 9) AS i"
+    ))
+    session.commit()
+    yield session
+    session.close()
+    models.Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def _run(db: Session, scan, full: bool = False) -> dict:
+    """Run ``scan`` to completion the way JobRunner does, a few keys per batch"""
+    params = scan.start(db, {"full": True} if full else {})
+    db.commit()
+    after, batches = None, 0
+    while True:
+        keys = scan.next_keys(db, after, 3, params)
+        if not keys:
+            scan.complete(db, after, params)
+            db.commit()
+            return {**params, "batches": batches}
+        scan.process(db, after, keys, params)
+        db.commit()
+        after, batches = keys[-1], batches + 1
+
+
+def _findings(db: Session, check_name: str) -> set:
+    return {row_key for (row_key,) in db.query(models.IntegrityFinding.row_key).filter(
+        models.IntegrityFinding.check_name == check_name
+    )}
+
+
+def test_incremental_scan_finds_reviews_orphaned_by_a_business_delete(db):
+    assert _run(db, ReviewReferences())["mode"] == "full"
+    assert not _findings(db, "review_orphan_business")
+    assert not db.query(models.IntegrityMark).filter(models.IntegrityMark.scan == "reviews").count()
+
+    db.execute(text("DELETE FROM business WHERE business_id = 'b3'"))
+    db.commit()
+
+    run = _run(db, ReviewReferences())
+    assert run["mode"] == "incremental"
+    # Only the chunks holding b3's reviews (r03, r13) are re-checked
+    assert run["batches"] == 1
+    assert _findings(db, "review_orphan_business") == {"r03", "r13"}
+    assert not db.query(models.IntegrityMark).filter(models.IntegrityMark.scan == "reviews").count()
+
+    db.execute(text("INSERT INTO business (business_id, name, review_count) VALUES ('b3', 'business 3', 2)"))
+    db.commit()
+    _run(db, ReviewReferences())
+    assert not _findings(db, "review_orphan_business")
+
+
+def test_incremental_scans_cover_tips_and_counts(db):
+    _run(db, TipReferences())
+    _run(db, BusinessReviewCounts())
+
+    db.execute(text("DELETE FROM business WHERE business_id = 'b7'"))
+    db.execute(text("DELETE FROM reviews WHERE review_id = 'r05'"))
+    db.commit()
+
+    _run(db, TipReferences())
+    _run(db, BusinessReviewCounts())
+    assert _findings(db, "tip_orphan_business") == {"u0/b7"}
+    assert _findings(db, "business_review_count") == {"b5"}
+
+
+def test_unchanged_tables_are_not_rechecked(db):
+    _run(db, ReviewReferences())
+    run = _run(db, ReviewReferences())
+    assert run["mode"] == "incremental"
+    assert run["batches"] == 0
@@ -0,0 +1,161 @@
+"""In-memory token buckets of src/core/rate_limit.py and the AIMD limiter of src/core/load_shedding.py"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.core import rate_limit
+from src.core.load_shedding import AdaptiveConcurrencyLimiter
+from src.core.rate_limit import InMemoryTokenBucketStore
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=clock, time=clock))
+    return clock
+
+
+def _acquire(store, key="ip:1", rate=2.0, burst=3, cost=1.0):
+    return asyncio.run(store.acquire(key, rate, burst, cost))
+
+
+def test_bucket_allows_a_burst_then_rejects_with_retry_after(clock):
+    store = InMemoryTokenBucketStore()
+    assert [_acquire(store)[0] for _ in range(3)] == [True, True, True]
+    allowed, remaining, retry_after = _acquire(store)
+    assert not allowed
+    assert remaining == 0
+    # One token at 2 tokens/second
+    assert retry_after == pytest.approx(0.5)
+
+
+def test_bucket_refills_at_rate_up_to_burst(clock):
+    store = InMemoryTokenBucketStore()
+    for _ in range(3):
+        _acquire(store)
+    clock.now += 0.75
+    allowed, remaining, _ = _acquire(store)
+    assert allowed and remaining == pytest.approx(0.5)
+    assert not _acquire(store)[0]
+
+    clock.now += 3600
+    allowed, remaining, _ = _acquire(store)
+    assert allowed and remaining == pytest.approx(2.0)
+
+
+def test_bucket_charges_cost_and_rejections_do_not_spend(clock):
+    store = InMemoryTokenBucketStore()
+    assert _acquire(store, cost=2.5)[0]
+    allowed, remaining, retry_after = _acquire(store, cost=1.0)
+    assert not allowed
+    assert remaining == pytest.approx(0.5)
+    assert retry_after == pytest.approx(0.25)
+    clock.now += 0.25
+    assert _acquire(store, cost=1.0)[0]
+
+
+def test_buckets_are_per_key_and_idle_ones_are_evicted(clock):
+    store = InMemoryTokenBucketStore(max_clients=2)
+    for _ in range(3):
+        _acquire(store, key="a")
+        _acquire(store, key="b")
+    assert not _acquire(store, key="a")[0]
+    # "a" was used last, so "c" evicts "b", which comes back with a full bucket
+    _acquire(store, key="c")
+    assert set(store._buckets) == {"a", "c"}
+    allowed, remaining, _ = _acquire(store, key="b")
+    assert allowed and remaining == 2
+
+
+def _limiter(**kwargs):
+    options = {"initial_limit": 4, "min_limit": 2, "max_limit": 6, "target_latency_ms": 100.0, "backoff": 0.5}
+    return AdaptiveConcurrencyLimiter(**{**options, **kwargs})
+
+
+def test_limiter_grows_by_one_per_window_of_fast_requests():
+    limiter = _limiter()
+
+    async def scenario():
+        for expected in (5, 6, 6):
+            for _ in range(int(limiter.limit)):
+                assert await limiter.acquire(0)
+                await limiter.release(10.0)
+            assert limiter.limit == expected
+
+    asyncio.run(scenario())
+
+
+def test_limiter_backs_off_on_slow_or_failed_requests_down_to_the_minimum():
+    limiter = _limiter()
+
+    async def scenario():
+        await limiter.acquire(0)
+        await limiter.acquire(0)
+        await limiter.release(500.0)
+        assert limiter.limit == 2
+        await limiter.release(10.0, failed=True)
+        assert limiter.limit == 2
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_slow_request_resets_the_growth_window():
+    limiter = _limiter()
+
+    async def scenario():
+        for latency in (10.0, 10.0, 10.0, 500.0):
+            await limiter.acquire(0)
+            await limiter.release(latency)
+        assert limiter.limit == 2
+        for _ in range(2):
+            await limiter.acquire(0)
+            await limiter.release(10.0)
+        assert limiter.limit == 3
+
+    asyncio.run(scenario())
+
+
+def test_limiter_queues_up_to_the_limit_then_sheds():
+    limiter = _limiter(initial_limit=2)
+
+    async def scenario():
+        assert await limiter.acquire(0)
+        assert await limiter.acquire(0)
+        waiters = [asyncio.create_task(limiter.acquire(5)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert limiter.waiting == 2
+        # The queue is as deep as the limit, so the next request is shed without waiting
+        assert not await limiter.acquire(5)
+
+        await limiter.release(10.0)
+        done, pending = await asyncio.wait(waiters, timeout=1, return_when=asyncio.FIRST_COMPLETED)
+        assert [task.result() for task in done] == [True]
+        assert limiter.in_flight == 2
+        await limiter.release(10.0)
+        assert await pending.pop()
+        assert limiter.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_waiting_past_the_timeout_sheds():
+    limiter = _limiter(initial_limit=2)
+
+    async def scenario():
+        await limiter.acquire(0)
+        await limiter.acquire(0)
+        assert not await limiter.acquire(0.01)
+        assert limiter.waiting == 0
+        assert limiter.in_flight == 2
+
+    asyncio.run(scenario())
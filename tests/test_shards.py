@@ -0,0 +1,256 @@
+"""Routing, rebalancing and merged reads of src/db/shards.py against SQLite shard files"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from src.core.errors import PageTooDeep
+from src.crud import crud
+from src.db import models
+from src.db.shards import SHARDED_TABLES, ShardRouter, check, init_shards, rebalance, shard_of
+
+BUSINESSES = [f"b{i:03d}" for i in range(60)]
+USERS = [f"u{i}" for i in range(8)]
+
+
+def _reviews():
+    start = datetime(2020, 1, 1)
+    rows = []
+    for i in range(400):
+        # Repeated and missing dates exercise the tie-breaks of the merge keys
+        date = None if i % 37 == 0 else start + timedelta(days=i % 90)
+        rows.append({
+            "review_id": f"r{i * 7919 % 1000:04d}", "user_id": USERS[i % len(USERS)],
+            "business_id": BUSINESSES[i % len(BUSINESSES)], "stars": float(i % 5 + 1),
+            "useful": 0, "funny": 0, "cool": 0, "text": f"review {i}", "date": date,
+            "year": date.year if date else None, "month": date.month if date else None,
+        })
+    return rows
+
+
+def _tips():
+    start = datetime(2021, 6, 1)
+    return [
+        {"user_id": user, "business_id": business, "text": f"tip {u}/{b}", "compliment_count": 0,
+         "date": None if (u + b) % 23 == 0 else start + timedelta(hours=(u * 7 + b) % 50), "year": 2021}
+        for u, user in enumerate(USERS) for b, business in enumerate(BUSINESSES) if (u + b) % 3 == 0
+    ]
+
+
+def _router(tmp_path, shards: int) -> ShardRouter:
+    return ShardRouter([f"sqlite:///{tmp_path}/shard{i}.db" for i in range(shards)], fanout_threads=4)
+
+
+def _close(router: ShardRouter) -> None:
+    for engine in router.engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def reviews():
+    return _reviews()
+
+
+@pytest.fixture
+def tips():
+    return _tips()
+
+
+@pytest.fixture
+def reference(tmp_path, reviews, tips):
+    """One database holding every row: the unsharded lists the merged ones must equal"""
+    engine = create_engine(f"sqlite:///{tmp_path}/single.db")
+    models.Base.metadata.create_all(engine, tables=[models.Review.__table__, models.Tip.__table__])
+    with Session(engine) as session:
+        session.execute(models.Review.__table__.insert(), reviews)
+        session.execute(models.Tip.__table__.insert(), tips)
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture
+def sharded(tmp_path, reviews, tips):
+    """Three shards, filled through a two-shard layout and rebalanced"""
+    before = _router(tmp_path, 2)
+    init_shards(before)
+    before.insert("reviews", reviews, returning=("review_id",))
+    before.insert("tips", tips, returning=("user_id",))
+    _close(before)
+    router = _router(tmp_path, 3)
+    init_shards(router)
+    rebalance(router, from_primary=False, delete=True, batch_size=7)
+    yield router
+    _close(router)
+
+
+def _counts(router: ShardRouter) -> dict:
+    return {table: sum(result[table] for result in check(router)) for table in SHARDED_TABLES}
+
+
+def test_shard_of_is_stable():
+    # Pinned: a different hash would send existing rows to the wrong shard
+    assert [shard_of(f"b{i:03d}", 4) for i in range(8)] == [1, 0, 3, 2, 1, 0, 0, 2]
+    assert all(0 <= shard_of(f"business-{i}", 7) < 7 for i in range(1000))
+    assert shard_of("business-1", 1) == 0
+
+
+@pytest.mark.parametrize("shards", [2, 3, 4])
+def test_adding_a_shard_moves_about_one_nth_all_to_the_new_shard(shards):
+    ids = [f"business-{i}" for i in range(20000)]
+    moved = [business for business in ids if shard_of(business, shards) != shard_of(business, shards + 1)]
+    assert all(shard_of(business, shards + 1) == shards for business in moved)
+    assert abs(len(moved) / len(ids) - 1 / (shards + 1)) < 0.02
+
+
+def test_insert_routes_rows_to_their_home_shard(tmp_path, reviews):
+    router = _router(tmp_path, 3)
+    init_shards(router)
+    inserted = router.insert("reviews", reviews, returning=("review_id",))
+    assert len(inserted) == len(reviews)
+    # Conflicts are skipped, so a repeated insert adds nothing
+    assert router.insert("reviews", reviews[:10], returning=("review_id",)) == []
+    results = check(router)
+    assert sum(result["reviews"] for result in results) == len(reviews)
+    assert not any(result["reviews_misplaced"] for result in results)
+    _close(router)
+
+
+def test_rebalance_and_check(tmp_path, reviews, tips):
+    before = _router(tmp_path, 2)
+    init_shards(before)
+    before.insert("reviews", reviews, returning=("review_id",))
+    before.insert("tips", tips, returning=("user_id",))
+    _close(before)
+
+    router = _router(tmp_path, 3)
+    init_shards(router)
+    misplaced = check(router)
+    assert sum(result["reviews_misplaced"] for result in misplaced) > 0
+    assert misplaced[2]["reviews"] == misplaced[2]["tips"] == 0
+
+    copied = rebalance(router, from_primary=False, delete=False, batch_size=7)
+    assert sum(copied.values()) > 0
+    # Copies are still on their old shard until --delete
+    assert _counts(router)["reviews"] > len(reviews)
+
+    rebalance(router, from_primary=False, delete=True, batch_size=7)
+    results = check(router)
+    assert not any(result[f"{table}_misplaced"] for result in results for table in SHARDED_TABLES)
+    assert _counts(router) == {"reviews": len(reviews), "tips": len(tips)}
+    # Nothing left to move
+    assert sum(rebalance(router, from_primary=False, delete=True, batch_size=7).values()) == 0
+    _close(router)
+
+
+def test_reads_skip_copies_not_yet_deleted(tmp_path, reviews):
+    before = _router(tmp_path, 2)
+    init_shards(before)
+    before.insert("reviews", reviews, returning=("review_id",))
+    _close(before)
+
+    router = _router(tmp_path, 3)
+    init_shards(router)
+    rebalance(router, from_primary=False, delete=False, batch_size=50)
+    parts = router.read_all(crud._SHARD_REVIEWS, limit=len(reviews) * 2)
+    ids = [row.review_id for part in parts for row in part]
+    assert sorted(ids) == sorted(row["review_id"] for row in reviews)
+    _close(router)
+
+
+@pytest.fixture
+def merged(monkeypatch, sharded):
+    monkeypatch.setattr(crud, "shard_router", sharded)
+    # Names come from the primary; only the rows and their order are under test here
+    monkeypatch.setattr(crud, "_attach_names", lambda db, rows: rows)
+    return sharded
+
+
+PAGES = [(0, 10), (0, 50), (5, 20), (37, 50), (390, 20), (500, 10)]
+
+
+@pytest.mark.parametrize("skip,limit", PAGES)
+def test_global_lists_match_a_single_database(merged, reference, skip, limit):
+    expected = reference.execute(
+        crud._reviews_select(False).order_by(models.Review.review_id).offset(skip).limit(limit)
+    ).all()
+    assert crud.get_reviews_with_names(None, skip=skip, limit=limit) == expected
+
+    expected = reference.execute(
+        crud._tips_select(False).order_by(*crud._NEWEST_TIPS).offset(skip).limit(limit)
+    ).all()
+    assert crud.get_tips_with_names(None, skip=skip, limit=limit) == expected
+
+
+@pytest.mark.parametrize("skip,limit", PAGES)
+@pytest.mark.parametrize("user_id", USERS[:3])
+def test_per_user_lists_match_a_single_database(merged, reference, user_id, skip, limit):
+    expected = reference.execute(
+        crud._reviews_select(False).where(models.Review.user_id == user_id)
+        .order_by(*crud._NEWEST_REVIEWS).offset(skip).limit(limit)
+    ).all()
+    assert crud.get_reviews_by_user_with_names(None, user_id=user_id, skip=skip, limit=limit) == expected
+
+    expected = reference.execute(
+        crud._tips_select(False).where(models.Tip.user_id == user_id)
+        .order_by(*crud._NEWEST_TIPS).offset(skip).limit(limit)
+    ).all()
+    assert crud.get_tips_by_user_with_names(None, user_id=user_id, skip=skip, limit=limit) == expected
+
+
+def test_per_business_lists_read_one_shard(merged, reference):
+    for business_id in BUSINESSES[:5]:
+        expected = reference.execute(
+            select(models.Review.review_id).where(models.Review.business_id == business_id).order_by(models.Review.review_id)
+        ).scalars().all()
+        rows = crud.get_reviews_by_business_with_names(None, business_id=business_id, limit=100)
+        assert sorted(row.review_id for row in rows) == expected
+
+
+def test_merged_lists_cap_skip(merged, monkeypatch):
+    monkeypatch.setattr(crud.settings, "db_shard_max_skip", 100)
+    assert len(crud.get_reviews_with_names(None, skip=100, limit=10)) == 10
+    with pytest.raises(PageTooDeep):
+        crud.get_reviews_with_names(None, skip=101, limit=10)
+
+
+def test_inline_delivery_to_a_failing_shard_leaves_rows_queued(monkeypatch, tmp_path, reviews, caplog):
+    # One shard file lives in a directory that does not exist, so connecting to it fails
+    router = ShardRouter([f"sqlite:///{tmp_path}/shard0.db", f"sqlite:///{tmp_path}/missing/shard1.db"], fanout_threads=2)
+    models.Base.metadata.create_all(router.engines[0], tables=[models.Review.__table__, models.Tip.__table__])
+    primary = create_engine(f"sqlite:///{tmp_path}/primary.db")
+    with primary.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE shard_outbox (id INTEGER PRIMARY KEY, table_name TEXT NOT NULL, row TEXT NOT NULL, "
+            "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        )
+        for review in reviews[:20]:
+            row = {**review, "date": review["date"].isoformat() if review["date"] else None}
+            connection.execute(models.ShardOutbox.__table__.insert(), {"table_name": "reviews", "row": row})
+    with Session(primary) as db:
+        ids = db.execute(select(models.ShardOutbox.id)).scalars().all()
+        monkeypatch.setattr(crud, "shard_router", router)
+        assert crud._deliver_now(db, ids) is None
+        assert "the shard_outbox job will retry them" in caplog.text
+        assert "unable to open database file" in caplog.text
+        # The entries are still queued and the session is usable
+        assert db.execute(select(models.ShardOutbox.id)).scalars().all() == ids
+    primary.dispose()
+    _close(router)
+
+
+def test_review_diagnostics_count_reviews_on_every_shard(merged, reference, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/primary.db")
+    models.Base.metadata.create_all(engine, tables=[
+        models.User.__table__, models.IntegrityFinding.__table__, models.IntegrityChunk.__table__,
+    ])
+    with Session(engine) as db:
+        diagnostics = crud.get_user_review_diagnostics(db, user_id=USERS[0])
+    engine.dispose()
+    expected = reference.execute(
+        select(func.count()).select_from(models.Review).where(models.Review.user_id == USERS[0])
+    ).scalar()
+    assert expected > 0
+    assert diagnostics["total_reviews_in_db"] == diagnostics["reviews_passing_join"] == expected
+    assert diagnostics["reviews_with_business_id"] == expected
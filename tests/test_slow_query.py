@@ -0,0 +1,89 @@
+"""Fingerprints and EXPLAIN capture of src/db/slow_query.py, against a recording stand-in for the engine"""
+from sqlalchemy import bindparam, select
+from sqlalchemy.dialects import postgresql
+
+from src.db import models, statements
+from src.db.slow_query import SlowQueryLog, fingerprint, normalize_statement
+
+PLAN = [{"Plan": {"Node Type": "Index Scan"}}]
+
+
+class _Result:
+    def scalar(self):
+        return PLAN
+
+
+class _Connection:
+    dialect = postgresql.psycopg2.dialect()
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.connection = engine.dbapi_connection
+
+    def exec_driver_sql(self, sql, parameters=None):
+        self.engine.executed.append((sql, parameters))
+        return _Result()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _PooledConnection:
+    def __init__(self):
+        self.info = {}
+
+
+class _Engine:
+    """One pooled connection that records what is sent to it"""
+
+    def __init__(self):
+        self.dbapi_connection = _PooledConnection()
+        self.executed = []
+
+    def connect(self):
+        return _Connection(self)
+
+
+def test_normalize_statement_replaces_literals_and_parameters():
+    normalized = normalize_statement("SELECT *  FROM reviews WHERE user_id = %(user_id)s AND stars IN (1, 2, 3) AND text = 'a''b'")
+    assert normalized == "SELECT * FROM reviews WHERE user_id = ? AND stars IN (?...) AND text = ?"
+    assert fingerprint(normalized) == fingerprint(normalize_statement(normalized))
+
+
+def test_slow_prepared_read_gets_a_plan(monkeypatch):
+    statement = statements.PreparedStatement(
+        "test_reviews_by_user",
+        select(models.Review.review_id).where(models.Review.user_id == bindparam("user_id")).limit(bindparam("limit")),
+    )
+    monkeypatch.setitem(statements.STATEMENTS, statement.name, statement)
+    engine = _Engine()
+    statement._compile(engine.connect())
+    assert statement.execute_sql == "EXECUTE test_reviews_by_user (%(user_id)s, %(limit)s)"
+
+    log = SlowQueryLog(threshold_ms=0, max_entries=10, explain_sample_rate=1.0)
+    for _ in range(2):
+        log.record(statement.execute_sql, {"user_id": "u1", "limit": 10}, 50.0, engine=engine)
+    log.close()
+
+    [entry] = log.snapshot()
+    # Fingerprinted by the registered SQL, not the statement name
+    assert entry["statement"] == normalize_statement(statement.sql)
+    assert entry["statement"].startswith("SELECT reviews.review_id FROM reviews")
+    assert entry["count"] == 2
+    assert entry["plan"] == PLAN
+    assert engine.executed == [
+        (statement.prepare_sql, None),
+        ("EXPLAIN (ANALYZE off, FORMAT JSON) " + statement.execute_sql, {"user_id": "u1", "limit": 10}),
+    ]
+
+
+def test_unregistered_execute_is_not_explained():
+    engine = _Engine()
+    log = SlowQueryLog(threshold_ms=0, max_entries=10, explain_sample_rate=1.0)
+    log.record("EXECUTE someone_elses_statement (%(id)s)", {"id": 1}, 50.0, engine=engine)
+    log.close()
+    assert log.snapshot()[0]["plan"] is None
+    assert engine.executed == []
@@ -0,0 +1,71 @@
+"""Prefix matching and ranking of src/core/suggest.py's PrefixIndex"""
+from src.core.suggest import SHORT_PREFIX_LEN, PrefixIndex, normalize_name
+
+BUSINESSES = [
+    ("Joe's Pizza", 120, 4.0),
+    ("Pizza Pizza", 300, 2.5),
+    ("Pizzeria Uno", 80, 3.5),
+    ("Papa Johns Pizza Co", 50, 4.5),
+    ("The Pita Pit", 200, 3.0),
+    ("", 999, 5.0),
+    ("  Blue   Bottle  COFFEE ", 40, None),
+]
+
+
+def _index(top_k: int = 10) -> PrefixIndex:
+    return PrefixIndex(
+        (({"name": name}, name, {"review_count": count, "stars": stars}) for name, count, stars in BUSINESSES),
+        rankings=("review_count", "stars"),
+        top_k=top_k,
+    )
+
+
+def _names(results):
+    return [result["name"] for result in results]
+
+
+def test_normalize_name_folds_case_and_whitespace():
+    assert normalize_name("  Blue   Bottle  COFFEE ") == "blue bottle coffee"
+    assert normalize_name("Straße") == "strasse"
+
+
+def test_unnamed_records_are_skipped():
+    index = _index()
+    assert len(index) == len(BUSINESSES) - 1
+    assert index.suggest("", 10) == []
+    assert index.suggest("   ", 10) == []
+
+
+def test_prefix_matches_the_start_of_any_word():
+    index = _index()
+    assert _names(index.suggest("pizza", 10)) == ["Pizza Pizza", "Joe's Pizza", "Papa Johns Pizza Co"]
+    assert _names(index.suggest("pizz", 10)) == ["Pizza Pizza", "Joe's Pizza", "Pizzeria Uno", "Papa Johns Pizza Co"]
+    assert index.suggest("izza", 10) == []
+    assert _names(index.suggest("BOTTLE cof", 10)) == ["  Blue   Bottle  COFFEE "]
+    assert _names(index.suggest("johns pizza", 10)) == ["Papa Johns Pizza Co"]
+
+
+def test_results_follow_the_requested_ranking():
+    index = _index()
+    assert _names(index.suggest("pi", 3)) == ["Pizza Pizza", "The Pita Pit", "Joe's Pizza"]
+    assert _names(index.suggest("pi", 3, ranking="stars")) == ["Papa Johns Pizza Co", "Joe's Pizza", "Pizzeria Uno"]
+    # A missing score ranks as 0
+    assert _names(index.suggest("b", 10, ranking="stars")) == ["  Blue   Bottle  COFFEE "]
+
+
+def test_a_record_matching_on_several_words_is_returned_once():
+    index = _index()
+    assert _names(index.suggest("pizza", 1)) == ["Pizza Pizza"]
+    assert _names(index.suggest("pit", 10)) == ["The Pita Pit"]
+    assert _names(index.suggest("p", 5)) == [
+        "Pizza Pizza", "The Pita Pit", "Joe's Pizza", "Pizzeria Uno", "Papa Johns Pizza Co"
+    ]
+
+
+def test_short_and_long_prefix_paths_agree():
+    # Short prefixes come from the precomputed top-k lists unless the page is larger than top_k
+    short, scanned = _index(top_k=10), _index(top_k=1)
+    for prefix in ("p", "pi", "piz", "the", "j", "x"):
+        assert len(prefix) <= SHORT_PREFIX_LEN
+        for ranking in ("review_count", "stars"):
+            assert short.suggest(prefix, 4, ranking) == scanned.suggest(prefix, 4, ranking)